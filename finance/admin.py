@@ -1,7 +1,18 @@
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import Category, Account, Transaction, Customer
+from .models import Category, Account, Budget, JournalEntry, RecurringTransaction, Transaction, Customer
+from .services.search import search
+
+
+class FullTextSearchMixin:
+    """Admin search through the full-text index instead of LIKE scans."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search(queryset, search_term), False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -18,7 +29,7 @@ class AccountAdmin(admin.ModelAdmin):
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("date", "amount", "category", "account", "created_at")
     list_filter = ("category", "account", "date")
     search_fields = ("description",)
@@ -28,3 +39,26 @@ class TransactionAdmin(admin.ModelAdmin):
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ("full_name", "user", "phone_number", "national_id")
     search_fields = ("full_name", "user__username", "phone_number", "national_id")
+
+
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ("customer", "category", "amount", "alert_percent")
+    list_filter = ("category",)
+    search_fields = ("customer__full_name",)
+
+
+@admin.register(RecurringTransaction)
+class RecurringTransactionAdmin(admin.ModelAdmin):
+    list_display = ("description", "account", "category", "amount", "frequency", "interval", "next_date", "is_active")
+    list_filter = ("frequency", "is_active")
+    search_fields = ("description",)
+
+
+@admin.register(JournalEntry)
+class JournalEntryAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ("id", "date", "memo", "created_at")
+    list_filter = ("date",)
+    search_fields = ("memo",)
+    date_hierarchy = "date"
@@ -0,0 +1,113 @@
+"""
+Async versions of the hot read endpoints, for deployments behind ASGI.
+
+DRF views are sync only, so these are plain Django async views that reuse
+the DRF serializers, filters and pagination. Under ASGI a slow client no
+longer holds a worker thread while its response is produced.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from finance.api.pagination import TransactionCursorPagination
+from finance.api.serializers import AccountSerializer, TransactionSerializer
+from finance.api.views import filter_transactions
+from finance.models import Account, Customer, Transaction
+from finance.services.dashboard import aget_dashboard_summary, recent_transactions_queryset
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # DRF's renderer, so the output matches the sync endpoints byte for byte
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+
+async def aget_customer(request):
+    """
+    The customer of the JWT bearer (as DRF would authenticate it), or of
+    the session user. None when neither is present.
+    """
+    auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    user = auth[0] if auth else await request.auser()
+    if not user.is_authenticated:
+        return None
+    return await Customer.objects.filter(user=user).afirst()
+
+
+def async_api_view(view):
+    """Authenticates the request and turns DRF exceptions into JSON error responses."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return json_response({"detail": "Method not allowed."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            customer = await aget_customer(request)
+            if customer is None:
+                return json_response(
+                    {"detail": "Authentication credentials were not provided."},
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+            return await view(Request(request), customer, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+            return json_response(detail, status=exc.status_code)
+
+    return wrapper
+
+
+@async_api_view
+async def account_list(request, customer):
+    accounts = [
+        acc
+        async for acc in Account.objects.filter(customer=customer, is_active=True)
+        .select_related("ledger_account")
+        .order_by("name")
+    ]
+    return json_response(AccountSerializer(accounts, many=True).data)
+
+
+@async_api_view
+async def transaction_list(request, customer):
+    """Same filters and cursor pages as TransactionViewSet.list."""
+    qs = filter_transactions(Transaction.objects.filter(customer=customer), request)
+    paginator = TransactionCursorPagination()
+    page = await paginator.apaginate_queryset(qs, request)
+    return json_response({
+        "next": paginator.get_next_link(),
+        "results": TransactionSerializer(page, many=True).data,
+    })
+
+
+@async_api_view
+async def dashboard_summary(request, customer):
+    """
+    The dashboard totals and the latest transactions. The two are
+    independent, so they are awaited together; on a summary cache hit the
+    response costs the recent-transactions query alone.
+    """
+
+    async def recent():
+        return [t async for t in recent_transactions_queryset(customer)]
+
+    summary, transactions = await asyncio.gather(aget_dashboard_summary(customer), recent())
+    return json_response({
+        **summary,
+        "transactions": [
+            {
+                "id": t.id,
+                "date": t.date,
+                "amount": t.amount,
+                "description": t.description,
+                "account": t.account.name,
+                "category": t.category.name,
+            }
+            for t in transactions
+        ],
+    })
@@ -0,0 +1,115 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on a composite key.
+
+    The cursor holds the key values of the last row of the page, and the next
+    page is fetched with a "(date, created_at, id) < cursor" seek. With a
+    matching index every page costs the same no matter how deep it is, unlike
+    OFFSET. The last field of `ordering` must be unique (normally the id).
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    ordering = ("-date", "-created_at", "-id")
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def key_fields(self):
+        return [(f.lstrip("-"), f.startswith("-")) for f in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, name)) for name, _ in self.key_fields()]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            fields = self.key_fields()
+            if len(values) != len(fields):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            ]
+        except (ValueError, TypeError, DjangoValidationError):
+            raise NotFound("Invalid cursor.")
+
+    def seek_filter(self, values):
+        # (a, b, c) < (x, y, z)  ==  a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.key_fields(), values):
+            lookup = "lt" if descending else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.cursor_values = None
+        if cursor:
+            self.cursor_values = self.decode_cursor(queryset, cursor)
+            queryset = queryset.filter(self.seek_filter(self.cursor_values))
+        # One extra row tells us whether there is a next page
+        return queryset[: self.current_page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.current_page_size
+        self.page = rows[: self.current_page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset for async views; `request` is a DRF Request wrapping the ASGI request."""
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class TransactionCursorPagination(KeysetPagination):
+    ordering = ("-date", "-created_at", "-id")
+
+
+class StatementPagination(KeysetPagination):
+    page_size = 100
+    ordering = ("date", "id")
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from finance.models import Account, Transaction
+from finance.models import Account, Budget, Category, LedgerLine, RecurringTransaction, Transaction
 
 
 class AccountSerializer(serializers.ModelSerializer):
@@ -11,8 +11,10 @@ class AccountSerializer(serializers.ModelSerializer):
 
     def get_balance(self, obj):
         # اگر Ledger وصل باشد، موجودی واقعی را از ledger بخوان
-        if hasattr(obj, "ledger_account") and obj.ledger_account_id:
-            return obj.ledger_account.balance()
+        # (AccountViewSet آن را با select_related می‌آورد؛ balance() کوئری نمی‌زند)
+        ledger = getattr(obj, "ledger_account", None)
+        if ledger is not None:
+            return ledger.balance()
         return None
 
 
@@ -20,3 +22,73 @@ class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ["id", "amount", "date", "account", "category", "description"]
+
+
+class StatementLineSerializer(serializers.ModelSerializer):
+    memo = serializers.CharField(source="entry.memo", read_only=True)
+    balance = serializers.DecimalField(
+        source="running_balance", max_digits=18, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = LedgerLine
+        fields = ["id", "date", "entry", "memo", "debit", "credit", "balance"]
+
+
+class BudgetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Budget
+        fields = ["id", "category", "amount", "alert_percent"]
+
+    def validate_category(self, category):
+        if category.type != Category.EXPENSE:
+            raise serializers.ValidationError("Budgets are for expense categories.")
+        customer = getattr(self.context["request"].user, "customer_profile", None)
+        others = Budget.objects.filter(customer=customer, category=category)
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        if others.exists():
+            raise serializers.ValidationError("This category already has a budget.")
+        return category
+
+    def validate_amount(self, amount):
+        if amount <= 0:
+            raise serializers.ValidationError("Amount must be positive.")
+        return amount
+
+    def validate_alert_percent(self, value):
+        if not 1 <= value <= 100:
+            raise serializers.ValidationError("alert_percent must be between 1 and 100.")
+        return value
+
+
+class RecurringTransactionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringTransaction
+        fields = [
+            "id", "account", "category", "amount", "description",
+            "frequency", "interval", "start_date", "end_date", "next_date", "is_active",
+        ]
+        read_only_fields = ["next_date"]
+
+    def validate_interval(self, value):
+        if value < 1:
+            raise serializers.ValidationError("interval must be at least 1.")
+        return value
+
+    def validate(self, attrs):
+        start = attrs.get("start_date", getattr(self.instance, "start_date", None))
+        end = attrs.get("end_date", getattr(self.instance, "end_date", None))
+        if end is not None and start is not None and end < start:
+            raise serializers.ValidationError({"end_date": "end_date is before start_date."})
+        return attrs
+
+    def update(self, instance, validated_data):
+        start = validated_data.get("start_date", instance.start_date)
+        if instance.next_date == instance.start_date:
+            # Nothing materialized yet
+            instance.next_date = start
+        else:
+            # Never go back before what was already materialized
+            instance.next_date = max(instance.next_date, start)
+        return super().update(instance, validated_data)
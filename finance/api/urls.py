@@ -1,13 +1,42 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from finance.api.views import AccountViewSet, TransactionViewSet, transfer_api
+from finance.api import async_views
+from finance.api.views import (
+    AccountViewSet,
+    BudgetViewSet,
+    RecurringTransactionViewSet,
+    TransactionViewSet,
+    balance_sheet_api,
+    cash_flow_api,
+    export_ledger_lines_api,
+    export_transactions_api,
+    income_statement_api,
+    transfer_api,
+    transfer_batch_api,
+    transfer_status_api,
+    trial_balance_api,
+)
 
 router = DefaultRouter()
 router.register("accounts", AccountViewSet, basename="accounts")
 router.register("transactions", TransactionViewSet, basename="transactions")
+router.register("budgets", BudgetViewSet, basename="budgets")
+router.register("recurring-transactions", RecurringTransactionViewSet, basename="recurring-transactions")
 
 urlpatterns = [
     path("", include(router.urls)),
     path("transfers/", transfer_api, name="transfer_api"),
+    path("transfers/batch/", transfer_batch_api, name="transfer_batch_api"),
+    path("transfers/<int:pk>/", transfer_status_api, name="transfer_status_api"),
+    path("exports/transactions/", export_transactions_api, name="export_transactions_api"),
+    path("exports/ledger-lines/", export_ledger_lines_api, name="export_ledger_lines_api"),
+    path("reports/trial-balance/", trial_balance_api, name="trial_balance_api"),
+    path("reports/balance-sheet/", balance_sheet_api, name="balance_sheet_api"),
+    path("reports/income-statement/", income_statement_api, name="income_statement_api"),
+    path("reports/cash-flow/", cash_flow_api, name="cash_flow_api"),
+    # Async read endpoints, for ASGI deployments
+    path("async/accounts/", async_views.account_list, name="async_account_list"),
+    path("async/transactions/", async_views.transaction_list, name="async_transaction_list"),
+    path("async/dashboard/", async_views.dashboard_summary, name="async_dashboard_summary"),
 ]
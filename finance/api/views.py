@@ -1,13 +1,70 @@
+import io
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from finance.models import Account, Transaction
-from finance.api.serializers import AccountSerializer, TransactionSerializer
+from finance.models import (
+    Account,
+    Budget,
+    Category,
+    RecurringTransaction,
+    Transaction,
+    TransferRequest,
+    money_sum,
+)
+from finance.api.pagination import StatementPagination, TransactionCursorPagination
+from finance.api.serializers import (
+    AccountSerializer,
+    BudgetSerializer,
+    RecurringTransactionSerializer,
+    StatementLineSerializer,
+    TransactionSerializer,
+)
 from finance.api.permissions import IsCustomerOwner
 from finance.services.exceptions import InsufficientFundsError
-from finance.services.inter_customer_transfers import transfer_to_national_id
+from finance.services.exports import (
+    EXPORT_CONTENT_TYPES,
+    LEDGER_LINE_EXPORT_FIELDS,
+    TRANSACTION_EXPORT_FIELDS,
+    iter_rows,
+    ledger_line_export_rows,
+    transaction_export_rows,
+)
+from finance.services.budgets import budget_status
+from finance.services.idempotency import idempotent_response
+from finance.services.importers import PARSERS, StatementImporter
+from finance.services.reports import (
+    TRIAL_BALANCE_FIELDS,
+    balance_sheet,
+    has_archive,
+    income_statement,
+    iter_trial_balance,
+    trial_balance,
+)
+from finance.services.rollups import BUCKETS, cash_flow_series
+from finance.services.search import search
+from finance.services.inter_customer_transfers import (
+    transfer_batch_to_national_ids,
+    transfer_to_national_id,
+)
+from finance.services.transfer_queue import enqueue_transfer
+from finance.services.utils import mask_national_id
+
+MAX_TRANSFER_BATCH_SIZE = 5000
+# Default for transfer_api when the payload has no "async" flag
+TRANSFERS_ASYNC = getattr(settings, "FINANCE_TRANSFERS_ASYNC", False)
 
 
 class AccountViewSet(viewsets.ReadOnlyModelViewSet):
@@ -17,17 +74,196 @@ class AccountViewSet(viewsets.ReadOnlyModelViewSet):
         customer = getattr(self.request.user, "customer_profile", None)
         if customer is None:
             return Account.objects.none()
-        return Account.objects.filter(customer=customer, is_active=True).order_by("name")
+        # ledger_account is joined in so each row's balance is a column read
+        return (
+            Account.objects.filter(customer=customer, is_active=True)
+            .select_related("ledger_account")
+            .order_by("name")
+        )
+
+    def get_ledger_account(self):
+        ledger = getattr(self.get_object(), "ledger_account", None)
+        if ledger is None:
+            raise NotFound("This account has no ledger.")
+        return ledger
+
+    @action(detail=True, methods=["get"])
+    def balance(self, request, pk=None):
+        """
+        GET ?as_of=YYYY-MM-DD (default: today)
+        """
+        ledger = self.get_ledger_account()
+        as_of = parse_date_param(request, "as_of") or timezone.now().date()
+        return Response({"account": int(pk), "as_of": as_of, "balance": ledger.balance_as_of(as_of)})
+
+    @action(detail=True, methods=["get"])
+    def statement(self, request, pk=None):
+        """
+        Ledger lines of the account, oldest first, each with the running
+        balance after it.
+        GET ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&cursor=...&page_size=...
+        """
+        ledger = self.get_ledger_account()
+        date_from = parse_date_param(request, "date_from")
+        date_to = parse_date_param(request, "date_to")
+
+        qs = ledger.lines.select_related("entry")
+        if date_from:
+            qs = qs.filter(date__gte=date_from)
+        if date_to:
+            qs = qs.filter(date__lte=date_to)
+
+        paginator = StatementPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+
+        # Opening balance for the page: the daily snapshot of the previous day
+        # (one seek) plus, when continuing a page, that day's earlier lines
+        if paginator.cursor_values:
+            cursor_date, cursor_id = paginator.cursor_values
+            opening = ledger.balance_as_of(cursor_date - timedelta(days=1))
+            same_day = ledger.lines.filter(date=cursor_date, id__lte=cursor_id).aggregate(
+                debit_sum=Sum("debit"), credit_sum=Sum("credit")
+            )
+            opening += ledger.signed_balance(money_sum(same_day["debit_sum"]), money_sum(same_day["credit_sum"]))
+        elif date_from:
+            opening = ledger.balance_as_of(date_from - timedelta(days=1))
+        else:
+            opening = 0
+
+        running = opening
+        for line in page:
+            running += ledger.signed_balance(line.debit, line.credit)
+            line.running_balance = running
+
+        response = paginator.get_paginated_response(StatementLineSerializer(page, many=True).data)
+        response.data["opening_balance"] = opening
+        return response
+
+
+class BudgetViewSet(viewsets.ModelViewSet):
+    serializer_class = BudgetSerializer
+
+    def get_queryset(self):
+        customer = getattr(self.request.user, "customer_profile", None)
+        if customer is None:
+            return Budget.objects.none()
+        return Budget.objects.filter(customer=customer).order_by("category__name")
+
+    def perform_create(self, serializer):
+        customer = getattr(self.request.user, "customer_profile", None)
+        if customer is None:
+            raise ValidationError({"detail": "Customer profile not found."})
+        serializer.save(customer=customer)
+
+    @action(detail=False, methods=["get"])
+    def status(self, request):
+        """
+        Spend against budget for every expense category with a budget or
+        with spend in the month, from the monthly spend counters.
+        GET ?month=YYYY-MM (default: this month)
+        """
+        customer = getattr(request.user, "customer_profile", None)
+        if customer is None:
+            return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+        month = None
+        if request.query_params.get("month"):
+            try:
+                month = parse_date(f"{request.query_params['month'][:7]}-01")
+            except ValueError:
+                month = None
+            if month is None:
+                raise ValidationError({"month": "Expected a month in YYYY-MM format."})
+        rows, missing_rates = budget_status(customer, month)
+        return Response({
+            "currency": customer.base_currency,
+            "categories": rows,
+            "missing_rates": missing_rates,
+        })
+
+
+class RecurringTransactionViewSet(viewsets.ModelViewSet):
+    """Recurring rules; materialize_recurring turns due occurrences into Transactions."""
+    serializer_class = RecurringTransactionSerializer
+
+    def get_queryset(self):
+        customer = getattr(self.request.user, "customer_profile", None)
+        if customer is None:
+            return RecurringTransaction.objects.none()
+        return RecurringTransaction.objects.filter(account__customer=customer).order_by("next_date", "id")
+
+    def perform_create(self, serializer):
+        self.check_account(serializer)
+        serializer.save()
+
+    def perform_update(self, serializer):
+        self.check_account(serializer)
+        serializer.save()
+
+    def check_account(self, serializer):
+        customer = getattr(self.request.user, "customer_profile", None)
+        account = serializer.validated_data.get("account", getattr(serializer.instance, "account", None))
+        if customer is None or account.customer_id != customer.id:
+            raise ValidationError({"account": "Invalid account."})
+
+
+def filter_transactions(qs, request):
+    """The list filters shared by TransactionViewSet and the async list; ?q= is a full-text search."""
+    date_from = parse_date_param(request, "date_from")
+    date_to = parse_date_param(request, "date_to")
+    category = parse_id_param(request, "category")
+    account = parse_id_param(request, "account")
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    if category:
+        qs = qs.filter(category_id=category)
+    if account:
+        qs = qs.filter(account_id=account)
+    if request.query_params.get("q"):
+        qs = search(qs, request.query_params["q"])
+    return qs.order_by("-date", "-created_at", "-id")
+
+
+def parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Expected a date in YYYY-MM-DD format."})
+    return parsed
+
+
+def parse_id_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Expected an integer id."})
 
 
 class TransactionViewSet(viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
+    pagination_class = TransactionCursorPagination
 
     def get_queryset(self):
+        """
+        Optional filters: ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&category=<id>&account=<id>&q=<text>
+        """
         customer = getattr(self.request.user, "customer_profile", None)
         if customer is None:
             return Transaction.objects.none()
-        return Transaction.objects.filter(account__customer=customer).order_by("-date", "-created_at")
+        return filter_transactions(Transaction.objects.filter(customer=customer), self.request)
+
+    def create(self, request, *args, **kwargs):
+        # Retries sent with the same Idempotency-Key get the first response back
+        return idempotent_response(request, "transactions.create", partial(super().create, request, *args, **kwargs))
 
     def perform_create(self, serializer):
         # اطمینان: فقط روی حساب‌های خودش بتواند Transaction بسازد
@@ -37,6 +273,59 @@ class TransactionViewSet(viewsets.ModelViewSet):
             raise PermissionError("Invalid account")
         serializer.save()
 
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_statement(self, request):
+        """
+        multipart/form-data:
+          file                 UTF-8 CSV (date,amount,description,category,account[,id]) or OFX;
+                               see services.importers.parse_csv
+          statement_format     "csv" (default) or "ofx"
+          account              default account id for rows without an account column
+          income_category      category id for positive rows without a category
+          expense_category     category id for negative rows without a category
+        """
+        customer = getattr(request.user, "customer_profile", None)
+        if customer is None:
+            return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = request.FILES.get("file")
+        statement_format = request.data.get("statement_format", "csv")
+        if upload is None or statement_format not in PARSERS:
+            return Response(
+                {"detail": "Send a file and statement_format csv or ofx."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            account = None
+            if request.data.get("account"):
+                account = Account.objects.get(id=request.data["account"], customer=customer, is_active=True)
+            income_category = expense_category = None
+            if request.data.get("income_category"):
+                income_category = Category.objects.get(id=request.data["income_category"], type=Category.INCOME)
+            if request.data.get("expense_category"):
+                expense_category = Category.objects.get(id=request.data["expense_category"], type=Category.EXPENSE)
+        except (Account.DoesNotExist, Category.DoesNotExist, ValueError):
+            return Response({"detail": "Invalid account or category."}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = StatementImporter(
+            customer,
+            default_account=account,
+            income_category=income_category,
+            expense_category=expense_category,
+        )
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        try:
+            report = importer.run(PARSERS[statement_format](stream))
+        except UnicodeDecodeError:
+            # Chunks before the bad bytes are already imported; a fixed file
+            # can be re-sent, they are skipped as duplicates
+            return Response(
+                {"detail": "The file is not UTF-8 text.", "rows": importer.rows, "created": importer.created},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(report, status=status.HTTP_201_CREATED)
+
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -48,13 +337,25 @@ def transfer_api(request):
       "recipient_national_id": "....",
       "amount": "100.00",
       "date": "2025-12-14",
-      "memo": "optional"
+      "memo": "optional",
+      "async": false
     }
+    With "async": true the transfer is queued for the process_transfers
+    worker and the response is 202 with a transfer_id to poll at
+    /api/transfers/<transfer_id>/.
+
+    Send an Idempotency-Key header to make retries safe: a repeated key
+    returns the first response without running the transfer again.
     """
+    return idempotent_response(request, "transfer_api", partial(_transfer, request))
+
+
+def _transfer(request):
     customer = getattr(request.user, "customer_profile", None)
     if customer is None:
         return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
 
+    async_mode = request.data.get("async", TRANSFERS_ASYNC)
     from_account_id = request.data.get("from_account_id")
     recipient_national_id = request.data.get("recipient_national_id")
     amount = request.data.get("amount")
@@ -62,10 +363,33 @@ def transfer_api(request):
     memo = request.data.get("memo", "")
 
     try:
-        from_account = Account.objects.get(id=from_account_id, customer=customer, is_active=True)
+        from_account = Account.objects.select_related("ledger_account").get(
+            id=from_account_id, customer=customer, is_active=True
+        )
     except Account.DoesNotExist:
         return Response({"detail": "Invalid source account."}, status=status.HTTP_400_BAD_REQUEST)
 
+    if async_mode in (True, 1, "1", "true", "True"):
+        try:
+            queued = enqueue_transfer(
+                sender=customer,
+                from_account=from_account,
+                recipient_national_id=recipient_national_id,
+                amount=amount,
+                date=date,
+                memo=memo,
+            )
+        except ValueError:
+            return Response({"detail": "Transfer failed. Check recipient and inputs."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {
+                "transfer_id": queued.id,
+                "status": queued.status,
+                "status_url": reverse("transfer_status_api", args=[queued.id]),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
     try:
         transfer_to_national_id(
             sender=customer,
@@ -80,3 +404,222 @@ def transfer_api(request):
         return Response({"detail": "Insufficient funds."}, status=status.HTTP_400_BAD_REQUEST)
     except ValueError:
         return Response({"detail": "Transfer failed. Check recipient and inputs."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def transfer_status_api(request, pk):
+    """Status of a transfer queued by transfer_api in async mode; visible to its sender only."""
+    customer = getattr(request.user, "customer_profile", None)
+    try:
+        queued = TransferRequest.objects.get(id=pk, customer=customer)
+    except TransferRequest.DoesNotExist:
+        raise NotFound("Transfer not found.")
+    return Response({
+        "transfer_id": queued.id,
+        "status": queued.status,
+        "detail": queued.detail,
+        "from_account_id": queued.from_account_id,
+        "recipient": mask_national_id(queued.recipient_national_id),
+        "amount": queued.amount,
+        "date": queued.date,
+        "created_at": queued.created_at,
+        "processed_at": queued.processed_at,
+    })
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def transfer_batch_api(request):
+    """
+    POST payload:
+    {
+      "from_account_id": 1,
+      "date": "2025-12-14",
+      "items": [
+        {"recipient_national_id": "....", "amount": "100.00", "memo": "optional", "date": "optional"},
+        ...
+      ]
+    }
+    Responds with one result per item; a bad item does not fail the batch.
+    """
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+
+    items = request.data.get("items")
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        return Response({"detail": "items must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_TRANSFER_BATCH_SIZE:
+        return Response(
+            {"detail": f"At most {MAX_TRANSFER_BATCH_SIZE} items per batch."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        from_account = Account.objects.select_related("ledger_account").get(
+            id=request.data.get("from_account_id"), customer=customer, is_active=True
+        )
+    except (Account.DoesNotExist, ValueError, TypeError):
+        return Response({"detail": "Invalid source account."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = transfer_batch_to_national_ids(
+            sender=customer,
+            from_account=from_account,
+            items=items,
+            date=request.data.get("date"),
+        )
+    except ValueError:
+        return Response({"detail": "Transfer failed. Check inputs."}, status=status.HTTP_400_BAD_REQUEST)
+
+    completed = sum(1 for r in results if r["status"] == "completed")
+    return Response(
+        {"completed": completed, "failed": len(results) - completed, "results": results},
+        status=status.HTTP_200_OK,
+    )
+
+
+def _export_response(request, rows, fields, filename):
+    # "format" is taken by DRF's content negotiation, hence "fmt"
+    fmt = request.query_params.get("fmt", "csv")
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return Response({"detail": "fmt must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(iter_rows(rows, fields, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_transactions_api(request):
+    """
+    Streams the customer's transactions.
+    GET ?fmt=csv|ndjson&account=<id>&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    """
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+    rows = transaction_export_rows(
+        customer_id=customer.id,
+        account_id=parse_id_param(request, "account"),
+        date_from=parse_date_param(request, "date_from"),
+        date_to=parse_date_param(request, "date_to"),
+    )
+    return _export_response(request, rows, TRANSACTION_EXPORT_FIELDS, "transactions")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_ledger_lines_api(request):
+    """
+    Streams the customer's ledger lines, archived ones first (with an
+    empty id).
+    GET ?fmt=csv|ndjson&ledger_account=<id>&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    """
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+    rows = ledger_line_export_rows(
+        customer_id=customer.id,
+        account_id=parse_id_param(request, "ledger_account"),
+        date_from=parse_date_param(request, "date_from"),
+        date_to=parse_date_param(request, "date_to"),
+        include_archived=has_archive(customer),
+    )
+    return _export_response(request, rows, LEDGER_LINE_EXPORT_FIELDS, "ledger-lines")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def trial_balance_api(request):
+    """
+    GET ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    Staff only: ?all=1&fmt=csv|ndjson streams every customer's accounts.
+    """
+    date_from = parse_date_param(request, "date_from")
+    date_to = parse_date_param(request, "date_to")
+
+    if request.query_params.get("all"):
+        if not request.user.is_staff:
+            return Response({"detail": "Only staff can report on all customers."}, status=status.HTTP_403_FORBIDDEN)
+        fmt = request.query_params.get("fmt", "csv")
+        if fmt not in EXPORT_CONTENT_TYPES:
+            return Response({"detail": "fmt must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+        rows = (
+            tuple(row[f] for f in TRIAL_BALANCE_FIELDS)
+            for row in iter_trial_balance(date_from=date_from, date_to=date_to)
+        )
+        response = StreamingHttpResponse(
+            iter_rows(rows, TRIAL_BALANCE_FIELDS, fmt), content_type=EXPORT_CONTENT_TYPES[fmt]
+        )
+        response["Content-Disposition"] = f'attachment; filename="trial-balance.{fmt}"'
+        return response
+
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(trial_balance(customer, date_from, date_to))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def balance_sheet_api(request):
+    """
+    GET ?as_of=YYYY-MM-DD (default: today)
+    """
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+    as_of = parse_date_param(request, "as_of") or timezone.now().date()
+    return Response(balance_sheet(customer, as_of))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def income_statement_api(request):
+    """
+    GET ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    """
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(income_statement(
+        customer,
+        date_from=parse_date_param(request, "date_from"),
+        date_to=parse_date_param(request, "date_to"),
+    ))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def cash_flow_api(request):
+    """
+    Income/expense time series from the daily rollups.
+    GET ?bucket=day|week|month|quarter|year&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+        &account=<id>&category=<id>&by_category=1
+    """
+    customer = getattr(request.user, "customer_profile", None)
+    if customer is None:
+        return Response({"detail": "Customer profile not found."}, status=status.HTTP_400_BAD_REQUEST)
+    bucket = request.query_params.get("bucket", "month")
+    if bucket not in BUCKETS:
+        return Response(
+            {"detail": f"bucket must be one of: {', '.join(BUCKETS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    series, missing_rates = cash_flow_series(
+        customer,
+        bucket=bucket,
+        date_from=parse_date_param(request, "date_from"),
+        date_to=parse_date_param(request, "date_to"),
+        account_id=parse_id_param(request, "account"),
+        category_id=parse_id_param(request, "category"),
+        by_category=bool(request.query_params.get("by_category")),
+    )
+    return Response({
+        "bucket": bucket,
+        "currency": customer.base_currency,
+        "series": series,
+        "missing_rates": missing_rates,
+    })
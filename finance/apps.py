@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
+
+    def ready(self):
+        from finance import signals  # noqa: F401
+        from finance.services.search import install_search_index
+
+        post_migrate.connect(install_search_index, sender=self)
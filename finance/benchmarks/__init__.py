@@ -0,0 +1,139 @@
+"""
+Hot-path benchmarks, run by the run_benchmarks management command.
+
+Each case is a callable taking a BenchmarkContext. Cases are measured for
+wall time and query count; baselines.json holds the tracked numbers.
+"""
+import json
+import statistics
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from finance.api.views import AccountViewSet, TransactionViewSet
+from finance.models import Customer
+from finance.services.dashboard import invalidate_dashboard_summary
+from finance.services.inter_customer_transfers import transfer_to_national_id
+from finance.views import dashboard
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+
+# Transaction control is left out of query counts: it differs between a
+# top-level run and one nested in a test's transaction
+TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE SAVEPOINT")
+
+
+def request_host():
+    # RequestFactory's default "testserver" is only allowed under the test runner
+    hosts = [h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")]
+    return hosts[0] if hosts else "localhost"
+
+
+@dataclass
+class BenchmarkContext:
+    customer: Customer
+    account: object
+    recipient: Customer
+
+
+class Rollback(Exception):
+    pass
+
+
+def bench_ledger_balance(ctx):
+    ctx.account.ledger_account.refresh_from_db()
+    ctx.account.ledger_account.balance()
+
+
+def bench_dashboard_cold(ctx):
+    invalidate_dashboard_summary(ctx.customer.id)
+    bench_dashboard_warm(ctx)
+
+
+def bench_dashboard_warm(ctx):
+    request = RequestFactory().get("/dashboard/", HTTP_HOST=request_host())
+    request.user = ctx.customer.user
+    dashboard(request).content
+
+
+def call_api(view, ctx, path, **params):
+    request = APIRequestFactory().get(path, params, HTTP_HOST=request_host())
+    force_authenticate(request, user=ctx.customer.user)
+    response = view(request)
+    response.render()
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned {response.status_code}")
+
+
+def bench_accounts_list(ctx):
+    call_api(AccountViewSet.as_view({"get": "list"}), ctx, "/api/accounts/")
+
+
+def bench_transactions_list(ctx):
+    call_api(TransactionViewSet.as_view({"get": "list"}), ctx, "/api/transactions/")
+
+
+def bench_transfer(ctx):
+    # Posted for real, then rolled back so repeated runs leave the data alone
+    try:
+        with transaction.atomic():
+            transfer_to_national_id(
+                ctx.customer, ctx.account, ctx.recipient.national_id, Decimal("0.01"), memo="benchmark"
+            )
+            raise Rollback
+    except Rollback:
+        pass
+
+
+CASES = {
+    "ledger_balance": bench_ledger_balance,
+    "dashboard_cold": bench_dashboard_cold,
+    "dashboard_warm": bench_dashboard_warm,
+    "api_accounts_list": bench_accounts_list,
+    "api_transactions_list": bench_transactions_list,
+    "transfer_to_national_id": bench_transfer,
+}
+
+
+def measure(case, ctx, repeat):
+    """Returns (query count of one run, median ms, p95 ms) after one warm-up run."""
+    case(ctx)
+    timings = []
+    queries = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            case(ctx)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = sum(1 for q in captured if not q["sql"].startswith(TRANSACTION_CONTROL))
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return queries, statistics.median(timings), p95
+
+
+def load_baselines():
+    if not BASELINES_PATH.exists():
+        return {}
+    return json.loads(BASELINES_PATH.read_text())
+
+
+def save_baselines(baselines):
+    BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+def compare(name, queries, median_ms, baseline, tolerance):
+    """Returns a list of regressions against one baseline entry."""
+    problems = []
+    if queries > baseline["queries"]:
+        problems.append(f"{name}: {queries} queries, baseline {baseline['queries']}")
+    limit = baseline["median_ms"] * (1 + tolerance)
+    if median_ms > limit:
+        problems.append(f"{name}: {median_ms:.2f}ms median, baseline {baseline['median_ms']:.2f}ms")
+    return problems
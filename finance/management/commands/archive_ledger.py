@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from finance.models import Customer
+from finance.services.archive import ARCHIVE_CHUNK_SIZE, archive_closed_lines, archive_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves ledger lines of closed periods (on or before each customer's "
+        "books_closed_through) out of the database into append-only columnar "
+        "files under FINANCE_ARCHIVE_DIR, keeping per-account totals in the "
+        "database. Reports read the files for ranges that cut an archived period."
+    )
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument("--customer", type=int)
+        group.add_argument("--all", action="store_true", help="Archive for every customer with closed books.")
+        parser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        customers = Customer.objects.filter(books_closed_through__isnull=False).order_by("id")
+        if options["customer"]:
+            customers = customers.filter(id=options["customer"])
+
+        started = time.perf_counter()
+        segments = lines = failed = 0
+        for customer in customers.iterator():
+            try:
+                archive = archive_closed_lines(customer, chunk_size=options["chunk_size"])
+            except ValueError as exc:
+                failed += 1
+                self.stderr.write(f"Customer #{customer.id}: {exc}")
+                continue
+            if archive is not None:
+                segments += 1
+                lines += archive.line_count
+                self.stdout.write(
+                    f"Customer #{customer.id}: {archive.line_count} lines "
+                    f"{archive.date_from}..{archive.date_to} -> {archive.path}"
+                )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {lines} lines in {segments} segments under {archive_root()} "
+            f"in {elapsed:.2f}s, {failed} customers failed"
+        ))
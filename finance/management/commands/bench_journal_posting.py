@@ -0,0 +1,71 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from finance.models import Customer, JournalEntry, LedgerAccount, LedgerLine
+from finance.services.ledger import post_journal_entries
+
+
+def post_row_by_row(entries):
+    """The pre-bulk posting path: one INSERT per entry and per line."""
+    with transaction.atomic():
+        for e in entries:
+            entry = JournalEntry.objects.create(customer=e["customer"], date=e["date"], memo=e["memo"])
+            for l in e["lines"]:
+                LedgerLine.objects.create(
+                    entry=entry, account=l["account"], date=entry.date, debit=l["debit"], credit=l["credit"]
+                )
+                LedgerAccount.objects.filter(id=l["account"].id).update(
+                    debit_total=F("debit_total") + l["debit"],
+                    credit_total=F("credit_total") + l["credit"],
+                )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares rows/sec of row-by-row journal posting against "
+        "post_journal_entries. Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        n = options["entries"]
+        with transaction.atomic():
+            user = get_user_model().objects.create(username=f"bench-posting-{time.time_ns()}")
+            customer = Customer.objects.create(user=user, full_name="Benchmark")
+            cash = LedgerAccount.objects.create(customer=customer, name="Cash", type=LedgerAccount.ASSET)
+            income = LedgerAccount.objects.create(customer=customer, name="Income", type=LedgerAccount.INCOME)
+
+            amount = Decimal("1.00")
+            entries = [
+                {
+                    "customer": customer,
+                    "date": timezone.now().date(),
+                    "memo": f"bench {i}",
+                    "lines": [
+                        {"account": cash, "debit": amount, "credit": 0},
+                        {"account": income, "debit": 0, "credit": amount},
+                    ],
+                }
+                for i in range(n)
+            ]
+            rows = n * 3  # one entry + two lines
+
+            for label, fn in [("row-by-row", post_row_by_row), ("bulk", post_journal_entries)]:
+                best = None
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    fn(entries)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(f"{label:>10}: {rows / best:,.0f} rows/sec ({n} entries in {best:.3f}s)")
+
+            transaction.set_rollback(True)
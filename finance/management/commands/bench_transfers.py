@@ -0,0 +1,76 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from finance.models import Account, Customer
+from finance.management.commands.stress_transfers import setup_customers, teardown_customers
+from finance.services.exceptions import InsufficientFundsError
+from finance.services.inter_customer_transfers import transfer_to_national_id
+from finance.services.transfer_queue import WORKER_BATCH_SIZE, enqueue_transfer, process_pending_transfers
+
+PREFIX = "bench-transfers-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares transfer throughput of the synchronous path (one locked "
+        "transaction per transfer) with the async queue (enqueue, then the "
+        "worker posts per source account in batches). The generated "
+        "customers are deleted afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transfers", type=int, default=2000)
+        parser.add_argument("--customers", type=int, default=10, help="Fewer senders means larger worker batches.")
+        parser.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated customers.")
+
+    def plan(self, customers, n, seed):
+        rng = random.Random(seed)
+        return [
+            (*rng.sample(customers, 2), Decimal(rng.randint(1, 500)) / 100)
+            for _ in range(n)
+        ]
+
+    def handle(self, *args, **options):
+        customer_ids = setup_customers(options["customers"], prefix=PREFIX)
+        try:
+            customers = list(Customer.objects.filter(id__in=customer_ids))
+            accounts = {
+                a.customer_id: a
+                for a in Account.objects.filter(customer__in=customers).select_related("ledger_account")
+            }
+            transfers = self.plan(customers, options["transfers"], options["seed"])
+
+            started = time.perf_counter()
+            for sender, recipient, amount in transfers:
+                try:
+                    transfer_to_national_id(sender, accounts[sender.id], recipient.national_id, amount, memo="bench")
+                except InsufficientFundsError:
+                    pass
+            sync_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for sender, recipient, amount in transfers:
+                enqueue_transfer(sender, accounts[sender.id], recipient.national_id, amount, memo="bench")
+            enqueue_elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            stats = process_pending_transfers(batch_size=options["batch_size"])
+            drain_elapsed = time.perf_counter() - started
+        finally:
+            if not options["keep"]:
+                teardown_customers(customer_ids)
+
+        n = len(transfers)
+        async_elapsed = enqueue_elapsed + drain_elapsed
+        self.stdout.write(f"sync:  {n} transfers in {sync_elapsed:.2f}s ({n / sync_elapsed:,.1f}/sec)")
+        self.stdout.write(
+            f"async: enqueue {enqueue_elapsed:.2f}s ({n / enqueue_elapsed:,.1f}/sec), "
+            f"worker {drain_elapsed:.2f}s ({n / drain_elapsed:,.1f}/sec), "
+            f"end to end {n / async_elapsed:,.1f}/sec; "
+            f"{stats['completed']} completed, {stats['failed']} failed"
+        )
+        self.stdout.write(f"speedup: {sync_elapsed / async_elapsed:.1f}x end to end")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from finance.models import Customer
+from finance.services.periods import close_period
+
+
+class Command(BaseCommand):
+    help = "Closes the books through a date: writes balance checkpoints and blocks posting into the period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("through", help="Last day of the period to close (YYYY-MM-DD).")
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument("--customer", type=int)
+        group.add_argument("--all", action="store_true", help="Close for every customer.")
+
+    def handle(self, *args, **options):
+        through = parse_date(options["through"])
+        if through is None:
+            raise CommandError("through must be YYYY-MM-DD")
+
+        customers = Customer.objects.order_by("id")
+        if options["customer"]:
+            customers = customers.filter(id=options["customer"])
+
+        closed = skipped = 0
+        for customer in customers.iterator():
+            try:
+                close_period(customer, through)
+                closed += 1
+            except ValueError as exc:
+                skipped += 1
+                self.stderr.write(f"Customer #{customer.id}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} customers through {through}, skipped {skipped}"))
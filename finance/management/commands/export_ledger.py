@@ -0,0 +1,62 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from finance.services.exports import (
+    EXPORT_CHUNK_SIZE,
+    LEDGER_LINE_EXPORT_FIELDS,
+    TRANSACTION_EXPORT_FIELDS,
+    iter_rows,
+    ledger_line_export_rows,
+    transaction_export_rows,
+)
+
+EXPORTS = {
+    "transactions": (transaction_export_rows, TRANSACTION_EXPORT_FIELDS),
+    "ledger-lines": (ledger_line_export_rows, LEDGER_LINE_EXPORT_FIELDS),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams transactions or ledger lines to CSV/NDJSON without loading them into memory. "
+        "Archived ledger lines are read from their segments and come first, with an empty id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--output", help="File to write to (default: stdout).")
+        parser.add_argument("--customer", type=int)
+        parser.add_argument(
+            "--account",
+            type=int,
+            help="Account id for transactions, ledger account id for ledger-lines.",
+        )
+        parser.add_argument("--date-from")
+        parser.add_argument("--date-to")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ("date_from", "date_to"):
+            value = options[name]
+            if value and parse_date(value) is None:
+                raise CommandError(f"--{name.replace('_', '-')} must be YYYY-MM-DD")
+            dates[name] = parse_date(value) if value else None
+
+        build_rows, fields = EXPORTS[options["kind"]]
+        rows = build_rows(
+            customer_id=options["customer"],
+            account_id=options["account"],
+            chunk_size=options["chunk_size"],
+            **dates,
+        )
+        chunks = iter_rows(rows, fields, options["format"])
+
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as fh:
+                fh.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,264 @@
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from finance.models import (
+    CENT,
+    Account,
+    Category,
+    Customer,
+    JournalEntry,
+    LedgerAccount,
+    LedgerDailyBalance,
+    LedgerLine,
+    Transaction,
+)
+from finance.services.inter_customer_transfers import TRANSFERS_IN_NAME, TRANSFERS_OUT_NAME
+from finance.signals import transactions_bulk_created
+
+INCOME_CATEGORIES = [("Salary", 0.6), ("Freelance", 0.25), ("Interest", 0.15)]
+EXPENSE_CATEGORIES = [
+    ("Groceries", 0.3),
+    ("Rent", 0.05),
+    ("Transport", 0.2),
+    ("Restaurants", 0.2),
+    ("Utilities", 0.1),
+    ("Shopping", 0.15),
+]
+CURRENCIES = [("IRR", 0.7), ("USD", 0.2), ("EUR", 0.1)]
+
+BATCH_SIZE = 5000
+
+
+def weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+
+def money(value):
+    return Decimal(value).quantize(CENT)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates customers, accounts, categories, transactions and balanced "
+        "journal entries with bulk inserts, for local load and benchmark runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=100)
+        parser.add_argument("--accounts-per-customer", type=int, default=2)
+        parser.add_argument("--transactions-per-account", type=int, default=500)
+        parser.add_argument(
+            "--entries-per-account",
+            type=int,
+            default=500,
+            help="Journal entries per account; each writes two ledger lines.",
+        )
+        parser.add_argument("--days", type=int, default=365, help="Spread dates over this many past days.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--prefix", default="synthetic")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.today = timezone.now().date()
+        self.days = options["days"]
+        started = time.perf_counter()
+
+        self.categories = self.ensure_categories()
+        counts = defaultdict(int)
+
+        # Customers are generated in groups so memory stays bounded
+        group = max(1, min(options["customers"], 50))
+        run = time.time_ns()
+        for offset in range(0, options["customers"], group):
+            size = min(group, options["customers"] - offset)
+            with transaction.atomic():
+                self.generate_group(run, offset, size, options, counts)
+            self.stdout.write(
+                f"{offset + size}/{options['customers']} customers, "
+                f"{counts['lines']:,} ledger lines, {counts['transactions']:,} transactions"
+            )
+
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/sec): "
+            + ", ".join(f"{k}={v:,}" for k, v in sorted(counts.items()))
+        ))
+
+    def ensure_categories(self):
+        categories = {}
+        for names, cat_type in [(INCOME_CATEGORIES, Category.INCOME), (EXPENSE_CATEGORIES, Category.EXPENSE)]:
+            for name, weight in names:
+                cat, _ = Category.objects.get_or_create(name=name, type=cat_type)
+                categories[name] = cat
+        return categories
+
+    def random_date(self):
+        # Recent days are busier than old ones
+        return self.today - timedelta(days=int(self.rng.triangular(0, self.days, 0)))
+
+    def expense_amount(self):
+        # Log-normal: many small purchases, a few large ones
+        return money(max(0.5, self.rng.lognormvariate(3.0, 1.0)))
+
+    def income_amount(self):
+        return money(self.rng.lognormvariate(7.5, 0.4))
+
+    def generate_group(self, run, offset, size, options, counts):
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(username=f"{options['prefix']}-{run}-{offset + i}") for i in range(size)
+        )
+        customers = Customer.objects.bulk_create(
+            Customer(
+                user=user,
+                full_name=f"Synthetic Customer {offset + i}",
+                national_id=f"{options['prefix']}-{run}-{offset + i}",
+            )
+            for i, user in enumerate(users)
+        )
+        counts["customers"] += len(customers)
+
+        accounts = Account.objects.bulk_create(
+            Account(
+                customer=customer,
+                name=f"Account {n}",
+                currency=weighted(self.rng, CURRENCIES),
+            )
+            for customer in customers
+            for n in range(options["accounts_per_customer"])
+        )
+        counts["accounts"] += len(accounts)
+
+        # Per customer: one asset ledger per account, plus income, expense,
+        # equity and the Transfers In/Out system accounts
+        ledger_accounts = []
+        for customer in customers:
+            for name, acc_type in [
+                ("Opening Balance", LedgerAccount.EQUITY),
+                ("Income", LedgerAccount.INCOME),
+                ("Expenses", LedgerAccount.EXPENSE),
+                (TRANSFERS_OUT_NAME, LedgerAccount.EXPENSE),
+                (TRANSFERS_IN_NAME, LedgerAccount.INCOME),
+            ]:
+                ledger_accounts.append(LedgerAccount(customer=customer, name=name, type=acc_type))
+        for account in accounts:
+            ledger_accounts.append(LedgerAccount(
+                customer_id=account.customer_id,
+                name=account.name,
+                type=LedgerAccount.ASSET,
+                bank_account=account,
+            ))
+        ledger_accounts = LedgerAccount.objects.bulk_create(ledger_accounts)
+        counts["ledger_accounts"] += len(ledger_accounts)
+        by_name = {(la.customer_id, la.name): la for la in ledger_accounts}
+
+        self.generate_transactions(accounts, options["transactions_per_account"], counts)
+        self.generate_entries(accounts, by_name, options["entries_per_account"], counts)
+
+    def generate_transactions(self, accounts, per_account, counts):
+        income = [(self.categories[n], w) for n, w in INCOME_CATEGORIES]
+        expense = [(self.categories[n], w) for n, w in EXPENSE_CATEGORIES]
+        batch = []
+
+        def flush():
+            Transaction.objects.bulk_create(batch)
+            transactions_bulk_created.send(sender=Transaction, transactions=batch)
+            counts["transactions"] += len(batch)
+
+        for account in accounts:
+            for _ in range(per_account):
+                if self.rng.random() < 0.15:
+                    category, amount = weighted(self.rng, income), self.income_amount()
+                else:
+                    category, amount = weighted(self.rng, expense), self.expense_amount()
+                batch.append(Transaction(
+                    account=account,
+                    category=category,
+                    amount=amount,
+                    date=self.random_date(),
+                    description=f"{category.name} #{self.rng.randint(1, 9999)}",
+                ))
+                if len(batch) >= self.batch_size:
+                    flush()
+                    batch = []
+        flush()
+
+    def generate_entries(self, accounts, by_name, per_account, counts):
+        totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        per_day = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        pending = []  # (JournalEntry, [(ledger_account, debit, credit), ...])
+
+        def flush():
+            entries = JournalEntry.objects.bulk_create([e for e, _ in pending])
+            lines = []
+            for entry, entry_lines in zip(entries, [l for _, l in pending]):
+                for ledger, debit, credit in entry_lines:
+                    # Raw ids skip the related-object descriptors, which add up at 10M rows
+                    lines.append(LedgerLine(
+                        entry_id=entry.id, account_id=ledger.id, date=entry.date, debit=debit, credit=credit
+                    ))
+            LedgerLine.objects.bulk_create(lines, batch_size=self.batch_size)
+            counts["journal_entries"] += len(entries)
+            counts["lines"] += len(lines)
+            pending.clear()
+
+        for account in accounts:
+            cid = account.customer_id
+            asset = by_name[(cid, account.name)]
+            opening = money(self.rng.lognormvariate(9, 0.5))
+            start = self.today - timedelta(days=self.days)
+            postings = [(start, [(asset, opening, 0), (by_name[(cid, "Opening Balance")], 0, opening)])]
+            for _ in range(per_account - 1):
+                if self.rng.random() < 0.15:
+                    amount = self.income_amount()
+                    lines = [(asset, amount, 0), (by_name[(cid, "Income")], 0, amount)]
+                else:
+                    amount = self.expense_amount()
+                    lines = [(by_name[(cid, "Expenses")], amount, 0), (asset, 0, amount)]
+                postings.append((self.random_date(), lines))
+
+            for date, lines in postings:
+                pending.append((JournalEntry(customer_id=cid, date=date, memo="synthetic"), lines))
+                for ledger, debit, credit in lines:
+                    totals[ledger.id][0] += debit
+                    totals[ledger.id][1] += credit
+                    per_day[(ledger.id, date)][0] += debit
+                    per_day[(ledger.id, date)][1] += credit
+                if len(pending) * 2 >= self.batch_size:
+                    flush()
+        if pending:
+            flush()
+
+        # Stored totals and cumulative daily snapshots, computed in memory
+        # instead of through the per-posting UPDATEs
+        LedgerAccount.objects.bulk_update(
+            [
+                LedgerAccount(id=lid, debit_total=debit, credit_total=credit)
+                for lid, (debit, credit) in totals.items()
+            ],
+            ["debit_total", "credit_total"],
+            batch_size=self.batch_size,
+        )
+        snapshots = []
+        running = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        for (lid, date) in sorted(per_day):
+            debit, credit = per_day[(lid, date)]
+            running[lid][0] += debit
+            running[lid][1] += credit
+            snapshots.append(LedgerDailyBalance(
+                account_id=lid, date=date, debit_total=running[lid][0], credit_total=running[lid][1]
+            ))
+        counts["daily_balances"] += len(
+            LedgerDailyBalance.objects.bulk_create(snapshots, batch_size=self.batch_size)
+        )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.models import Account, Category, Customer
+from finance.services.importers import IMPORT_CHUNK_SIZE, PARSERS, StatementImporter
+
+
+class Command(BaseCommand):
+    help = "Bulk-imports a CSV or OFX bank statement into Transaction for one customer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--customer", type=int, required=True)
+        parser.add_argument("--format", choices=sorted(PARSERS), default="csv")
+        parser.add_argument("--account", type=int, help="Default account id.")
+        parser.add_argument("--income-category", type=int)
+        parser.add_argument("--expense-category", type=int)
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            customer = Customer.objects.get(id=options["customer"])
+            account = None
+            if options["account"]:
+                account = Account.objects.get(id=options["account"], customer=customer)
+            income_category = expense_category = None
+            if options["income_category"]:
+                income_category = Category.objects.get(id=options["income_category"], type=Category.INCOME)
+            if options["expense_category"]:
+                expense_category = Category.objects.get(id=options["expense_category"], type=Category.EXPENSE)
+        except (Customer.DoesNotExist, Account.DoesNotExist, Category.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+
+        importer = StatementImporter(
+            customer,
+            default_account=account,
+            income_category=income_category,
+            expense_category=expense_category,
+            chunk_size=options["chunk_size"],
+        )
+        try:
+            with open(options["path"], encoding="utf-8-sig", newline="") as fh:
+                report = importer.run(PARSERS[options["format"]](fh))
+        except UnicodeDecodeError:
+            raise CommandError(
+                f"{options['path']} is not UTF-8 text; {importer.created} of the first {importer.rows} rows "
+                "were imported before the error"
+            )
+
+        for error in report["error_details"]:
+            self.stderr.write(f"row {error['row']}: {error['detail']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows in {report['seconds']}s ({report['rows_per_sec']} rows/sec): "
+            f"{report['created']} created, {report['duplicates']} duplicates skipped, "
+            f"{report['errors']} errors"
+        ))
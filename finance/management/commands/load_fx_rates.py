@@ -0,0 +1,75 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from finance.models import FxRate
+from finance.services.dashboard import invalidate_all_dashboard_summaries
+from finance.services.fx import REFERENCE_CURRENCY, invalidate_rates
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads exchange rates from a CSV file with date,currency,rate columns, "
+        "where rate is the value of one unit of the currency in the reference "
+        "currency (FINANCE_FX_REFERENCE_CURRENCY). Existing (currency, date) "
+        "rows are overwritten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+
+    def parse(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            reader = csv.DictReader(fh)
+            missing = {"date", "currency", "rate"} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(sorted(missing))}")
+            for line_no, row in enumerate(reader, start=2):
+                date = parse_date(row["date"].strip())
+                try:
+                    rate = Decimal(row["rate"].strip())
+                except InvalidOperation:
+                    rate = None
+                if date is None or rate is None or rate <= 0:
+                    raise CommandError(f"Line {line_no}: expected YYYY-MM-DD date and a positive rate")
+                yield FxRate(currency=row["currency"].strip().upper(), date=date, rate=rate)
+
+    def handle(self, *args, **options):
+        loaded = 0
+        currencies = set()
+        # Keyed so a (currency, date) repeated within a batch is sent once
+        batch = {}
+        with transaction.atomic():
+            for rate in self.parse(options["path"]):
+                batch[(rate.currency, rate.date)] = rate
+                currencies.add(rate.currency)
+                if len(batch) >= BATCH_SIZE:
+                    loaded += self.upsert(list(batch.values()))
+                    batch = {}
+            loaded += self.upsert(list(batch.values()))
+
+        # bulk_create skips the FxRate signals
+        for currency in currencies:
+            invalidate_rates(currency)
+        invalidate_all_dashboard_summaries()
+        if REFERENCE_CURRENCY in currencies:
+            self.stdout.write(self.style.WARNING(
+                f"{REFERENCE_CURRENCY} is the reference currency; its rate is always 1 and the loaded rows are ignored."
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {loaded} rates for {len(currencies)} currencies (reference {REFERENCE_CURRENCY})"
+        ))
+
+    def upsert(self, batch):
+        FxRate.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["currency", "date"],
+            update_fields=["rate"],
+        )
+        return len(batch)
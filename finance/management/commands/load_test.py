@@ -0,0 +1,129 @@
+import http.client
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# name -> (path on the WSGI deployment, path on the ASGI deployment). The
+# dashboard has no sync JSON endpoint, so WSGI serves the async view too
+# (Django runs it through async_to_sync there).
+ENDPOINTS = {
+    "accounts": ("/api/accounts/", "/api/async/accounts/"),
+    "transactions": ("/api/transactions/", "/api/async/transactions/"),
+    "dashboard": ("/api/async/dashboard/", "/api/async/dashboard/"),
+}
+
+
+def obtain_token(base_url, username, password):
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    body = json.dumps({"username": username, "password": password})
+    conn.request("POST", "/api/auth/token/", body, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = response.read()
+    if response.status != 200:
+        raise CommandError(f"Could not obtain a token from {base_url}: {response.status} {data[:200]!r}")
+    return json.loads(data)["access"]
+
+
+def run_load(base_url, path, token, requests, concurrency, timeout):
+    """
+    Sends `requests` GETs over `concurrency` keep-alive connections.
+    Returns (elapsed seconds, sorted latencies in ms, error count).
+    """
+    url = urlsplit(base_url)
+    headers = {"Authorization": f"Bearer {token}"}
+    counter = itertools.count()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+        mine = []
+        failed = 0
+        while next(counter) < requests:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+                continue
+            mine.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    elapsed = time.perf_counter() - started
+    return elapsed, sorted(latencies), errors[0]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the read endpoints of a WSGI and an ASGI deployment of "
+        "this project and compares requests/sec and latency percentiles. "
+        "WSGI is sent to the sync views and ASGI to their async versions. "
+        "Start both servers first, e.g. `gunicorn personal_finance.wsgi -b :8000` "
+        "and `uvicorn personal_finance.asgi:application --port 8001`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi", help="Base URL of the WSGI deployment, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--asgi", help="Base URL of the ASGI deployment, e.g. http://127.0.0.1:8001")
+        parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS),
+                            help="Repeatable; default: all.")
+        parser.add_argument("--username")
+        parser.add_argument("--password")
+        parser.add_argument("--token", help="A JWT access token, instead of --username/--password.")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and target.")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--timeout", type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        targets = [(name, options[name], i) for i, name in enumerate(["wsgi", "asgi"]) if options[name]]
+        if not targets:
+            raise CommandError("Give --wsgi and/or --asgi.")
+        token = options["token"]
+        if not token:
+            if not (options["username"] and options["password"]):
+                raise CommandError("Give --token or --username and --password.")
+            token = obtain_token(targets[0][1], options["username"], options["password"])
+
+        self.stdout.write(
+            f"{'endpoint':<14}{'server':<7}{'path':<28}{'req/s':>9}{'p50 ms':>9}"
+            f"{'p99 ms':>9}{'max ms':>9}{'errors':>8}"
+        )
+        for endpoint in options["endpoint"] or sorted(ENDPOINTS):
+            for name, base_url, which in targets:
+                path = ENDPOINTS[endpoint][which]
+                run_load(base_url, path, token, options["warmup"], min(options["concurrency"], 4), options["timeout"])
+                elapsed, latencies, errors = run_load(
+                    base_url, path, token, options["requests"], options["concurrency"], options["timeout"]
+                )
+                self.stdout.write(
+                    f"{endpoint:<14}{name:<7}{path:<28}{len(latencies) / elapsed:>9.1f}"
+                    f"{percentile(latencies, 0.50):>9.1f}{percentile(latencies, 0.99):>9.1f}"
+                    f"{(latencies[-1] if latencies else 0):>9.1f}{errors:>8}"
+                )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from finance.services.transfer_queue import WORKER_BATCH_SIZE, process_pending_transfers
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker for transfers queued by the API in async mode. Pending "
+        "requests are grouped by source account and each group is posted in "
+        "one transaction. Several workers can run side by side; on databases "
+        "with SKIP LOCKED they split the queue instead of waiting on each other."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE)
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            started = time.perf_counter()
+            stats = process_pending_transfers(batch_size=options["batch_size"])
+            processed = stats["completed"] + stats["failed"]
+            if processed:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{stats['completed']} completed, {stats['failed']} failed "
+                    f"in {elapsed:.2f}s ({processed / elapsed:,.1f}/sec)"
+                )
+            if options["once"]:
+                return
+            if not processed:
+                try:
+                    time.sleep(options["sleep"])
+                except KeyboardInterrupt:
+                    return
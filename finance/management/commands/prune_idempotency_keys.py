@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from finance.services.idempotency import RETENTION_HOURS, prune_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes stored Idempotency-Key responses older than the retention "
+        "window. A client retrying with a pruned key runs the request again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-hours", type=int, default=RETENTION_HOURS)
+
+    def handle(self, *args, **options):
+        deleted = prune_keys(options["older_than_hours"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys"))
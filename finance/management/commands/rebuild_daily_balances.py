@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from finance.models import LedgerAccount, LedgerDailyBalance, LedgerLine, money_sum
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the cumulative LedgerDailyBalance rows of every ledger account "
+        "from its lines. Rows of archived periods are kept and continued from."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customer", type=int, help="Limit to one customer id.")
+
+    def handle(self, *args, **options):
+        accounts = LedgerAccount.objects.order_by("id")
+        if options["customer"]:
+            accounts = accounts.filter(customer_id=options["customer"])
+
+        rebuilt = rows = 0
+        for account_id, archived_through in list(accounts.values_list("id", "customer__ledger_archived_through")):
+            with transaction.atomic():
+                # Hold the account lock so no posting lands between delete and insert
+                account = LedgerAccount.objects.select_for_update().get(id=account_id)
+                stale = LedgerDailyBalance.objects.filter(account_id=account_id)
+                lines = LedgerLine.objects.filter(account_id=account_id)
+                debit_total = credit_total = 0
+                if archived_through:
+                    # The lines behind these snapshots are no longer in LedgerLine
+                    stale = stale.filter(date__gt=archived_through)
+                    lines = lines.filter(date__gt=archived_through)
+                    debit_total, credit_total = account.totals_as_of(archived_through)
+                stale.delete()
+
+                snapshots = []
+                per_day = (
+                    lines.values("date")
+                    .annotate(debit_sum=Sum("debit"), credit_sum=Sum("credit"))
+                    .order_by("date")
+                )
+                for row in per_day:
+                    debit_total += money_sum(row["debit_sum"])
+                    credit_total += money_sum(row["credit_sum"])
+                    snapshots.append(LedgerDailyBalance(
+                        account_id=account_id,
+                        date=row["date"],
+                        debit_total=debit_total,
+                        credit_total=credit_total,
+                    ))
+                LedgerDailyBalance.objects.bulk_create(snapshots)
+            rebuilt += 1
+            rows += len(snapshots)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily balances for {rebuilt} ledger accounts"))
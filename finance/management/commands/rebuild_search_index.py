@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from finance.services.search import get_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the full-text search index if it is missing and re-reads "
+        "every transaction description and journal memo into it. Only needed "
+        "after restoring a database or loading rows with triggers disabled; "
+        "migrate installs the index and the database keeps it in step."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        conn = connections[options["database"]]
+        backend = get_backend(conn)
+        backend.install(conn)
+        backend.rebuild(conn)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index ({type(backend).__name__})"))
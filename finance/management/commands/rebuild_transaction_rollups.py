@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import MonthlySpend, TransactionDailyRollup
+from finance.services.rollups import REBUILD_CHUNK_SIZE, rebuild_rollups
+
+TABLES = {
+    "daily": (TransactionDailyRollup, "daily rollup rows"),
+    "spend": (MonthlySpend, "monthly spend counters"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the daily transaction rollups and the monthly spend "
+        "counters behind budgets from the Transaction table. Needed after "
+        "writes that bypass the model signals (queryset.update(), raw SQL), "
+        "to repair drift, and when first deploying the tables. Run it while "
+        "transaction writes are quiet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customer", type=int, help="Limit to one customer id.")
+        parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+        parser.add_argument("--only", choices=sorted(TABLES), help="Rebuild one table instead of both.")
+
+    def handle(self, *args, **options):
+        for name in [options["only"]] if options["only"] else TABLES:
+            model, label = TABLES[name]
+            written = rebuild_rollups(
+                customer_id=options["customer"], chunk_size=options["chunk_size"], model=model
+            )
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} {label}"))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from finance.models import LedgerAccount, LedgerArchiveTotal, LedgerLine, money_sum
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-sums LedgerLine rows (and the totals of archived lines) and "
+        "compares them with the stored debit_total/credit_total of every "
+        "LedgerAccount. Fixes mismatches unless --check is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report mismatches; exit with an error if any are found.",
+        )
+        parser.add_argument("--customer", type=int, help="Limit to one customer id.")
+
+    def handle(self, *args, **options):
+        accounts = LedgerAccount.objects.order_by("id")
+        lines = LedgerLine.objects.all()
+        archived = LedgerArchiveTotal.objects.all()
+        if options["customer"]:
+            accounts = accounts.filter(customer_id=options["customer"])
+            lines = lines.filter(account__customer_id=options["customer"])
+            archived = archived.filter(account__customer_id=options["customer"])
+
+        # One grouped query for all accounts instead of one aggregate per account
+        sums = {
+            row["account_id"]: (money_sum(row["debit_sum"]), money_sum(row["credit_sum"]))
+            for row in lines.values("account_id").annotate(
+                debit_sum=Sum("debit"), credit_sum=Sum("credit")
+            ).order_by()
+        }
+        for row in archived.values("account_id").annotate(
+            debit_sum=Sum("debit_total"), credit_sum=Sum("credit_total")
+        ).order_by():
+            debit, credit = sums.get(row["account_id"], (0, 0))
+            sums[row["account_id"]] = (debit + money_sum(row["debit_sum"]), credit + money_sum(row["credit_sum"]))
+
+        checked = 0
+        mismatched = []
+        for acc in accounts.only("id", "debit_total", "credit_total").iterator():
+            checked += 1
+            if (acc.debit_total, acc.credit_total) != sums.get(acc.id, (0, 0)):
+                mismatched.append(acc.id)
+
+        for account_id in mismatched:
+            if options["check"]:
+                self.stdout.write(f"Mismatch on ledger account #{account_id}")
+                continue
+            # Re-aggregate under the row lock so a concurrent posting is not lost
+            with transaction.atomic():
+                acc = LedgerAccount.objects.select_for_update().get(id=account_id)
+                acc.debit_total, acc.credit_total = acc.aggregate_totals()
+                acc.save(update_fields=["debit_total", "credit_total", "updated_at"])
+            self.stdout.write(f"Fixed ledger account #{account_id}")
+
+        if options["check"] and mismatched:
+            raise CommandError(f"{len(mismatched)} of {checked} ledger accounts do not match their lines")
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} ledger accounts, {len(mismatched)} mismatched")
+        )
@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from finance.services.instrumentation import (
+    clear_published_stats,
+    collect_published_stats,
+    percentile_ms,
+)
+
+SORT_KEYS = {
+    "count": lambda s: s["count"],
+    "queries": lambda s: s["queries_total"] / s["count"],
+    "db": lambda s: s["db_ms_total"] / s["count"],
+    "wall": lambda s: s["wall_ms_total"] / s["count"],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows per-view query counts, DB time and latency percentiles recorded "
+        "by QueryInstrumentationMiddleware. Needs a cache shared with the web "
+        "processes (the default LocMemCache is per process)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="queries")
+        parser.add_argument("--json", action="store_true", help="Print the raw merged histogram.")
+        parser.add_argument("--slow-sql", action="store_true", help="Print each view's slowest statement.")
+        parser.add_argument("--reset", action="store_true", help="Drop the published stats after printing.")
+
+    def handle(self, *args, **options):
+        stats = collect_published_stats()
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+        elif not stats:
+            self.stdout.write("No request stats published yet.")
+        else:
+            self.stdout.write(
+                f"{'view':<40}{'reqs':>7}{'avg q':>7}{'max q':>7}{'avg db':>9}"
+                f"{'avg ms':>9}{'p50':>7}{'p95':>7}{'p99':>7}"
+            )
+            rows = sorted(stats.items(), key=lambda item: SORT_KEYS[options["sort"]](item[1]), reverse=True)
+            for label, s in rows:
+                n = s["count"]
+                self.stdout.write(
+                    f"{label:<40}{n:>7}{s['queries_total'] / n:>7.1f}{s['queries_max']:>7}"
+                    f"{s['db_ms_total'] / n:>9.1f}{s['wall_ms_total'] / n:>9.1f}"
+                    f"{percentile_ms(s, 0.5):>7.0f}{percentile_ms(s, 0.95):>7.0f}{percentile_ms(s, 0.99):>7.0f}"
+                )
+                if options["slow_sql"] and s["slowest_sql"]:
+                    self.stdout.write(f"    {s['slowest_sql_ms']:.1f}ms: {s['slowest_sql']}")
+
+        if options["reset"]:
+            clear_published_stats()
+            self.stdout.write("Published stats cleared.")
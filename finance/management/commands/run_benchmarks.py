@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from finance.benchmarks import (
+    CASES,
+    BenchmarkContext,
+    compare,
+    load_baselines,
+    measure,
+    save_baselines,
+)
+from finance.models import Account, Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the hot paths (ledger balance, dashboard, account and transaction "
+        "APIs, transfers) and compares query counts and median latency with "
+        "finance/benchmarks/baselines.json. Load data first with generate_synthetic_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customer", type=int, help="Customer id (default: the one with most transactions).")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--case", action="append", choices=sorted(CASES), help="Run only these cases.")
+        parser.add_argument("--check", action="store_true", help="Exit non-zero on a regression.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.5,
+            help="Allowed median slowdown before --check fails (0.5 = 50%%). Query counts must not grow at all.",
+        )
+        parser.add_argument("--update-baselines", action="store_true")
+
+    def get_context(self, customer_id):
+        customers = Customer.objects.select_related("user")
+        if customer_id:
+            customer = customers.filter(id=customer_id).first()
+        else:
+            customer = (
+                customers.annotate(n=Count("accounts__transactions"))
+                .filter(n__gt=0)
+                .order_by("-n")
+                .first()
+            )
+        if customer is None:
+            raise CommandError("No customer with transactions; run generate_synthetic_data first.")
+
+        account = (
+            Account.objects.filter(customer=customer, ledger_account__isnull=False)
+            .select_related("ledger_account")
+            .order_by("id")
+            .first()
+        )
+        recipient = (
+            Customer.objects.exclude(id=customer.id)
+            .filter(accounts__is_active=True, accounts__ledger_account__isnull=False)
+            .order_by("id")
+            .first()
+        )
+        if account is None or recipient is None:
+            raise CommandError("The customer needs a ledger-backed account and another customer to send to.")
+        return BenchmarkContext(customer=customer, account=account, recipient=recipient)
+
+    def handle(self, *args, **options):
+        ctx = self.get_context(options["customer"])
+        baselines = load_baselines()
+        names = options["case"] or list(CASES)
+
+        self.stdout.write(f"customer={ctx.customer.id} repeat={options['repeat']}")
+        self.stdout.write(f"{'case':<26}{'queries':>8}{'median ms':>12}{'p95 ms':>10}{'baseline':>20}")
+        results = {}
+        problems = []
+        for name in names:
+            queries, median_ms, p95_ms = measure(CASES[name], ctx, options["repeat"])
+            results[name] = {"queries": queries, "median_ms": round(median_ms, 3)}
+            baseline = baselines.get(name)
+            shown = f"{baseline['queries']}q/{baseline['median_ms']:.2f}ms" if baseline else "-"
+            self.stdout.write(f"{name:<26}{queries:>8}{median_ms:>12.2f}{p95_ms:>10.2f}{shown:>20}")
+            if baseline:
+                problems += compare(name, queries, median_ms, baseline, options["tolerance"])
+
+        if options["update_baselines"]:
+            baselines.update(results)
+            save_baselines(baselines)
+            self.stdout.write(self.style.SUCCESS(f"Baselines updated for {len(results)} cases."))
+
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(problem))
+        if problems and options["check"]:
+            raise CommandError(f"{len(problems)} benchmark regression(s).")
@@ -0,0 +1,147 @@
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.utils import timezone
+
+from finance.models import Account, Customer, JournalEntry, LedgerAccount, TransferRequest
+from finance.services.concurrency import conflict_stats, is_retryable_db_error
+from finance.services.exceptions import InsufficientFundsError
+from finance.services.inter_customer_transfers import (
+    get_or_create_system_accounts,
+    get_recipient_default_account,
+    transfer_to_national_id,
+)
+from finance.services.ledger import post_journal_entries
+
+PREFIX = "stress-"
+
+
+def legacy_transfer(sender, from_account, recipient_national_id, amount):
+    """The pre-retry engine: all four accounts locked without ORDER BY, no retries."""
+    recipient = Customer.objects.get(national_id=recipient_national_id)
+    to_ledger = get_recipient_default_account(recipient).ledger_account
+    from_ledger = from_account.ledger_account
+    out_ledger, _ = get_or_create_system_accounts(sender)
+    _, in_ledger = get_or_create_system_accounts(recipient)
+    with transaction.atomic():
+        locked = {
+            acc.id: acc
+            for acc in LedgerAccount.objects.select_for_update()
+            .filter(id__in=[from_ledger.id, to_ledger.id, out_ledger.id, in_ledger.id])
+        }
+        balance = locked[from_ledger.id].balance()
+        if amount > balance:
+            raise InsufficientFundsError(balance=balance, amount=amount)
+        post_journal_entries([
+            {"customer": sender, "date": timezone.now().date(), "memo": "stress", "lines": [
+                {"account": out_ledger, "debit": amount, "credit": 0},
+                {"account": from_ledger, "debit": 0, "credit": amount},
+            ]},
+            {"customer": recipient, "date": timezone.now().date(), "memo": "stress", "lines": [
+                {"account": to_ledger, "debit": amount, "credit": 0},
+                {"account": in_ledger, "debit": 0, "credit": amount},
+            ]},
+        ])
+
+
+def setup_customers(count, prefix=PREFIX):
+    """Customers with one funded asset account each; shared with bench_transfers."""
+    User = get_user_model()
+    run = time.time_ns()
+    customer_ids = []
+    for i in range(count):
+        user = User.objects.create(username=f"{prefix}{run}-{i}")
+        customer = Customer.objects.create(user=user, full_name=f"Stress {i}", national_id=f"{prefix}{run}-{i}")
+        account = Account.objects.create(customer=customer, name="Main")
+        ledger = LedgerAccount.objects.create(
+            customer=customer, name="Main", type=LedgerAccount.ASSET, bank_account=account
+        )
+        equity = LedgerAccount.objects.create(customer=customer, name="Opening Balance", type=LedgerAccount.EQUITY)
+        post_journal_entries([{"customer": customer, "date": timezone.now().date(), "memo": "seed", "lines": [
+            {"account": ledger, "debit": Decimal("1000000"), "credit": 0},
+            {"account": equity, "debit": 0, "credit": Decimal("1000000")},
+        ]}])
+        customer_ids.append(customer.id)
+    return customer_ids
+
+
+def teardown_customers(customer_ids):
+    TransferRequest.objects.filter(customer_id__in=customer_ids).delete()
+    JournalEntry.objects.filter(customer_id__in=customer_ids).delete()
+    get_user_model().objects.filter(customer_profile__id__in=customer_ids).delete()
+
+
+def worker(args):
+    customer_ids, transfers, legacy, seed = args
+    connections.close_all()
+    rng = random.Random(seed)
+    customers = list(Customer.objects.filter(id__in=customer_ids))
+    accounts = {a.customer_id: a for a in Account.objects.filter(customer__in=customers).select_related("ledger_account")}
+
+    done = conflicts = failed = 0
+    for _ in range(transfers):
+        sender, recipient = rng.sample(customers, 2)
+        amount = Decimal(rng.randint(1, 500)) / 100
+        try:
+            if legacy:
+                legacy_transfer(sender, accounts[sender.id], recipient.national_id, amount)
+            else:
+                transfer_to_national_id(sender, accounts[sender.id], recipient.national_id, amount, memo="stress")
+            done += 1
+        except OperationalError as exc:
+            if not is_retryable_db_error(exc):
+                raise
+            conflicts += 1
+        except InsufficientFundsError:
+            failed += 1
+    connections.close_all()
+    return done, conflicts, failed, conflict_stats["retries"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs random transfers between a small set of customers from several "
+        "processes and reports transfers/sec and deadlock counts. Use --legacy "
+        "to measure the unordered, non-retrying engine for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--transfers", type=int, default=200, help="Transfers per process.")
+        parser.add_argument("--customers", type=int, default=4, help="Fewer customers means more contention.")
+        parser.add_argument("--legacy", action="store_true")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated customers.")
+
+    def handle(self, *args, **options):
+        customer_ids = setup_customers(options["customers"])
+        # Children must open their own connections
+        connections.close_all()
+
+        jobs = [
+            (customer_ids, options["transfers"], options["legacy"], seed)
+            for seed in range(options["processes"])
+        ]
+        started = time.perf_counter()
+        try:
+            with multiprocessing.get_context("fork").Pool(options["processes"]) as pool:
+                results = pool.map(worker, jobs)
+        finally:
+            elapsed = time.perf_counter() - started
+            if not options["keep"]:
+                teardown_customers(customer_ids)
+
+        done = sum(r[0] for r in results)
+        conflicts = sum(r[1] for r in results)
+        insufficient = sum(r[2] for r in results)
+        retries = sum(r[3] for r in results)
+        mode = "legacy" if options["legacy"] else "ordered+retry"
+        self.stdout.write(
+            f"{mode}: {done} transfers in {elapsed:.2f}s ({done / elapsed:,.1f}/sec), "
+            f"{conflicts} failed on deadlock/serialization, {retries} retried, "
+            f"{insufficient} insufficient funds"
+        )
@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from finance.services.exports import iter_rows
+from finance.services.reports import REPORT_CHUNK_SIZE, TRIAL_BALANCE_FIELDS, iter_trial_balance
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a trial balance (one row per ledger account) for one customer "
+        "or the whole book, from a single grouped query over ledger lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customer", type=int, help="Limit to one customer id (default: all).")
+        parser.add_argument("--date-from")
+        parser.add_argument("--date-to")
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--output", help="File to write to (default: stdout).")
+        parser.add_argument("--chunk-size", type=int, default=REPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ("date_from", "date_to"):
+            value = options[name]
+            if value and parse_date(value) is None:
+                raise CommandError(f"--{name.replace('_', '-')} must be YYYY-MM-DD")
+            dates[name] = parse_date(value) if value else None
+
+        # Totals are kept as the rows go by; the rows themselves are not
+        totals = {"debit": 0, "credit": 0}
+
+        def rows():
+            for row in iter_trial_balance(customer_id=options["customer"], chunk_size=options["chunk_size"], **dates):
+                totals["debit"] += row["closing_debit"]
+                totals["credit"] += row["closing_credit"]
+                yield tuple(row[f] for f in TRIAL_BALANCE_FIELDS)
+
+        chunks = iter_rows(rows(), TRIAL_BALANCE_FIELDS, options["format"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as fh:
+                fh.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
+
+        message = f"Total debit {totals['debit']}, total credit {totals['credit']}"
+        if totals["debit"] != totals["credit"]:
+            raise CommandError(f"Trial balance does not balance: {message}")
+        self.stderr.write(message)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.services.periods import verify_checkpoints
+
+
+class Command(BaseCommand):
+    help = "Re-derives every LedgerCheckpoint from the raw ledger lines and reports differences."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customer", type=int)
+
+    def handle(self, *args, **options):
+        mismatches = verify_checkpoints(customer_id=options["customer"])
+        for cp, debit, credit in mismatches:
+            self.stdout.write(
+                f"Checkpoint #{cp.id} ({cp.account} @ {cp.date}): stored D:{cp.debit_total} "
+                f"C:{cp.credit_total}, lines D:{debit} C:{credit}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} checkpoints do not match their lines")
+        self.stdout.write(self.style.SUCCESS("All checkpoints match"))
@@ -0,0 +1,57 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.services.integrity import CHUNK_SIZE, SETTLE_SECONDS, verify_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that every journal entry balances, that every ledger line has "
+        "exactly one positive side and matches its entry's date and customer, "
+        "and that transfers match the entries posting them. Entries are "
+        "checked in id-range chunks by a pool of processes. --incremental "
+        "starts after the last entry a previous run checked."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--incremental", action="store_true")
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Journal entry ids per chunk.")
+        parser.add_argument("--settle-seconds", type=int, default=SETTLE_SECONDS,
+                            help="Leave entries younger than this for the next run.")
+        parser.add_argument("--limit", type=int, default=50, help="Problems to print.")
+        parser.add_argument("--json", action="store_true", help="Print the full report as JSON.")
+
+    def handle(self, *args, **options):
+        report = verify_ledger(
+            incremental=options["incremental"],
+            processes=options["processes"],
+            chunk_size=options["chunk_size"],
+            settle_seconds=options["settle_seconds"],
+        )
+        problems = report["problems"]
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            if report["first_entry_id"] is None:
+                self.stdout.write("No new journal entries to check")
+            else:
+                rate = report["entries"] / report["seconds"] if report["seconds"] else 0
+                self.stdout.write(
+                    f"Checked entries #{report['first_entry_id']}-#{report['last_entry_id']}: "
+                    f"{report['entries']} entries, {report['lines']} lines in {report['chunks']} chunks, "
+                    f"{report['seconds']}s ({rate:.0f} entries/sec)"
+                )
+            for p in problems[:options["limit"]]:
+                where = f"JE#{p['entry_id']}" if p["entry_id"] else f"Transfer#{p['transfer_id']}"
+                if "line_id" in p:
+                    where += f" line #{p['line_id']}"
+                self.stdout.write(f"{p['check']:<18} {where}: {p['detail']}")
+            if len(problems) > options["limit"]:
+                self.stdout.write(f"... and {len(problems) - options['limit']} more")
+        if problems:
+            counts = ", ".join(f"{check}: {n}" for check, n in sorted(report["counts"].items()))
+            raise CommandError(f"{len(problems)} problems found ({counts})")
+        self.stdout.write(self.style.SUCCESS("Ledger is consistent"))
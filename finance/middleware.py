@@ -0,0 +1,79 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from finance.services.instrumentation import RequestProfile, request_histogram
+
+
+def view_label(request, view_func):
+    """
+    "AccountViewSet.list" for DRF viewsets, the function name for @api_view
+    and plain Django views.
+    """
+    view = getattr(view_func, "cls", view_func)
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return f"{view.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+    return view.__name__
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records query count, DB time, the slowest statement and wall time of
+    each request. Adds a Server-Timing header and feeds the in-process
+    histogram read by the request_stats command.
+
+    Queries run while a StreamingHttpResponse is consumed happen after the
+    middleware returns and are not counted.
+
+    Under ASGI the async ORM runs a request's queries on its thread-sensitive
+    executor thread, so the execute wrappers are installed on that thread.
+
+    Only active when FINANCE_QUERY_INSTRUMENTATION is set (default: DEBUG);
+    otherwise Django drops it from the chain at startup.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "FINANCE_QUERY_INSTRUMENTATION", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = self.start(request)
+        with profile.capture():
+            response = self.get_response(request)
+        return self.finish(profile, response)
+
+    async def __acall__(self, request):
+        profile = self.start(request)
+        capture = profile.capture()
+        await sync_to_async(capture.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(capture.__exit__)(None, None, None)
+        # The histogram may publish to a database-backed cache
+        return await sync_to_async(self.finish)(profile, response)
+
+    def start(self, request):
+        # Replaced by the view name once the URL resolves; unresolved paths
+        # share one label so 404 scans cannot grow the histogram
+        profile = RequestProfile(label="<unresolved>")
+        request.query_profile = profile
+        return profile
+
+    def finish(self, profile, response):
+        response["Server-Timing"] = profile.server_timing()
+        request_histogram.record(profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_profile.label = view_label(request, view_func)
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:54
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+BATCH_SIZE = 2000
+CENT = Decimal("0.01")
+
+
+def money(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def fill_ledger_totals(apps, schema_editor):
+    """Sets the new totals of existing accounts from their lines."""
+    LedgerAccount = apps.get_model("finance", "LedgerAccount")
+    LedgerLine = apps.get_model("finance", "LedgerLine")
+    totals = {
+        row["account_id"]: (money(row["debit_sum"]), money(row["credit_sum"]))
+        for row in LedgerLine.objects.values("account_id")
+        .annotate(debit_sum=Sum("debit"), credit_sum=Sum("credit"))
+        .order_by()
+    }
+    accounts = list(LedgerAccount.objects.filter(id__in=totals).only("id"))
+    for acc in accounts:
+        acc.debit_total, acc.credit_total = totals[acc.id]
+    LedgerAccount.objects.bulk_update(accounts, ["debit_total", "credit_total"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgeraccount',
+            name='credit_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='ledgeraccount',
+            name='debit_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18),
+        ),
+        migrations.RunPython(fill_ledger_totals, migrations.RunPython.noop),
+    ]
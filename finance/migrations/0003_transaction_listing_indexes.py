@@ -0,0 +1,72 @@
+"""
+Indexes for the transaction listing and dated ledger lookups. LedgerLine.date
+is copied from its entry and Transaction.customer from its account; both are
+added nullable, filled from the existing rows, then made non-null.
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_ledger_line_dates(apps, schema_editor):
+    LedgerLine = apps.get_model("finance", "LedgerLine")
+    JournalEntry = apps.get_model("finance", "JournalEntry")
+    LedgerLine.objects.filter(date__isnull=True).update(
+        date=Subquery(JournalEntry.objects.filter(id=OuterRef("entry_id")).values("date")[:1])
+    )
+
+
+def fill_transaction_customer(apps, schema_editor):
+    Transaction = apps.get_model("finance", "Transaction")
+    Account = apps.get_model("finance", "Account")
+    Transaction.objects.filter(customer__isnull=True).update(
+        customer=Subquery(Account.objects.filter(id=OuterRef("account_id")).values("customer_id")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_ledger_account_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgerline',
+            name='date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_ledger_line_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ledgerline',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='customer',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='finance.customer'),
+        ),
+        migrations.RunPython(fill_transaction_customer, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='transaction',
+            name='customer',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='finance.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', '-date', '-created_at', '-id'], name='txn_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', '-date', '-created_at', '-id'], name='txn_account_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', '-date'], name='txn_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerline',
+            index=models.Index(fields=['account', 'date', 'id'], name='ledgerline_account_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_transaction_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='books_closed_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='finance.ledgeraccount')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('account', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:00
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+BATCH_SIZE = 2000
+CENT = Decimal("0.01")
+
+
+def money(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def fill_daily_balances(apps, schema_editor):
+    """One cumulative snapshot per account and day with lines, from the existing lines."""
+    LedgerLine = apps.get_model("finance", "LedgerLine")
+    LedgerDailyBalance = apps.get_model("finance", "LedgerDailyBalance")
+    per_day = (
+        LedgerLine.objects.values("account_id", "date")
+        .annotate(debit_sum=Sum("debit"), credit_sum=Sum("credit"))
+        .order_by("account_id", "date")
+    )
+    totals = {}
+    snapshots = []
+    for row in per_day.iterator(chunk_size=BATCH_SIZE):
+        debit, credit = totals.get(row["account_id"], (Decimal(0), Decimal(0)))
+        debit, credit = debit + money(row["debit_sum"]), credit + money(row["credit_sum"])
+        totals[row["account_id"]] = (debit, credit)
+        snapshots.append(LedgerDailyBalance(
+            account_id=row["account_id"], date=row["date"], debit_total=debit, credit_total=credit
+        ))
+        if len(snapshots) >= BATCH_SIZE:
+            LedgerDailyBalance.objects.bulk_create(snapshots)
+            snapshots = []
+    LedgerDailyBalance.objects.bulk_create(snapshots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_period_close_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='finance.ledgeraccount')),
+            ],
+            options={
+                'ordering': ['account', 'date'],
+                'unique_together': {('account', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_daily_balances, migrations.RunPython.noop),
+    ]
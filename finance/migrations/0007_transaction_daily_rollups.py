@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:04
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 2000
+CENT = Decimal("0.01")
+
+
+def money(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def fill_rollups(apps, schema_editor):
+    """One rollup row per account, category and day, from the existing transactions."""
+    Transaction = apps.get_model("finance", "Transaction")
+    TransactionDailyRollup = apps.get_model("finance", "TransactionDailyRollup")
+    grouped = (
+        Transaction.objects.values("customer_id", "account_id", "category_id", "date")
+        .annotate(total_sum=Sum("amount"), row_count=Count("id"))
+        .order_by()
+    )
+    batch = []
+    for row in grouped.iterator(chunk_size=BATCH_SIZE):
+        batch.append(TransactionDailyRollup(
+            customer_id=row["customer_id"],
+            account_id=row["account_id"],
+            category_id=row["category_id"],
+            date=row["date"],
+            total=money(row["total_sum"]),
+            count=row["row_count"],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            TransactionDailyRollup.objects.bulk_create(batch)
+            batch = []
+    TransactionDailyRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_ledger_daily_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='finance.account')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='finance.category')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to='finance.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', 'date'], name='rollup_customer_date_idx')],
+                'unique_together': {('account', 'category', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
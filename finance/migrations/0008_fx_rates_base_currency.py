@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_transaction_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='base_currency',
+            field=models.CharField(default='IRR', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='FxRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=24)),
+            ],
+            options={
+                'ordering': ['currency', 'date'],
+                'unique_together': {('currency', 'date')},
+            },
+        ),
+    ]
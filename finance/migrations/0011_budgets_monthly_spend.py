@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:06
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+BATCH_SIZE = 2000
+CENT = Decimal("0.01")
+
+
+def money(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def fill_monthly_spend(apps, schema_editor):
+    """One counter per account, category and month, from the existing transactions."""
+    Transaction = apps.get_model("finance", "Transaction")
+    MonthlySpend = apps.get_model("finance", "MonthlySpend")
+    grouped = (
+        Transaction.objects.annotate(month=TruncMonth("date"))
+        .values("customer_id", "account_id", "category_id", "month")
+        .annotate(total_sum=Sum("amount"), row_count=Count("id"))
+        .order_by()
+    )
+    batch = []
+    for row in grouped.iterator(chunk_size=BATCH_SIZE):
+        batch.append(MonthlySpend(
+            customer_id=row["customer_id"],
+            account_id=row["account_id"],
+            category_id=row["category_id"],
+            month=row["month"],
+            total=money(row["total_sum"]),
+            count=row["row_count"],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            MonthlySpend.objects.bulk_create(batch)
+            batch = []
+    MonthlySpend.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('alert_percent', models.PositiveSmallIntegerField(default=80)),
+                ('category', models.ForeignKey(limit_choices_to={'type': 'expense'}, on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='finance.category')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='finance.customer')),
+            ],
+            options={
+                'unique_together': {('customer', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spend', to='finance.account')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spend', to='finance.category')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spend', to='finance.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', 'month'], name='monthlyspend_customer_idx')],
+                'unique_together': {('account', 'category', 'month')},
+            },
+        ),
+        migrations.RunPython(fill_monthly_spend, migrations.RunPython.noop),
+    ]
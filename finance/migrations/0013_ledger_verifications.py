@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_recurring_transactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerVerification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('first_entry_id', models.PositiveBigIntegerField()),
+                ('last_entry_id', models.PositiveBigIntegerField()),
+                ('entries_checked', models.PositiveIntegerField(default=0)),
+                ('lines_checked', models.PositiveIntegerField(default=0)),
+                ('problem_count', models.PositiveIntegerField(default=0)),
+                ('problems', models.JSONField(default=list)),
+            ],
+            options={
+                'ordering': ['-last_entry_id'],
+            },
+        ),
+    ]
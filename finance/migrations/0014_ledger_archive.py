@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_ledger_verifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='ledger_archived_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='LedgerArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date_from', models.DateField()),
+                ('date_to', models.DateField()),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('line_count', models.PositiveIntegerField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_archives', to='finance.customer')),
+            ],
+            options={
+                'ordering': ['customer', 'date_from'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerArchiveTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_totals', to='finance.ledgeraccount')),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='finance.ledgerarchive')),
+            ],
+            options={
+                'unique_together': {('archive', 'account')},
+            },
+        ),
+    ]
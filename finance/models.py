@@ -1,7 +1,17 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Sum
 
+CENT = Decimal("0.01")
+
+
+def money_sum(value):
+    # SQLite sums decimal columns as floats; round back to cents before comparing
+    return Decimal(value or 0).quantize(CENT)
+
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -46,6 +56,15 @@ class Customer(TimeStampedModel):
 
     phone_number = models.CharField(max_length=50, blank=True)
 
+    # سندی با تاریخ <= این تاریخ قابل ثبت نیست (دوره بسته شده)
+    books_closed_through = models.DateField(null=True, blank=True)
+
+    # سطرهای دفتر با تاریخ <= این تاریخ به فایل‌های آرشیو منتقل شده‌اند
+    ledger_archived_through = models.DateField(null=True, blank=True)
+
+    # گزارش‌ها و داشبورد مبالغ را به این ارز تبدیل می‌کنند
+    base_currency = models.CharField(max_length=10, default="IRR")
+
     class Meta:
         ordering = ["full_name", "id"]
 
@@ -80,6 +99,37 @@ class Account(TimeStampedModel):
         return f"{self.name} ({self.currency})"
 
 
+class FxRate(models.Model):
+    """
+    Value of one unit of `currency` in the reference currency
+    (FINANCE_FX_REFERENCE_CURRENCY) on `date`. Loaded from CSV by
+    load_fx_rates; converting A to B divides A's rate by B's.
+    """
+    currency = models.CharField(max_length=10)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=24, decimal_places=10)
+
+    class Meta:
+        unique_together = [("currency", "date")]
+        ordering = ["currency", "date"]
+
+    def __str__(self):
+        return f"{self.currency} @ {self.date}: {self.rate}"
+
+
+class TransactionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so the denormalised customer is filled here
+        objs = list(objs)
+        missing = {t.account_id for t in objs if t.customer_id is None}
+        if missing:
+            owners = dict(Account.objects.filter(id__in=missing).values_list("id", "customer_id"))
+            for t in objs:
+                if t.customer_id is None:
+                    t.customer_id = owners.get(t.account_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Transaction(TimeStampedModel):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     date = models.DateField()
@@ -93,14 +143,46 @@ class Transaction(TimeStampedModel):
         on_delete=models.PROTECT,
         related_name="transactions",
     )
+    # کپی account.customer تا فهرست تراکنش‌های مشتری از یک ایندکس خوانده شود
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="transactions",
+        editable=False,
+    )
     description = models.CharField(max_length=255, blank=True)
 
+    # برای تراکنش‌های واردشده از صورت‌حساب بانکی؛ جلوی ورود تکراری را می‌گیرد
+    import_hash = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
+    # شناسه‌ی یک بار درج گروهی؛ ردیف‌هایی را که همان بار درج کرده مشخص می‌کند
+    import_batch = models.UUIDField(null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ["-date", "-created_at"]
+        indexes = [
+            # Keyset pagination and date-range filters: the default listing
+            # across all of a customer's accounts, and ?account=
+            models.Index(fields=["customer", "-date", "-created_at", "-id"], name="txn_customer_date_idx"),
+            models.Index(fields=["account", "-date", "-created_at", "-id"], name="txn_account_date_idx"),
+            models.Index(fields=["category", "-date"], name="txn_category_date_idx"),
+        ]
+
+    objects = TransactionQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.date} - {self.amount} ({self.category})"
 
+    def save(self, *args, **kwargs):
+        if self.account_id is not None:
+            self.customer_id = self.account.customer_id
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "account" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "customer"}
+        # post_save applies the rollup deltas (finance.signals); they commit
+        # or roll back together with the row. delete() is already atomic.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def is_income(self):
         return self.category.type == Category.INCOME
@@ -109,6 +191,118 @@ class Transaction(TimeStampedModel):
     def is_expense(self):
         return self.category.type == Category.EXPENSE
 
+class RecurringTransaction(TimeStampedModel):
+    """
+    A rule that creates a Transaction every `interval` days, weeks, months
+    or years from `start_date` (RRULE FREQ/INTERVAL). Monthly and yearly
+    rules keep the day of `start_date`, clamped to the end of short months.
+    materialize_recurring creates the due occurrences.
+    """
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    YEARLY = "yearly"
+
+    FREQUENCIES = [
+        (DAILY, "Daily"),
+        (WEEKLY, "Weekly"),
+        (MONTHLY, "Monthly"),
+        (YEARLY, "Yearly"),
+    ]
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="recurring_transactions")
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name="recurring_transactions")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.CharField(max_length=255, blank=True)
+
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES)
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # اولین رخدادی که هنوز ساخته نشده
+    next_date = models.DateField()
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_active", "next_date"], name="recurring_due_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.next_date is None:
+            self.next_date = self.start_date
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.description or self.category} ({self.get_frequency_display()}, every {self.interval})"
+
+
+class TransactionDailyRollup(models.Model):
+    """
+    Sum and count of one account's transactions in one category on one day.
+    Whether the amount is income or expense comes from the category type.
+    Kept current by the Transaction signals; rebuild_transaction_rollups
+    recreates it from scratch.
+    """
+    customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="transaction_rollups")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="daily_rollups")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="daily_rollups")
+    date = models.DateField()
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("account", "category", "date")]
+        indexes = [
+            models.Index(fields=["customer", "date"], name="rollup_customer_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account} / {self.category} @ {self.date}: {self.total} ({self.count})"
+
+
+class MonthlySpend(models.Model):
+    """
+    The same counters as TransactionDailyRollup at month grain, read by the
+    budget checks. `month` is the first day of the month.
+    """
+    customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="monthly_spend")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="monthly_spend")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="monthly_spend")
+    month = models.DateField()
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("account", "category", "month")]
+        indexes = [
+            models.Index(fields=["customer", "month"], name="monthlyspend_customer_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account} / {self.category} @ {self.month:%Y-%m}: {self.total} ({self.count})"
+
+
+class Budget(TimeStampedModel):
+    customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="budgets")
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="budgets",
+        limit_choices_to={"type": Category.EXPENSE},
+    )
+    # سقف ماهانه به ارز پایه‌ی مشتری
+    amount = models.DecimalField(max_digits=18, decimal_places=2)
+    # Percent of the budget at which the category is flagged
+    alert_percent = models.PositiveSmallIntegerField(default=80)
+
+    class Meta:
+        unique_together = [("customer", "category")]
+
+    def __str__(self):
+        return f"{self.customer} / {self.category}: {self.amount}"
+
+
 class LedgerAccount(TimeStampedModel):
     ASSET = "asset"
     LIABILITY = "liability"
@@ -123,6 +317,8 @@ class LedgerAccount(TimeStampedModel):
         (INCOME, "Income"),
         (EXPENSE, "Expense"),
     ]
+    # Types whose balance grows with debits
+    DEBIT_NORMAL_TYPES = (ASSET, EXPENSE)
 
     customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="ledger_accounts")
     name = models.CharField(max_length=120)
@@ -137,17 +333,53 @@ class LedgerAccount(TimeStampedModel):
         related_name="ledger_account",
     )
 
+    # مجموع بدهکار/بستانکار همه‌ی سطرها؛ post_journal_entry به‌روزش می‌کند
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
     def balance(self):
+        return self.signed_balance(self.debit_total, self.credit_total)
+
+    def signed_balance(self, debit, credit):
+        if self.type in self.DEBIT_NORMAL_TYPES:
+            return debit - credit
+        return credit - debit
+
+    def totals_as_of(self, date):
+        """
+        (debit, credit) through `date`, read from the latest daily balance
+        snapshot on or before it: one index seek, no line scan.
+        """
+        snapshot = (
+            self.daily_balances.filter(date__lte=date)
+            .order_by("-date")
+            .values_list("debit_total", "credit_total")
+            .first()
+        )
+        return snapshot or (0, 0)
+
+    def balance_as_of(self, date):
+        return self.signed_balance(*self.totals_as_of(date))
+
+    def aggregate_totals(self):
+        """
+        Re-sums every line of this account, live and archived. Only used to
+        verify or rebuild debit_total / credit_total; use balance()
+        everywhere else.
+        """
         totals = self.lines.aggregate(
             debit_sum=Sum("debit"),
             credit_sum=Sum("credit"),
         )
-        debit = totals["debit_sum"] or 0
-        credit = totals["credit_sum"] or 0
+        archived = self.archived_totals.aggregate(
+            debit_sum=Sum("debit_total"),
+            credit_sum=Sum("credit_total"),
+        )
+        return (
+            money_sum(totals["debit_sum"]) + money_sum(archived["debit_sum"]),
+            money_sum(totals["credit_sum"]) + money_sum(archived["credit_sum"]),
+        )
 
-        if self.type in [self.ASSET, self.EXPENSE]:
-            return debit - credit
-        return credit - debit
     class Meta:
         unique_together = [("customer", "name")]
         ordering = ["type", "name"]
@@ -156,6 +388,43 @@ class LedgerAccount(TimeStampedModel):
         return f"{self.name} ({self.get_type_display()})"
 
 
+class LedgerCheckpoint(TimeStampedModel):
+    """
+    Cumulative debit/credit totals of a ledger account through `date`
+    (inclusive), written when a period is closed.
+    """
+    account = models.ForeignKey(LedgerAccount, on_delete=models.CASCADE, related_name="checkpoints")
+    date = models.DateField()
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [("account", "date")]
+        ordering = ["-date"]
+
+    def __str__(self):
+        return f"{self.account} @ {self.date} D:{self.debit_total} C:{self.credit_total}"
+
+
+class LedgerDailyBalance(models.Model):
+    """
+    Cumulative debit/credit totals of a ledger account through the end of
+    `date`. There is a row for every day the account had activity; the
+    balance on any date is the latest row on or before it.
+    """
+    account = models.ForeignKey(LedgerAccount, on_delete=models.CASCADE, related_name="daily_balances")
+    date = models.DateField()
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [("account", "date")]
+        ordering = ["account", "date"]
+
+    def __str__(self):
+        return f"{self.account} @ {self.date} D:{self.debit_total} C:{self.credit_total}"
+
+
 class JournalEntry(TimeStampedModel):
     customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="journal_entries")
     date = models.DateField()
@@ -176,12 +445,52 @@ class LedgerLine(TimeStampedModel):
     debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    # کپی entry.date تا بتوان بدون join روی (account, date) جستجو کرد
+    date = models.DateField()
+
     class Meta:
         ordering = ["id"]
+        indexes = [
+            models.Index(fields=["account", "date", "id"], name="ledgerline_account_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.account} D:{self.debit} C:{self.credit}"
 
+class LedgerArchive(TimeStampedModel):
+    """
+    A segment of archived ledger lines of one customer: the lines dated
+    date_from..date_to, moved out of LedgerLine into columnar files under
+    FINANCE_ARCHIVE_DIR/<path>. Segments are written once and never changed.
+    """
+    customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="ledger_archives")
+    date_from = models.DateField()
+    date_to = models.DateField()
+    path = models.CharField(max_length=255, unique=True)
+    line_count = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["customer", "date_from"]
+
+    def __str__(self):
+        return f"Archive {self.customer_id} {self.date_from}..{self.date_to} ({self.line_count} lines)"
+
+
+class LedgerArchiveTotal(models.Model):
+    """The totals of one ledger account's lines in an archive segment, kept in the live DB."""
+    archive = models.ForeignKey(LedgerArchive, on_delete=models.CASCADE, related_name="totals")
+    account = models.ForeignKey(LedgerAccount, on_delete=models.PROTECT, related_name="archived_totals")
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    line_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [("archive", "account")]
+
+    def __str__(self):
+        return f"{self.account} in {self.archive_id} D:{self.debit_total} C:{self.credit_total}"
+
+
 class Transfer(TimeStampedModel):
     customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="transfers")
     from_account = models.ForeignKey(
@@ -199,4 +508,80 @@ class Transfer(TimeStampedModel):
     )
 
     def __str__(self):
-        return f"{self.from_account} → {self.to_account} ({self.amount})"
\ No newline at end of file
+        return f"{self.from_account} → {self.to_account} ({self.amount})"
+
+
+class LedgerVerification(TimeStampedModel):
+    """One run of verify_ledger: the journal entry id range it checked and what it found."""
+
+    first_entry_id = models.PositiveBigIntegerField()
+    last_entry_id = models.PositiveBigIntegerField()
+    entries_checked = models.PositiveIntegerField(default=0)
+    lines_checked = models.PositiveIntegerField(default=0)
+    problem_count = models.PositiveIntegerField(default=0)
+    # The first problems found (capped), as reported by the command
+    problems = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ["-last_entry_id"]
+
+    def __str__(self):
+        return f"Verification JE#{self.first_entry_id}-{self.last_entry_id} ({self.problem_count} problems)"
+
+class TransferRequest(TimeStampedModel):
+    """A transfer accepted by the API in async mode, posted later by the process_transfers worker."""
+
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    STATUSES = [
+        (PENDING, "Pending"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    ]
+
+    customer = models.ForeignKey("Customer", on_delete=models.CASCADE, related_name="transfer_requests")
+    from_account = models.ForeignKey("Account", on_delete=models.PROTECT, related_name="transfer_requests")
+    recipient_national_id = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    date = models.DateField()
+    memo = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    detail = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's scan: pending rows of one source account, oldest first
+            models.Index(fields=["status", "from_account", "id"], name="transferreq_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"TransferRequest#{self.id} {self.amount} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """The stored response of a POST sent with an Idempotency-Key header, replayed on retries."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys")
+    # Which endpoint the key was used on; the same key may be reused across endpoints
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="idempotency_key_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="idempotency_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status_code})"
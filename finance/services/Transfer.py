@@ -1,10 +1,11 @@
 from decimal import Decimal
 from django.db import transaction
 
-from finance.services.ledger import post_journal_entry
+from finance.services.concurrency import retry_on_conflict
+from finance.services.ledger import lock_ledger_accounts, post_journal_entries
 from finance.services.exceptions import InsufficientFundsError
-from finance.models import LedgerAccount
 
+@retry_on_conflict()
 def transfer_funds(customer, from_account, to_account, amount, date, memo=""):
     amount = Decimal(amount)
 
@@ -21,13 +22,9 @@ def transfer_funds(customer, from_account, to_account, amount, date, memo=""):
 
     with transaction.atomic():
         # Lock accounts for concurrency safety (works best on Postgres/MySQL)
-        locked = (
-            LedgerAccount.objects.select_for_update()
-            .filter(id__in=[from_ledger.id, to_ledger.id])
-        )
-        list(locked)
+        locked = lock_ledger_accounts([from_ledger.id, to_ledger.id])
 
-        current_balance = from_ledger.balance()
+        current_balance = locked[from_ledger.id].balance()
         if amount > current_balance:
             raise InsufficientFundsError(balance=current_balance, amount=amount)
 
@@ -36,10 +33,12 @@ def transfer_funds(customer, from_account, to_account, amount, date, memo=""):
             {"account": from_ledger, "debit": 0, "credit": amount},
         ]
 
-        entry = post_journal_entry(
-            customer=customer,
-            date=date,
-            memo=memo or f"Transfer {amount}",
-            lines=lines,
-        )
+        [entry] = post_journal_entries([
+            {
+                "customer": customer,
+                "date": date,
+                "memo": memo or f"Transfer {amount}",
+                "lines": lines,
+            },
+        ])
         return entry
@@ -0,0 +1,343 @@
+"""
+Cold storage for ledger lines of closed periods.
+
+archive_closed_lines moves a customer's lines dated on or before
+books_closed_through out of LedgerLine into a segment directory of raw
+little-endian columns, sorted by (account, date, id):
+
+    account_id.bin  int64
+    entry_id.bin    int64
+    date.bin        int32  (proleptic Gregorian ordinal)
+    amount.bin      int64  (minor units; debits positive, credits negative)
+
+plus a manifest.json. Per-account totals of every segment stay in the live
+DB as LedgerArchiveTotal rows, which answer any report whose range covers a
+segment completely. Only a segment cut by a report's date bounds is read,
+memory-mapped and scanned with NumPy, or in pure Python where NumPy is not
+installed.
+"""
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Q, Sum
+
+from finance.models import CENT, Customer, LedgerArchive, LedgerArchiveTotal, LedgerLine, money_sum
+
+try:
+    import numpy as np
+except ImportError:  # optional; segments are then scanned in pure Python
+    np = None
+
+FORMAT_VERSION = 1
+ARCHIVE_CHUNK_SIZE = 50000
+# (name, array typecode, numpy dtype); all little-endian on disk
+COLUMNS = (
+    ("account_id", "q", "<i8"),
+    ("entry_id", "q", "<i8"),
+    ("date", "i", "<i4"),
+    ("amount", "q", "<i8"),
+)
+MINOR_UNITS = 100
+TOTAL_FIELDS = ("opening_debit", "opening_credit", "debit", "credit")
+
+
+def archive_root():
+    return Path(getattr(settings, "FINANCE_ARCHIVE_DIR", settings.BASE_DIR / "ledger_archive"))
+
+
+def to_minor(value):
+    return int(value * MINOR_UNITS)
+
+
+def from_minor(value):
+    return (Decimal(value) / MINOR_UNITS).quantize(CENT)
+
+
+def write_columns(files, rows):
+    columns = [array(typecode) for _, typecode, _ in COLUMNS]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    for column, f in zip(columns, files):
+        if sys.byteorder != "little":
+            column.byteswap()
+        column.tofile(f)
+
+
+def write_segment(directory, lines, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Writes (account_id, entry_id, date, debit, credit) rows, already in
+    (account, date, id) order, as a segment. Returns
+    ({account_id: [debit, credit, lines]} in minor units, rows written).
+    Raises ValueError on a line with both or neither side set, which a
+    signed amount cannot represent.
+    """
+    tmp = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    totals = defaultdict(lambda: [0, 0, 0])
+    count = 0
+    files = [open(tmp / f"{name}.bin", "wb") for name, _, _ in COLUMNS]
+    try:
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                break
+            rows = []
+            for account_id, entry_id, day, debit, credit in chunk:
+                if (debit > 0) == (credit > 0) or debit < 0 or credit < 0:
+                    raise ValueError(f"Ledger line of entry #{entry_id} has debit {debit} and credit {credit}")
+                amount = to_minor(debit) or -to_minor(credit)
+                total = totals[account_id]
+                total[0 if amount > 0 else 1] += abs(amount)
+                total[2] += 1
+                rows.append((account_id, entry_id, day.toordinal(), amount))
+            write_columns(files, rows)
+            count += len(rows)
+        for f in files:
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        for f in files:
+            f.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    for f in files:
+        f.close()
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "rows": count,
+        "order": ["account_id", "date", "id"],
+        "minor_units": MINOR_UNITS,
+        "columns": {name: dtype for name, _, dtype in COLUMNS},
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, directory)
+    return totals, count
+
+
+def archive_closed_lines(customer, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Moves the customer's ledger lines dated after the previous archive and
+    on or before books_closed_through into a new segment, leaving
+    LedgerArchiveTotal rows behind. Returns the LedgerArchive, or None when
+    there was nothing to archive.
+    """
+    with transaction.atomic():
+        # Serializes with close_period and other archive runs of this customer
+        customer = Customer.objects.select_for_update().get(id=customer.id)
+        through, previous = customer.books_closed_through, customer.ledger_archived_through
+        if through is None or (previous is not None and through <= previous):
+            return None
+
+        lines = LedgerLine.objects.filter(account__customer=customer, date__lte=through)
+        if previous is not None:
+            lines = lines.filter(date__gt=previous)
+        first = lines.aggregate(first=Min("date"))["first"]
+
+        archive = None
+        if first is not None:
+            date_from = previous + timedelta(days=1) if previous else first
+            path = f"customer_{customer.id}/{date_from:%Y%m%d}-{through:%Y%m%d}"
+            directory = archive_root() / path
+            if directory.exists():
+                # Left by a run whose transaction rolled back: nothing refers to it
+                shutil.rmtree(directory)
+            rows = (
+                lines.order_by("account_id", "date", "id")
+                .values_list("account_id", "entry_id", "date", "debit", "credit")
+                .iterator(chunk_size=chunk_size)
+            )
+            totals, count = write_segment(directory, rows, chunk_size)
+            archive = LedgerArchive.objects.create(
+                customer=customer, date_from=date_from, date_to=through, path=path, line_count=count
+            )
+            LedgerArchiveTotal.objects.bulk_create(
+                LedgerArchiveTotal(
+                    archive=archive,
+                    account_id=account_id,
+                    debit_total=from_minor(debit),
+                    credit_total=from_minor(credit),
+                    line_count=n,
+                )
+                for account_id, (debit, credit, n) in totals.items()
+            )
+            lines.delete()
+
+        customer.ledger_archived_through = through
+        customer.save(update_fields=["ledger_archived_through", "updated_at"])
+    return archive
+
+
+def open_column(path, typecode, dtype):
+    if np is not None:
+        return np.memmap(path, dtype=dtype, mode="r")
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if sys.byteorder != "little":
+        column = array(typecode, mapped)
+        column.byteswap()
+        return column
+    return memoryview(mapped).cast(typecode)
+
+
+def read_segment(archive):
+    directory = archive_root() / archive.path
+    return [open_column(directory / f"{name}.bin", typecode, dtype) for name, typecode, dtype in COLUMNS]
+
+
+def scan_segment(archive, date_from=None, date_to=None, opening=True):
+    """
+    Per-account totals of the segment's lines in minor units, as
+    {account_id: [opening_debit, opening_credit, debit, credit]}: lines
+    before `date_from` count as opening (when `opening`), lines from
+    `date_from` through `date_to` as movement.
+    """
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    if not archive.line_count:
+        return totals
+    accounts, _, dates, amounts = read_segment(archive)
+    start = date_from.toordinal() if date_from else None
+    end = date_to.toordinal() if date_to else None
+
+    if np is None:
+        for account_id, day, amount in zip(accounts, dates, amounts):
+            if end is not None and day > end:
+                continue
+            if start is not None and day < start:
+                if not opening:
+                    continue
+                offset = 0
+            else:
+                offset = 2
+            totals[account_id][offset + (amount < 0)] += abs(amount)
+        return totals
+
+    keep = np.ones(len(accounts), dtype=bool) if end is None else dates <= end
+    buckets = [(2, keep)]
+    if start is not None:
+        before = dates < start
+        buckets = [(2, keep & ~before)] + ([(0, keep & before)] if opening else [])
+    for offset, mask in buckets:
+        for side, sign in ((0, amounts > 0), (1, amounts < 0)):
+            selected = mask & sign
+            ids, values = accounts[selected], amounts[selected]
+            if not len(ids):
+                continue
+            # Rows are sorted by account, so each account is one run
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            for account_id, total in zip(ids[starts].tolist(), np.add.reduceat(values, starts).tolist()):
+                totals[account_id][offset + side] += abs(total)
+    return totals
+
+
+def iter_segment_lines(archive, account_id=None, date_from=None, date_to=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    The segment's lines from `date_from` through `date_to` as
+    (account_id, entry_id, date, debit, credit), ordered by (date, entry)
+    like a live export. Line ids are not kept; lines of one entry come in
+    account order. Only the matching row positions are held in memory.
+    """
+    if not archive.line_count:
+        return
+    accounts, entries, dates, amounts = read_segment(archive)
+    start = date_from.toordinal() if date_from else None
+    end = date_to.toordinal() if date_to else None
+
+    if np is None:
+        index = [
+            i for i, (acc, day) in enumerate(zip(accounts, dates))
+            if (account_id is None or acc == account_id)
+            and (start is None or day >= start)
+            and (end is None or day <= end)
+        ]
+        index.sort(key=lambda i: (dates[i], entries[i]))
+    else:
+        mask = np.ones(len(accounts), dtype=bool)
+        if account_id is not None:
+            mask &= accounts == account_id
+        if start is not None:
+            mask &= dates >= start
+        if end is not None:
+            mask &= dates <= end
+        index = np.flatnonzero(mask)
+        # lexsort is stable, so lines of one entry keep their account order
+        index = index[np.lexsort((entries[index], dates[index]))]
+
+    for lo in range(0, len(index), chunk_size):
+        part = index[lo:lo + chunk_size]
+        if np is None:
+            rows = ((accounts[i], entries[i], dates[i], amounts[i]) for i in part)
+        else:
+            rows = zip(accounts[part].tolist(), entries[part].tolist(), dates[part].tolist(), amounts[part].tolist())
+        for acc, entry, day, amount in rows:
+            yield (
+                acc, entry, date.fromordinal(day),
+                from_minor(max(amount, 0)), from_minor(max(-amount, 0)),
+            )
+
+
+def archived_totals(customer_id=None, date_from=None, date_to=None, opening=True):
+    """
+    The archived counterpart of reports.account_totals_queryset:
+    {account_id: {"opening_debit", "opening_credit", "debit", "credit"}}
+    over archived lines, with the same date semantics. Segments inside one
+    side of `date_from` and within `date_to` are summed from their
+    LedgerArchiveTotal rows; only segments cut by a bound are scanned.
+    """
+    archives = LedgerArchive.objects.all()
+    if customer_id:
+        archives = archives.filter(customer_id=customer_id)
+    if date_to:
+        archives = archives.filter(date_from__lte=date_to)
+    if date_from and not opening:
+        archives = archives.filter(date_to__gte=date_from)
+
+    summed = {"opening": [], "movement": []}
+    scanned = []
+    for archive in archives:
+        if date_to and archive.date_to > date_to:
+            scanned.append(archive)
+        elif date_from and archive.date_to < date_from:
+            summed["opening"].append(archive.id)
+        elif date_from and archive.date_from < date_from:
+            scanned.append(archive)
+        else:
+            summed["movement"].append(archive.id)
+
+    totals = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, Decimal("0.00")))
+    for bucket, archive_ids in summed.items():
+        if not archive_ids:
+            continue
+        debit_field, credit_field = ("opening_debit", "opening_credit") if bucket == "opening" else ("debit", "credit")
+        for row in (
+            LedgerArchiveTotal.objects.filter(archive_id__in=archive_ids)
+            .values("account_id")
+            .annotate(debit_sum=Sum("debit_total"), credit_sum=Sum("credit_total"))
+            .order_by()
+        ):
+            totals[row["account_id"]][debit_field] += money_sum(row["debit_sum"])
+            totals[row["account_id"]][credit_field] += money_sum(row["credit_sum"])
+    for archive in scanned:
+        for account_id, values in scan_segment(archive, date_from, date_to, opening).items():
+            for field, value in zip(TOTAL_FIELDS, values):
+                totals[account_id][field] += from_minor(value)
+    return dict(totals)
+
+
+def live_entries_filter(prefix=""):
+    """Q for journal entries whose lines have not been archived, e.g. for integrity checks."""
+    archived_through = f"{prefix}customer__ledger_archived_through"
+    return Q(**{f"{archived_through}__isnull": True}) | Q(**{f"{prefix}date__gt": F(archived_through)})
@@ -0,0 +1,91 @@
+import calendar
+from decimal import Decimal
+
+from django.db.models import F, FilteredRelation, Q, Sum
+from django.utils import timezone
+
+from finance.models import Category, money_sum
+from finance.services.fx import convert_rows, missing_rates_report
+
+HUNDRED = Decimal(100)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def budget_status(customer, month=None):
+    """
+    Budget against spend for every expense category the customer has a
+    budget for or has spent in during `month` (a date in the month;
+    default: this month).
+
+    Spend comes from the MonthlySpend counters in a single grouped query,
+    never from Transaction. Counters of foreign-currency accounts are
+    converted to the base currency at the rate of the month's last day (or
+    today, for the current month). Returns (rows, missing_rates).
+    """
+    base = customer.base_currency
+    today = timezone.now().date()
+    month = month_start(month or today)
+    month_end = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+    rate_date = min(month_end, today)
+
+    rows = list(
+        Category.objects.filter(type=Category.EXPENSE)
+        .annotate(
+            budget=FilteredRelation("budgets", condition=Q(budgets__customer=customer)),
+            spend=FilteredRelation(
+                "monthly_spend",
+                condition=Q(monthly_spend__customer=customer, monthly_spend__month=month),
+            ),
+        )
+        .filter(Q(budget__id__isnull=False) | Q(spend__id__isnull=False))
+        .values(
+            "id",
+            "name",
+            budget_id=F("budget__id"),
+            budget_amount=F("budget__amount"),
+            alert_percent=F("budget__alert_percent"),
+            currency=F("spend__account__currency"),
+        )
+        .annotate(spent=Sum("spend__total"), count=Sum("spend__count"))
+        .order_by("name", "id")
+    )
+    for row in rows:
+        # Categories with a budget but no spend have no account currency
+        row["currency"] = row["currency"] or base
+        row["rate_date"] = rate_date
+    missing = convert_rows(rows, base, ["spent"], "currency", "rate_date")
+
+    merged = {}
+    for row in rows:
+        item = merged.setdefault(row["id"], {
+            "category_id": row["id"],
+            "category_name": row["name"],
+            "budget_id": row["budget_id"],
+            "budget": row["budget_amount"],
+            "alert_percent": row["alert_percent"],
+            "spent": Decimal(0),
+            "count": 0,
+        })
+        # Spend without a usable rate is left out of the amount but still counted
+        item["spent"] += row["spent"] or 0
+        item["count"] += row["count"] or 0
+
+    statuses = []
+    for item in merged.values():
+        item["spent"] = money_sum(item["spent"])
+        budget = item["budget"]
+        if budget is None:
+            item.update(remaining=None, used_percent=None, alert=False, over_budget=False)
+        else:
+            used = (item["spent"] * HUNDRED / budget).quantize(Decimal("0.1")) if budget else None
+            item.update(
+                remaining=budget - item["spent"],
+                used_percent=used,
+                alert=item["spent"] * HUNDRED >= budget * item["alert_percent"],
+                over_budget=item["spent"] > budget,
+            )
+        statuses.append(item)
+    return statuses, missing_rates_report(missing)
@@ -0,0 +1,61 @@
+import functools
+import random
+import time
+
+from django.db import OperationalError, connection
+
+# SQLSTATEs: 40P01 deadlock_detected, 40001 serialization_failure (Postgres);
+# MySQL reports 1213 (deadlock) and 1205 (lock wait timeout)
+RETRYABLE_SQLSTATES = {"40P01", "40001"}
+RETRYABLE_MYSQL_CODES = {1213, 1205}
+RETRYABLE_MESSAGES = ("deadlock", "could not serialize", "database is locked")
+
+# Process-wide counters, read by the stress_transfers harness
+conflict_stats = {"retries": 0, "gave_up": 0}
+
+
+def is_retryable_db_error(exc):
+    if not isinstance(exc, OperationalError):
+        return False
+    cause = exc.__cause__
+    sqlstate = getattr(cause, "pgcode", None) or getattr(getattr(cause, "diag", None), "sqlstate", None)
+    if sqlstate in RETRYABLE_SQLSTATES:
+        return True
+    args = getattr(cause, "args", ())
+    if args and args[0] in RETRYABLE_MYSQL_CODES:
+        return True
+    message = str(exc).lower()
+    return any(m in message for m in RETRYABLE_MESSAGES)
+
+
+def retry_on_conflict(max_attempts=5, base_delay=0.02, max_delay=0.5):
+    """
+    Re-runs the decorated function when the database aborts it with a
+    deadlock or serialization failure, sleeping with exponential backoff and
+    full jitter between attempts.
+
+    Only retries when called outside any transaction: inside an outer atomic
+    block the whole outer transaction is already doomed, so the error is
+    re-raised for the outermost caller to handle.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            attempt = 1
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if (
+                        not is_retryable_db_error(exc)
+                        or connection.in_atomic_block
+                        or attempt >= max_attempts
+                    ):
+                        if is_retryable_db_error(exc):
+                            conflict_stats["gave_up"] += 1
+                        raise
+                    conflict_stats["retries"] += 1
+                    time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1))))
+                    attempt += 1
+        return wrapper
+    return decorator
@@ -0,0 +1,125 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Sum
+
+from finance.models import Category, Transaction, money_sum
+from finance.services.fx import convert_rows, missing_rates_report, rate_date_expression
+
+SUMMARY_CACHE_TIMEOUT = getattr(settings, "FINANCE_DASHBOARD_CACHE_TIMEOUT", 60 * 60)
+# A per-process cache only sees the invalidations of its own process, so
+# there a summary is kept just long enough to absorb repeated page loads
+LOCAL_SUMMARY_CACHE_TIMEOUT = getattr(settings, "FINANCE_DASHBOARD_LOCAL_CACHE_TIMEOUT", 5)
+GENERATION_KEY = "finance:dashboard-summary:generation"
+
+
+def summary_cache_timeout():
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        return LOCAL_SUMMARY_CACHE_TIMEOUT
+    return SUMMARY_CACHE_TIMEOUT
+
+
+def _generation():
+    # Bumped when categories change, since those affect every customer's summary
+    return cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+
+
+def summary_cache_key(customer_id, generation=None):
+    return f"finance:dashboard-summary:{generation or _generation()}:{customer_id}"
+
+
+def summary_queryset(customer):
+    return (
+        Transaction.objects.filter(customer=customer)
+        .annotate(rate_date=rate_date_expression(customer.base_currency))
+        .values("category__type", "category__name", "account__currency", "rate_date")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+
+
+def recent_transactions_queryset(customer, limit=20):
+    return (
+        Transaction.objects.filter(customer=customer)
+        .select_related("category", "account")
+        .order_by("-date", "-created_at")[:limit]
+    )
+
+
+def compute_dashboard_summary(customer):
+    """
+    Totals and per-category breakdowns in the customer's base currency, from
+    a single grouped query over the customer's transactions. Foreign-currency
+    sums are grouped per day and converted at that day's rate in one batch.
+    """
+    return build_summary(customer, list(summary_queryset(customer)))
+
+
+async def acompute_dashboard_summary(customer):
+    rows = [row async for row in summary_queryset(customer)]
+    return await sync_to_async(build_summary)(customer, rows)
+
+
+def build_summary(customer, rows):
+    base = customer.base_currency
+    missing = convert_rows(rows, base, ["total"], "account__currency", "rate_date")
+
+    totals = {}
+    for row in rows:
+        if row["total"] is not None:
+            key = (row["category__type"], row["category__name"])
+            totals[key] = totals.get(key, 0) + row["total"]
+
+    income_by_category = []
+    expense_by_category = []
+    for (category_type, name), total in sorted(totals.items(), key=lambda item: -item[1]):
+        item = {"category__name": name, "total": money_sum(total)}
+        if category_type == Category.INCOME:
+            income_by_category.append(item)
+        elif category_type == Category.EXPENSE:
+            expense_by_category.append(item)
+
+    income_total = sum(r["total"] for r in income_by_category)
+    expense_total = sum(r["total"] for r in expense_by_category)
+    return {
+        "currency": base,
+        "income_total": income_total,
+        "expense_total": expense_total,
+        "net_total": income_total - expense_total,
+        "income_by_category": income_by_category,
+        "expense_by_category": expense_by_category,
+        # Amounts without a usable rate are left out of the totals
+        "missing_rates": missing_rates_report(missing),
+    }
+
+
+def get_dashboard_summary(customer):
+    key = summary_cache_key(customer.id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_dashboard_summary(customer)
+        cache.set(key, summary, summary_cache_timeout())
+    return summary
+
+
+async def aget_dashboard_summary(customer):
+    generation = await cache.aget_or_set(GENERATION_KEY, 1, timeout=None)
+    key = summary_cache_key(customer.id, generation)
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await acompute_dashboard_summary(customer)
+        await cache.aset(key, summary, summary_cache_timeout())
+    return summary
+
+
+def invalidate_dashboard_summary(*customer_ids):
+    generation = _generation()
+    cache.delete_many([summary_cache_key(cid, generation) for cid in customer_ids if cid])
+
+
+def invalidate_all_dashboard_summaries():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
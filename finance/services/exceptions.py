@@ -3,3 +3,10 @@ class InsufficientFundsError(Exception):
         super().__init__(f"Insufficient funds: balance={balance}, amount={amount}")
         self.balance = balance
         self.amount = amount
+
+
+class ClosedPeriodError(ValueError):
+    def __init__(self, date, closed_through):
+        super().__init__(f"Cannot post on {date}: books are closed through {closed_through}")
+        self.date = date
+        self.closed_through = closed_through
@@ -0,0 +1,144 @@
+import csv
+import json
+from itertools import islice
+
+from finance.models import JournalEntry, LedgerAccount, LedgerArchive, LedgerLine, Transaction
+from finance.services.archive import iter_segment_lines
+
+EXPORT_CHUNK_SIZE = 2000
+
+TRANSACTION_EXPORT_FIELDS = (
+    "id",
+    "date",
+    "amount",
+    "account_id",
+    "account__name",
+    "account__currency",
+    "category_id",
+    "category__name",
+    "category__type",
+    "description",
+)
+
+LEDGER_LINE_EXPORT_FIELDS = (
+    "id",
+    "date",
+    "entry_id",
+    "entry__memo",
+    "account_id",
+    "account__name",
+    "account__type",
+    "debit",
+    "credit",
+)
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def transaction_export_queryset(customer_id=None, account_id=None, date_from=None, date_to=None):
+    qs = Transaction.objects.all()
+    if customer_id:
+        qs = qs.filter(customer_id=customer_id)
+    if account_id:
+        qs = qs.filter(account_id=account_id)
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    return qs.order_by("date", "id")
+
+
+def ledger_line_export_queryset(customer_id=None, account_id=None, date_from=None, date_to=None):
+    qs = LedgerLine.objects.all()
+    if customer_id:
+        qs = qs.filter(account__customer_id=customer_id)
+    if account_id:
+        qs = qs.filter(account_id=account_id)
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    return qs.order_by("date", "id")
+
+
+def transaction_export_rows(customer_id=None, account_id=None, date_from=None, date_to=None,
+                            chunk_size=EXPORT_CHUNK_SIZE):
+    qs = transaction_export_queryset(customer_id, account_id, date_from, date_to)
+    # values_list + iterator: a server-side cursor on backends that have one,
+    # and no model instances, so memory stays flat however many rows there are
+    return qs.values_list(*TRANSACTION_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def archived_line_rows(customer_id=None, account_id=None, date_from=None, date_to=None,
+                       chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    LEDGER_LINE_EXPORT_FIELDS tuples of the archived lines in range, read
+    from the segments; id is None. Entry memos and account names are
+    looked up once per chunk.
+    """
+    archives = LedgerArchive.objects.order_by("customer_id", "date_from")
+    if customer_id:
+        archives = archives.filter(customer_id=customer_id)
+    if account_id:
+        archives = archives.filter(totals__account_id=account_id)
+    if date_from:
+        archives = archives.filter(date_to__gte=date_from)
+    if date_to:
+        archives = archives.filter(date_from__lte=date_to)
+
+    for archive in archives:
+        lines = iter_segment_lines(archive, account_id, date_from, date_to, chunk_size)
+        while chunk := list(islice(lines, chunk_size)):
+            memos = dict(JournalEntry.objects.filter(id__in={line[1] for line in chunk}).values_list("id", "memo"))
+            accounts = {
+                acc["id"]: acc
+                for acc in LedgerAccount.objects.filter(id__in={line[0] for line in chunk}).values("id", "name", "type")
+            }
+            for acc, entry, day, debit, credit in chunk:
+                yield (None, day, entry, memos.get(entry, ""), acc, accounts[acc]["name"], accounts[acc]["type"],
+                       debit, credit)
+
+
+def ledger_line_export_rows(customer_id=None, account_id=None, date_from=None, date_to=None,
+                            chunk_size=EXPORT_CHUNK_SIZE, include_archived=True):
+    """
+    LEDGER_LINE_EXPORT_FIELDS tuples of the lines in range. Archived lines
+    (see services.archive) come first, customer by customer: they are all
+    dated before that customer's live lines. `include_archived=False`
+    saves the archive lookup for customers known to have none.
+    """
+    if include_archived:
+        yield from archived_line_rows(customer_id, account_id, date_from, date_to, chunk_size)
+    qs = ledger_line_export_queryset(customer_id, account_id, date_from, date_to)
+    yield from qs.values_list(*LEDGER_LINE_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object for csv.writer that hands the line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows, fields):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), default=str) + "\n"
+
+
+def iter_rows(rows, fields, fmt):
+    """Encodes rows (tuples in `fields` order) as CSV or NDJSON lines, one row at a time."""
+    if fmt == "csv":
+        return csv_lines(rows, fields)
+    if fmt == "ndjson":
+        return ndjson_lines(rows, fields)
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -0,0 +1,117 @@
+import bisect
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, DateField, F, Value, When
+
+from finance.models import FxRate
+from finance.services.recipient_cache import LRUCache
+
+REFERENCE_CURRENCY = getattr(settings, "FINANCE_FX_REFERENCE_CURRENCY", "USD")
+# A rate older than this is treated as missing rather than silently reused
+MAX_RATE_AGE_DAYS = getattr(settings, "FINANCE_FX_MAX_RATE_AGE_DAYS", 7)
+
+# (currency, date) -> rate, tagged by currency so a load can drop one currency
+fx_cache = LRUCache(
+    maxsize=getattr(settings, "FINANCE_FX_CACHE_SIZE", 50000),
+    ttl=getattr(settings, "FINANCE_FX_CACHE_TTL", 300),
+)
+NO_RATE = "no-rate"
+
+
+def get_rates(pairs):
+    """
+    Rates for a set of (currency, date) pairs: the latest rate on or before
+    each date, at most MAX_RATE_AGE_DAYS old, or None. Cached pairs are
+    served from fx_cache and the rest come from a single query.
+    """
+    rates = {}
+    wanted = set()
+    for currency, date in pairs:
+        if currency == REFERENCE_CURRENCY:
+            rates[(currency, date)] = Decimal(1)
+            continue
+        cached = fx_cache.get((currency, date))
+        if cached is None:
+            wanted.add((currency, date))
+        else:
+            rates[(currency, date)] = None if cached == NO_RATE else cached
+    if not wanted:
+        return rates
+
+    dates = [date for _, date in wanted]
+    history = {}
+    for currency, date, rate in (
+        FxRate.objects.filter(
+            currency__in={currency for currency, _ in wanted},
+            date__range=(min(dates) - timedelta(days=MAX_RATE_AGE_DAYS), max(dates)),
+        )
+        .order_by("currency", "date")
+        .values_list("currency", "date", "rate")
+    ):
+        days, values = history.setdefault(currency, ([], []))
+        days.append(date)
+        values.append(rate)
+
+    for currency, date in wanted:
+        days, values = history.get(currency, ([], []))
+        i = bisect.bisect_right(days, date) - 1
+        rate = values[i] if i >= 0 and (date - days[i]).days <= MAX_RATE_AGE_DAYS else None
+        rates[(currency, date)] = rate
+        fx_cache.set((currency, date), NO_RATE if rate is None else rate, currency)
+    return rates
+
+
+def convert_rows(rows, to_currency, amount_fields, currency_key, date_key):
+    """
+    Converts the amount fields of already-grouped rows to `to_currency` in
+    place, with one batched rate lookup for all of them. Each row carries
+    its currency and the date whose rate applies.
+
+    Rows whose rate is missing get None amounts; the missing
+    (currency, date) pairs are returned so callers can report them.
+    """
+    pairs = set()
+    for row in rows:
+        if row[currency_key] != to_currency:
+            pairs.add((row[currency_key], row[date_key]))
+            pairs.add((to_currency, row[date_key]))
+    rates = get_rates(pairs)
+
+    missing = set()
+    for row in rows:
+        currency, date = row[currency_key], row[date_key]
+        if currency == to_currency:
+            continue
+        source, target = rates[(currency, date)], rates[(to_currency, date)]
+        if source is None or target is None:
+            missing.update(p for p in [(currency, date), (to_currency, date)] if rates[p] is None)
+            for field in amount_fields:
+                row[field] = None
+            continue
+        factor = source / target
+        for field in amount_fields:
+            if row[field] is not None:
+                row[field] = row[field] * factor
+    return missing
+
+
+def missing_rates_report(missing):
+    return [{"currency": currency, "date": date} for currency, date in sorted(missing)]
+
+
+def rate_date_expression(base_currency, currency_field="account__currency", date_field="date"):
+    """
+    The date whose rate converts a row: NULL for rows already in the base
+    currency, so grouping on it does not split their sums by day.
+    """
+    return Case(
+        When(**{currency_field: base_currency}, then=Value(None)),
+        default=F(date_field),
+        output_field=DateField(),
+    )
+
+
+def invalidate_rates(currency):
+    fx_cache.invalidate_tag(currency)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from finance.models import IdempotencyKey
+from finance.services.concurrency import retry_on_conflict
+from finance.services.recipient_cache import LRUCache
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+# How long a key is kept by prune_idempotency_keys; clients must not retry later than this
+RETENTION_HOURS = getattr(settings, "FINANCE_IDEMPOTENCY_RETENTION_HOURS", 24)
+
+# (user_id, scope, key) -> (fingerprint, status_code, response), tagged by user id.
+# Stored responses never change, so the TTL only bounds memory, not staleness.
+response_cache = LRUCache(
+    maxsize=getattr(settings, "FINANCE_IDEMPOTENCY_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "FINANCE_IDEMPOTENCY_CACHE_TTL", 600),
+)
+
+
+def request_fingerprint(data):
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def load_stored(user_id, scope, key):
+    cache_key = (user_id, scope, key)
+    stored = response_cache.get(cache_key)
+    if stored is None:
+        stored = (
+            IdempotencyKey.objects.filter(user_id=user_id, scope=scope, key=key)
+            .values_list("fingerprint", "status_code", "response")
+            .first()
+        )
+        if stored is not None:
+            response_cache.set(cache_key, stored, user_id)
+    return stored
+
+
+def replay(stored, fingerprint):
+    stored_fingerprint, status_code, data = stored
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {"detail": f"{HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(data, status=status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+@retry_on_conflict()
+def execute_once(user_id, scope, key, fingerprint, handler):
+    """
+    Claims the key and runs the handler in one transaction, so the key is
+    stored if and only if the handler's writes commit. A concurrent request
+    with the same key blocks on the unique index until this one finishes,
+    then replays its response instead of running the handler again.
+    """
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(user_id=user_id, scope=scope, key=key, fingerprint=fingerprint)
+            response = handler()
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=["status_code", "response"])
+    except IntegrityError:
+        stored = load_stored(user_id, scope, key)
+        if stored is None:
+            raise
+        return replay(stored, fingerprint)
+
+    stored = (fingerprint, record.status_code, json.loads(json.dumps(record.response, cls=DjangoJSONEncoder)))
+    transaction.on_commit(lambda: response_cache.set((user_id, scope, key), stored, user_id))
+    return response
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Runs `handler` (returning a DRF Response) at most once per
+    Idempotency-Key header value, user and scope. Requests without the
+    header run as usual. A retry with the same key gets the stored response
+    from the process cache or a single indexed lookup, without reaching the
+    handler; reusing a key with a different body is rejected with 422.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    fingerprint = request_fingerprint(request.data)
+    stored = load_stored(request.user.pk, scope, key)
+    if stored is not None:
+        return replay(stored, fingerprint)
+    return execute_once(request.user.pk, scope, key, fingerprint, handler)
+
+
+def prune_keys(older_than_hours=RETENTION_HOURS):
+    cutoff = timezone.now() - timedelta(hours=older_than_hours)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
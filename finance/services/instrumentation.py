@@ -0,0 +1,171 @@
+import copy
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SLOW_SQL_MAX_LENGTH = 500
+
+PUBLISH_INTERVAL = getattr(settings, "FINANCE_REQUEST_STATS_PUBLISH_INTERVAL", 10)
+STATS_KEY_PREFIX = "finance:request-stats:"
+STATS_INDEX_KEY = "finance:request-stats:index"
+STATS_TIMEOUT = 60 * 60
+
+
+class RequestProfile:
+    """
+    Query count, DB time and slowest statement of one request, collected by
+    wrapping every database connection's execute().
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.queries = 0
+        self.db_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = ""
+        self.wall_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db_ms += ms
+            if ms > self.slowest_ms:
+                self.slowest_ms = ms
+                self.slowest_sql = sql[:SLOW_SQL_MAX_LENGTH]
+
+    @contextmanager
+    def capture(self):
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(self))
+            try:
+                yield self
+            finally:
+                self.wall_ms = (time.perf_counter() - started) * 1000
+
+    def server_timing(self):
+        return ", ".join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f"db-slowest;dur={self.slowest_ms:.1f}",
+            f"view;dur={self.wall_ms:.1f}",
+        ])
+
+
+def new_view_stats():
+    return {
+        "count": 0,
+        "queries_total": 0,
+        "queries_max": 0,
+        "db_ms_total": 0.0,
+        "wall_ms_total": 0.0,
+        "wall_ms_max": 0.0,
+        "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        "slowest_sql": "",
+        "slowest_sql_ms": 0.0,
+    }
+
+
+class RequestHistogram:
+    """
+    Per-view counters and a latency histogram, local to the process.
+
+    Snapshots are published to the Django cache every PUBLISH_INTERVAL
+    seconds so the request_stats command can merge what every worker saw
+    (with a shared cache backend; LocMemCache only sees its own process).
+    """
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+        self._published = 0.0
+
+    def record(self, profile):
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS_MS) if profile.wall_ms <= bound),
+            len(LATENCY_BUCKETS_MS),
+        )
+        with self._lock:
+            stats = self._views.setdefault(profile.label, new_view_stats())
+            stats["count"] += 1
+            stats["queries_total"] += profile.queries
+            stats["queries_max"] = max(stats["queries_max"], profile.queries)
+            stats["db_ms_total"] += profile.db_ms
+            stats["wall_ms_total"] += profile.wall_ms
+            stats["wall_ms_max"] = max(stats["wall_ms_max"], profile.wall_ms)
+            stats["buckets"][bucket] += 1
+            if profile.slowest_ms > stats["slowest_sql_ms"]:
+                stats["slowest_sql_ms"] = profile.slowest_ms
+                stats["slowest_sql"] = profile.slowest_sql
+            publish = time.monotonic() - self._published >= PUBLISH_INTERVAL
+            if publish:
+                self._published = time.monotonic()
+        if publish:
+            self.publish()
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._views)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def publish(self):
+        key = f"{STATS_KEY_PREFIX}{os.getpid()}"
+        cache.set(key, self.snapshot(), STATS_TIMEOUT)
+        index = cache.get(STATS_INDEX_KEY) or set()
+        if key not in index:
+            cache.set(STATS_INDEX_KEY, index | {key}, STATS_TIMEOUT)
+
+
+request_histogram = RequestHistogram()
+
+
+def merge_snapshots(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for label, stats in snapshot.items():
+            into = merged.setdefault(label, new_view_stats())
+            for field in ("count", "queries_total", "db_ms_total", "wall_ms_total"):
+                into[field] += stats[field]
+            for field in ("queries_max", "wall_ms_max"):
+                into[field] = max(into[field], stats[field])
+            into["buckets"] = [a + b for a, b in zip(into["buckets"], stats["buckets"])]
+            if stats["slowest_sql_ms"] > into["slowest_sql_ms"]:
+                into["slowest_sql_ms"] = stats["slowest_sql_ms"]
+                into["slowest_sql"] = stats["slowest_sql"]
+    return merged
+
+
+def collect_published_stats():
+    """Merges the snapshots every process has published to the cache."""
+    keys = cache.get(STATS_INDEX_KEY) or set()
+    return merge_snapshots(s for s in cache.get_many(keys).values() if s)
+
+
+def clear_published_stats():
+    keys = cache.get(STATS_INDEX_KEY) or set()
+    cache.delete_many(list(keys) + [STATS_INDEX_KEY])
+
+
+def percentile_ms(stats, fraction):
+    """Upper bound of the bucket holding the given fraction of requests."""
+    target = stats["count"] * fraction
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + (None,), stats["buckets"]):
+        seen += count
+        if seen >= target:
+            return bound if bound is not None else stats["wall_ms_max"]
+    return stats["wall_ms_max"]
@@ -0,0 +1,220 @@
+"""
+Ledger integrity checks, run over journal entry id ranges.
+
+Each chunk is checked with a few grouped queries and returns plain dicts,
+so chunks can be verified in worker processes and merged by the caller.
+"""
+import multiprocessing
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from finance.models import JournalEntry, LedgerLine, LedgerVerification, Transfer, money_sum
+from finance.services.archive import live_entries_filter
+
+CHUNK_SIZE = getattr(settings, "FINANCE_VERIFY_CHUNK_SIZE", 20000)
+# Entries younger than this may belong to transactions that have not
+# committed yet, with lower ids than rows already visible; an incremental run
+# stops short of them so they are not skipped for good.
+SETTLE_SECONDS = getattr(settings, "FINANCE_VERIFY_SETTLE_SECONDS", 60)
+MAX_STORED_PROBLEMS = 1000
+
+
+def problem(check, entry_id, detail, **ids):
+    return {"check": check, "entry_id": entry_id, **ids, "detail": detail}
+
+
+def check_entries(lo, hi):
+    """
+    Entries that do not balance or have fewer than two lines. Entries whose
+    lines were archived are skipped: their lines are no longer in
+    LedgerLine. Returns (problems, entries, lines).
+    """
+    problems = []
+    entries = lines = 0
+    rows = (
+        JournalEntry.objects.filter(live_entries_filter(), id__gte=lo, id__lt=hi)
+        .values("id")
+        .annotate(debit=Sum("lines__debit"), credit=Sum("lines__credit"), n=Count("lines"))
+        .order_by()
+    )
+    for row in rows:
+        entries += 1
+        lines += row["n"]
+        debit, credit = money_sum(row["debit"]), money_sum(row["credit"])
+        if row["n"] < 2:
+            problems.append(problem("too_few_lines", row["id"], f"{row['n']} lines"))
+        if debit != credit:
+            problems.append(problem("unbalanced_entry", row["id"], f"debits {debit} != credits {credit}"))
+    return problems, entries, lines
+
+
+def check_lines(lo, hi):
+    """Lines with both or neither side set, a negative side, or a date or customer differing from their entry's."""
+    problems = []
+    bad = (
+        LedgerLine.objects.filter(entry_id__gte=lo, entry_id__lt=hi)
+        .filter(
+            Q(debit__gt=0, credit__gt=0)
+            | Q(debit=0, credit=0)
+            | Q(debit__lt=0)
+            | Q(credit__lt=0)
+            | ~Q(date=F("entry__date"))
+            | ~Q(account__customer_id=F("entry__customer_id"))
+        )
+        .values("id", "entry_id", "debit", "credit", "date", entry_date=F("entry__date"),
+                account_customer=F("account__customer_id"), entry_customer=F("entry__customer_id"))
+        .order_by()
+    )
+    for line in bad:
+        debit, credit = line["debit"], line["credit"]
+        if debit > 0 and credit > 0:
+            check, detail = "line_both_sides", f"debit {debit} and credit {credit}"
+        elif debit == 0 and credit == 0:
+            check, detail = "line_zero", "neither debit nor credit set"
+        elif debit < 0 or credit < 0:
+            check, detail = "line_negative", f"debit {debit}, credit {credit}"
+        elif line["date"] != line["entry_date"]:
+            check, detail = "line_date", f"line dated {line['date']}, entry {line['entry_date']}"
+        else:
+            check, detail = "line_customer", (
+                f"account of customer {line['account_customer']}, entry of customer {line['entry_customer']}"
+            )
+        problems.append(problem(check, line["entry_id"], detail, line_id=line["id"]))
+    return problems
+
+
+def check_transfers(lo, hi):
+    """
+    Transfers posted by entries in the range: the entry must debit exactly
+    the amount to the destination account's ledger, credit it from the
+    source's, and share the transfer's customer and date.
+    """
+    transfers = list(
+        Transfer.objects.filter(
+            live_entries_filter("journal_entry__"), journal_entry_id__gte=lo, journal_entry_id__lt=hi
+        )
+        .values("id", "journal_entry_id", "customer_id", "from_account_id", "to_account_id", "amount", "date",
+                entry_customer=F("journal_entry__customer_id"), entry_date=F("journal_entry__date"))
+        .order_by()
+    )
+    if not transfers:
+        return []
+
+    # entry id -> {(bank account id, side): total}; ledgers without a bank account count under None
+    posted = defaultdict(Counter)
+    for line in (
+        LedgerLine.objects.filter(entry_id__in=[t["journal_entry_id"] for t in transfers])
+        .values("entry_id", "debit", "credit", bank_account_id=F("account__bank_account_id"))
+        .order_by()
+    ):
+        if line["debit"]:
+            posted[line["entry_id"]][(line["bank_account_id"], "debit")] += line["debit"]
+        if line["credit"]:
+            posted[line["entry_id"]][(line["bank_account_id"], "credit")] += line["credit"]
+
+    problems = []
+    for t in transfers:
+        entry_id = t["journal_entry_id"]
+        expected = Counter({(t["to_account_id"], "debit"): t["amount"], (t["from_account_id"], "credit"): t["amount"]})
+        if posted[entry_id] != expected:
+            actual = ", ".join(f"{side} {amount} account {account}" for (account, side), amount in sorted(
+                posted[entry_id].items(), key=lambda item: (item[0][1], item[0][0] or 0)
+            ))
+            problems.append(problem("transfer_lines", entry_id, f"expected debit {t['amount']} account "
+                                    f"{t['to_account_id']}, credit from account {t['from_account_id']}; "
+                                    f"posted: {actual or 'nothing'}", transfer_id=t["id"]))
+        if t["customer_id"] != t["entry_customer"] or t["date"] != t["entry_date"]:
+            problems.append(problem("transfer_entry", entry_id, f"transfer of customer {t['customer_id']} on "
+                                    f"{t['date']}, entry of customer {t['entry_customer']} on {t['entry_date']}",
+                                    transfer_id=t["id"]))
+    return problems
+
+
+def verify_entry_range(bounds):
+    """All checks over journal entries with lo <= id < hi. Runs in a worker process."""
+    lo, hi = bounds
+    problems, entries, lines = check_entries(lo, hi)
+    problems += check_lines(lo, hi)
+    problems += check_transfers(lo, hi)
+    return {"entries": entries, "lines": lines, "problems": problems}
+
+
+def unposted_transfers(cutoff):
+    return [
+        {"check": "transfer_unposted", "entry_id": None, "transfer_id": transfer_id, "detail": "no journal entry"}
+        for transfer_id in Transfer.objects.filter(journal_entry__isnull=True, created_at__lt=cutoff)
+        .order_by("id").values_list("id", flat=True)
+    ]
+
+
+def entry_chunks(first_id, last_id, chunk_size):
+    return [(lo, min(lo + chunk_size, last_id + 1)) for lo in range(first_id, last_id + 1, chunk_size)]
+
+
+def map_chunks(chunks, processes):
+    # Workers must open their own connections, and an in-memory SQLite
+    # database (as in tests) is not visible from other processes at all
+    if processes <= 1 or len(chunks) <= 1 or (connection.vendor == "sqlite" and connection.is_in_memory_db()):
+        yield from map(verify_entry_range, chunks)
+        return
+    connections.close_all()
+    with multiprocessing.get_context("fork").Pool(processes, initializer=connections.close_all) as pool:
+        yield from pool.imap_unordered(verify_entry_range, chunks)
+
+
+def verify_ledger(incremental=False, processes=1, chunk_size=CHUNK_SIZE, settle_seconds=SETTLE_SECONDS):
+    """
+    Checks every journal entry (or, with `incremental`, those after the
+    last recorded run) and records the run as a LedgerVerification.
+
+    Entries are split into id ranges of `chunk_size`, checked by
+    `processes` worker processes, and merged into one report. Entries
+    created in the last `settle_seconds` are left for the next run.
+    Incremental runs do not see later edits to entries already verified;
+    run a full check now and then as well.
+    """
+    started = time.perf_counter()
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    entries = JournalEntry.objects.filter(created_at__lt=cutoff)
+    if incremental:
+        last_verified = LedgerVerification.objects.aggregate(last=Max("last_entry_id"))["last"]
+        if last_verified is not None:
+            entries = entries.filter(id__gt=last_verified)
+    bounds = entries.aggregate(first=Min("id"), last=Max("id"))
+
+    report = {
+        "first_entry_id": bounds["first"],
+        "last_entry_id": bounds["last"],
+        "entries": 0,
+        "lines": 0,
+        "chunks": 0,
+        "problems": [],
+    }
+    if bounds["first"] is not None:
+        chunks = entry_chunks(bounds["first"], bounds["last"], chunk_size)
+        report["chunks"] = len(chunks)
+        for result in map_chunks(chunks, processes):
+            report["entries"] += result["entries"]
+            report["lines"] += result["lines"]
+            report["problems"] += result["problems"]
+    report["problems"].sort(key=lambda p: (p["entry_id"] or 0, p.get("line_id") or 0, p["check"]))
+    report["problems"] += unposted_transfers(cutoff)
+    report["counts"] = dict(Counter(p["check"] for p in report["problems"]))
+    report["seconds"] = round(time.perf_counter() - started, 3)
+
+    if bounds["first"] is not None:
+        LedgerVerification.objects.create(
+            first_entry_id=bounds["first"],
+            last_entry_id=bounds["last"],
+            entries_checked=report["entries"],
+            lines_checked=report["lines"],
+            problem_count=len(report["problems"]),
+            problems=report["problems"][:MAX_STORED_PROBLEMS],
+        )
+    return report
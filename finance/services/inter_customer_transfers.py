@@ -1,15 +1,24 @@
-from decimal import Decimal
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
 from django.utils import timezone
 
-from finance.models import Customer, Account, LedgerAccount
-from finance.services.ledger import post_journal_entry
+from finance.models import CENT, Customer, Account, JournalEntry, LedgerAccount
+from finance.services.concurrency import retry_on_conflict
+from finance.services.ledger import lock_ledger_accounts, post_journal_entries
 from finance.services.exceptions import InsufficientFundsError
-from finance.services.utils import mask_national_id
+from finance.services.recipient_cache import invalidate_customer, transfer_cache
+from finance.services.utils import clean_national_id, mask_national_id
 
 TRANSFERS_OUT_NAME = "Transfers Out"
 TRANSFERS_IN_NAME = "Transfers In"
 
+parse_date = JournalEntry._meta.get_field("date").to_python
+
+RecipientInfo = namedtuple("RecipientInfo", ["customer_id", "account_id", "ledger_id", "in_ledger_id"])
+
 
 def get_or_create_system_accounts(customer: Customer):
     out_acc, _ = LedgerAccount.objects.get_or_create(
@@ -25,6 +34,48 @@ def get_or_create_system_accounts(customer: Customer):
     return out_acc, in_acc
 
 
+def provision_system_accounts(customer: Customer):
+    """Creates the Transfers In/Out accounts up front, when the customer is created."""
+    LedgerAccount.objects.bulk_create(
+        [
+            LedgerAccount(customer=customer, name=TRANSFERS_OUT_NAME, type=LedgerAccount.EXPENSE),
+            LedgerAccount(customer=customer, name=TRANSFERS_IN_NAME, type=LedgerAccount.INCOME),
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def get_or_create_system_accounts_bulk(customer_ids):
+    """
+    Same as get_or_create_system_accounts, for many customers at once.
+    Returns {customer_id: (out_acc, in_acc)}.
+    """
+    customer_ids = set(customer_ids)
+    types = {TRANSFERS_OUT_NAME: LedgerAccount.EXPENSE, TRANSFERS_IN_NAME: LedgerAccount.INCOME}
+
+    def load():
+        found = {}
+        for acc in LedgerAccount.objects.filter(customer_id__in=customer_ids, name__in=types):
+            found[(acc.customer_id, acc.name)] = acc
+        return found
+
+    found = load()
+    missing = [
+        LedgerAccount(customer_id=cid, name=name, type=acc_type)
+        for cid in customer_ids
+        for name, acc_type in types.items()
+        if (cid, name) not in found
+    ]
+    if missing:
+        LedgerAccount.objects.bulk_create(missing, ignore_conflicts=True)
+        found = load()
+
+    return {
+        cid: (found[(cid, TRANSFERS_OUT_NAME)], found[(cid, TRANSFERS_IN_NAME)])
+        for cid in customer_ids
+    }
+
+
 def get_recipient_default_account(recipient: Customer) -> Account:
     # MVP rule: first active account
     acc = recipient.accounts.filter(is_active=True).order_by("id").first()
@@ -33,6 +84,60 @@ def get_recipient_default_account(recipient: Customer) -> Account:
     return acc
 
 
+def resolve_recipient(national_id) -> RecipientInfo:
+    """
+    national_id -> the recipient's customer id, default (first active)
+    account, its ledger account and the recipient's Transfers In ledger.
+    Zero queries on a cache hit, one on a miss. A hit may be stale;
+    transfer_to_national_id re-checks it once the accounts are locked.
+    """
+    key = ("recipient", national_id)
+    info = transfer_cache.get(key)
+    if info is not None:
+        return info
+
+    row = (
+        Account.objects.filter(customer__national_id=national_id, is_active=True)
+        .annotate(
+            in_ledger_id=Subquery(
+                LedgerAccount.objects.filter(customer_id=OuterRef("customer_id"), name=TRANSFERS_IN_NAME)
+                .values("id")[:1]
+            ),
+            ledger_id=Subquery(LedgerAccount.objects.filter(bank_account_id=OuterRef("id")).values("id")[:1]),
+        )
+        .order_by("id")
+        .values("id", "customer_id", "ledger_id", "in_ledger_id")
+        .first()
+    )
+    if row is None:
+        # Error path only: tell the two failures apart
+        if Customer.objects.filter(national_id=national_id).exists():
+            raise ValueError("Recipient has no active account")
+        raise ValueError("Recipient not found")
+    if row["ledger_id"] is None:
+        raise ValueError("Recipient account has no ledger")
+    if row["in_ledger_id"] is None:
+        # Customer created before system accounts were provisioned on signup
+        _, in_acc = get_or_create_system_accounts(Customer(id=row["customer_id"]))
+        row["in_ledger_id"] = in_acc.id
+
+    info = RecipientInfo(row["customer_id"], row["id"], row["ledger_id"], row["in_ledger_id"])
+    transfer_cache.set(key, info, info.customer_id)
+    return info
+
+
+def get_system_ledger_ids(customer_id):
+    """(transfers_out_id, transfers_in_id) of a customer, cached."""
+    key = ("system", customer_id)
+    ids = transfer_cache.get(key)
+    if ids is None:
+        out_acc, in_acc = get_or_create_system_accounts_bulk([customer_id])[customer_id]
+        ids = (out_acc.id, in_acc.id)
+        transfer_cache.set(key, ids, customer_id)
+    return ids
+
+
+@retry_on_conflict()
 def transfer_to_national_id(
     sender: Customer,
     from_account: Account,
@@ -48,61 +153,211 @@ def transfer_to_national_id(
     if from_account.customer_id != sender.id:
         raise ValueError("Source account does not belong to sender")
 
-    recipient_national_id = (recipient_national_id or "").strip()
-    if not recipient_national_id:
-        raise ValueError("Recipient national_id is required")
+    recipient_national_id = clean_national_id(recipient_national_id)
     masked = mask_national_id(recipient_national_id)
-    memo = memo or f"Transfer to {masked}",
+    memo = memo or f"Transfer to {masked}"
 
     if date is None:
         date = timezone.now().date()
 
-    recipient = Customer.objects.filter(national_id=recipient_national_id).first()
-    if recipient is None:
-        raise ValueError("Recipient not found")
-
-    if recipient.id == sender.id:
+    # Pre-flight from the process cache: no queries in the common case
+    recipient = resolve_recipient(recipient_national_id)
+    if recipient.customer_id == sender.id:
         raise ValueError("Cannot transfer to self")
 
-    to_account = get_recipient_default_account(recipient)
-
     from_ledger = from_account.ledger_account
-    to_ledger = to_account.ledger_account
-
-    # System income/expense ledger accounts for transfers
-    sender_out_ledger, _ = get_or_create_system_accounts(sender)
-    recipient_in_ledger, _ = get_or_create_system_accounts(recipient)
+    sender_out_id, _ = get_system_ledger_ids(sender.id)
 
     with transaction.atomic():
-        # Concurrency locks (works best on Postgres/MySQL)
-        locked = (
-            LedgerAccount.objects.select_for_update()
-            .filter(id__in=[from_ledger.id, to_ledger.id, sender_out_ledger.id, recipient_in_ledger.id])
-        )
-        list(locked)
+        # Concurrency locks (works best on Postgres/MySQL). Only the two asset
+        # accounts are locked up front, in id order, so opposite-direction
+        # transfers queue instead of deadlocking. The Transfers In/Out accounts
+        # never need a funds check; their totals are bumped by the UPDATEs at
+        # the end of posting, so a popular recipient's Transfers In row is
+        # held only for the tail of each transaction.
+        locked = lock_ledger_accounts([from_ledger.id, recipient.ledger_id])
+
+        # The cached entry may have gone stale in another process: the
+        # national id moved to another customer or the account was
+        # deactivated. Checked against the rows as they are now, with the
+        # account locked so it cannot be deactivated before we commit.
+        to_ledger = locked.get(recipient.ledger_id)
+        if (
+            to_ledger is None
+            or to_ledger.customer_id != recipient.customer_id
+            or to_ledger.bank_account_id != recipient.account_id
+            or not Account.objects.select_for_update()
+            .filter(
+                id=recipient.account_id,
+                is_active=True,
+                customer_id=recipient.customer_id,
+                customer__national_id=recipient_national_id,
+            )
+            .exists()
+        ):
+            invalidate_customer(recipient.customer_id)
+            raise ValueError("Recipient account changed, try again")
 
-        current_balance = from_ledger.balance()
+        # Read the balance from the locked row, not the instance loaded before the lock
+        current_balance = locked[from_ledger.id].balance()
         if amount > current_balance:
             raise InsufficientFundsError(balance=current_balance, amount=amount)
 
-        # Sender entry: Expense (Transfers Out) + Credit from Asset
-        post_journal_entry(
-            customer=sender,
-            date=date,
-            memo=memo or f"Transfer to {recipient_national_id}",
-            lines=[
-                {"account": sender_out_ledger, "debit": amount, "credit": 0},
-                {"account": from_ledger, "debit": 0, "credit": amount},
-            ],
-        )
+        return post_journal_entries([
+            # Sender entry: Expense (Transfers Out) + Credit from Asset
+            {
+                "customer": sender,
+                "date": date,
+                "memo": memo or f"Transfer to {recipient_national_id}",
+                "lines": [
+                    # Only the id of the system accounts is needed to post
+                    {"account": LedgerAccount(id=sender_out_id), "debit": amount, "credit": 0},
+                    {"account": from_ledger, "debit": 0, "credit": amount},
+                ],
+            },
+            # Recipient entry: Debit to Asset + Income (Transfers In)
+            {
+                "customer": Customer(id=recipient.customer_id),
+                "date": date,
+                "memo": memo or f"Transfer from {sender.id}",
+                "lines": [
+                    {"account": to_ledger, "debit": amount, "credit": 0},
+                    {"account": LedgerAccount(id=recipient.in_ledger_id), "debit": 0, "credit": amount},
+                ],
+            },
+        ])
 
-        # Recipient entry: Debit to Asset + Income (Transfers In)
-        post_journal_entry(
-            customer=recipient,
-            date=date,
-            memo=memo or f"Transfer from {sender.id}",
-            lines=[
-                {"account": to_ledger, "debit": amount, "credit": 0},
-                {"account": recipient_in_ledger, "debit": 0, "credit": amount},
-            ],
-        )
+
+@retry_on_conflict()
+def transfer_batch_to_national_ids(sender: Customer, from_account: Account, items, date=None):
+    """
+    Many transfers from one source account in a single locked transaction.
+
+    items = [
+        {"recipient_national_id": "...", "amount": "100.00", "memo": "optional", "date": optional},
+        ...
+    ]
+    An item's own date overrides `date`.
+
+    Returns one result per item, in input order:
+        {"index": 0, "status": "completed"}
+        {"index": 1, "status": "failed", "detail": "Recipient not found"}
+
+    A bad item only fails itself, including one dated in a closed period
+    of the sender or recipient. Items are funded in order; once the
+    balance runs out the remaining items fail with "Insufficient funds".
+    """
+    if from_account.customer_id != sender.id:
+        raise ValueError("Source account does not belong to sender")
+
+    if not date:
+        date = timezone.now().date()
+
+    results = [{"index": i, "status": "failed"} for i in range(len(items))]
+    pending = []
+    for i, item in enumerate(items):
+        try:
+            nid = clean_national_id(item.get("recipient_national_id"))
+        except ValueError as exc:
+            results[i]["detail"] = str(exc)
+            continue
+        try:
+            amount = Decimal(str(item.get("amount")))
+        except (InvalidOperation, TypeError, ValueError):
+            results[i]["detail"] = "Invalid amount"
+            continue
+        if not amount.is_finite() or amount <= 0:
+            results[i]["detail"] = "Amount must be positive"
+            continue
+        if amount != amount.quantize(CENT):
+            results[i]["detail"] = "Amount must have at most 2 decimal places"
+            continue
+        try:
+            entry_date = parse_date(item.get("date") or date)
+        except (ValidationError, TypeError):
+            results[i]["detail"] = "Invalid date"
+            continue
+        pending.append((i, nid, amount, item.get("memo") or "", entry_date))
+
+    # One query per lookup for the whole batch, instead of one per item. The
+    # sender comes along for its closing date as it is now.
+    national_ids = {p[1] for p in pending}
+    customers = list(Customer.objects.filter(Q(national_id__in=national_ids) | Q(id=sender.id)))
+    recipients = {c.national_id: c for c in customers if c.national_id in national_ids}
+    sender_closed_through = next(c.books_closed_through for c in customers if c.id == sender.id)
+    default_accounts = {}
+    for acc in (
+        Account.objects.filter(customer__in=recipients.values(), is_active=True)
+        .select_related("ledger_account")
+        .order_by("customer_id", "id")
+    ):
+        default_accounts.setdefault(acc.customer_id, acc)
+
+    valid = []
+    for i, nid, amount, memo, entry_date in pending:
+        recipient = recipients.get(nid)
+        if recipient is None:
+            results[i]["detail"] = "Recipient not found"
+        elif recipient.id == sender.id:
+            results[i]["detail"] = "Cannot transfer to self"
+        elif recipient.id not in default_accounts:
+            results[i]["detail"] = "Recipient has no active account"
+        elif getattr(default_accounts[recipient.id], "ledger_account", None) is None:
+            results[i]["detail"] = "Recipient account has no ledger"
+        elif any(d is not None and entry_date <= d for d in (sender_closed_through, recipient.books_closed_through)):
+            results[i]["detail"] = "Period closed"
+        else:
+            valid.append((i, nid, amount, memo, entry_date, recipient))
+
+    if not valid:
+        return results
+
+    from_ledger = from_account.ledger_account
+    system_accounts = get_or_create_system_accounts_bulk(
+        {sender.id} | {recipient.id for *_, recipient in valid}
+    )
+    sender_out_ledger, _ = system_accounts[sender.id]
+
+    # Asset accounts only; see transfer_to_national_id for why the system
+    # accounts are left to the posting UPDATEs
+    lock_ids = {from_ledger.id}
+    for *_, recipient in valid:
+        lock_ids.add(default_accounts[recipient.id].ledger_account.id)
+
+    with transaction.atomic():
+        # Lock everything once, in id order, so concurrent batches cannot deadlock
+        locked = lock_ledger_accounts(lock_ids)
+
+        available = locked[from_ledger.id].balance()
+        entries = []
+        for i, nid, amount, memo, entry_date, recipient in valid:
+            if amount > available:
+                results[i]["detail"] = "Insufficient funds"
+                continue
+            available -= amount
+
+            to_ledger = default_accounts[recipient.id].ledger_account
+            recipient_in_ledger = system_accounts[recipient.id][1]
+            entries.append({
+                "customer": sender,
+                "date": entry_date,
+                "memo": memo or f"Transfer to {mask_national_id(nid)}",
+                "lines": [
+                    {"account": sender_out_ledger, "debit": amount, "credit": 0},
+                    {"account": from_ledger, "debit": 0, "credit": amount},
+                ],
+            })
+            entries.append({
+                "customer": recipient,
+                "date": entry_date,
+                "memo": memo or f"Transfer from {sender.id}",
+                "lines": [
+                    {"account": to_ledger, "debit": amount, "credit": 0},
+                    {"account": recipient_in_ledger, "debit": 0, "credit": amount},
+                ],
+            })
+            results[i] = {"index": i, "status": "completed"}
+
+        post_journal_entries(entries)
+
+    return results
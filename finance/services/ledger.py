@@ -1,6 +1,23 @@
-from django.db import transaction
+from datetime import date as date_cls
+from django.db import connection, transaction
+from django.db.models import F
 from decimal import Decimal
-from finance.models import JournalEntry, LedgerLine
+from finance.models import Customer, JournalEntry, LedgerAccount, LedgerDailyBalance, LedgerLine
+from finance.services.exceptions import ClosedPeriodError
+
+def lock_ledger_accounts(account_ids):
+    """
+    SELECT ... FOR UPDATE on the given ledger accounts, always in id order,
+    so two transactions locking overlapping sets cannot deadlock.
+    Returns {id: locked LedgerAccount}. Call inside transaction.atomic().
+    """
+    return {
+        acc.id: acc
+        for acc in LedgerAccount.objects.select_for_update()
+        .filter(id__in=set(account_ids))
+        .order_by("id")
+    }
+
 
 def post_journal_entry(customer, date, memo, lines):
     """
@@ -9,23 +26,143 @@ def post_journal_entry(customer, date, memo, lines):
         {"account": ledger_account, "debit": 0, "credit": 100},
     ]
     """
-    total_debit = sum(Decimal(l["debit"]) for l in lines)
-    total_credit = sum(Decimal(l["credit"]) for l in lines)
+    return post_journal_entries(
+        [{"customer": customer, "date": date, "memo": memo, "lines": lines}]
+    )[0]
 
-    if total_debit != total_credit:
-        raise ValueError("Journal entry is not balanced")
 
-    with transaction.atomic():
-        entry = JournalEntry.objects.create(
-            customer=customer,
-            date=date,
-            memo=memo,
+def post_journal_entries(entries):
+    """
+    Posts many journal entries at once.
+
+    entries = [
+        {"customer": customer, "date": date, "memo": "...", "lines": [...]},
+        ...
+    ]
+
+    Every entry is validated in memory first; then all entries and all lines
+    are written with two bulk inserts in a single transaction. Returns the
+    created JournalEntry objects in input order.
+    """
+    for e in entries:
+        total_debit = sum(Decimal(l["debit"]) for l in e["lines"])
+        total_credit = sum(Decimal(l["credit"]) for l in e["lines"])
+        if total_debit != total_credit:
+            raise ValueError("Journal entry is not balanced")
+
+    journal_entries = [
+        JournalEntry(
+            customer=e["customer"],
+            date=date_cls.fromisoformat(e["date"]) if isinstance(e["date"], str) else e["date"],
+            memo=e["memo"],
         )
-        for l in lines:
-            LedgerLine.objects.create(
-                entry=entry,
+        for e in entries
+    ]
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            JournalEntry.objects.bulk_create(journal_entries)
+        else:
+            # bulk_create cannot hand back primary keys on this backend
+            for je in journal_entries:
+                je.save()
+
+        all_lines = [
+            {**l, "entry": je}
+            for je, e in zip(journal_entries, entries)
+            for l in e["lines"]
+        ]
+        LedgerLine.objects.bulk_create(
+            LedgerLine(
+                entry=l["entry"],
                 account=l["account"],
+                date=l["entry"].date,
                 debit=l["debit"],
                 credit=l["credit"],
             )
-    return entry
+            for l in all_lines
+        )
+        apply_line_totals(all_lines)
+        apply_daily_balances(all_lines)
+        # Checked only now: the UPDATEs above wait for a running close_period
+        # (which locks these rows), so this read sees its closing date
+        check_open_period(journal_entries)
+    return journal_entries
+
+
+def check_open_period(journal_entries):
+    customer_ids = {je.customer_id for je in journal_entries}
+    closed = dict(
+        Customer.objects.filter(id__in=customer_ids, books_closed_through__isnull=False)
+        .values_list("id", "books_closed_through")
+    )
+    for je in journal_entries:
+        closed_through = closed.get(je.customer_id)
+        if closed_through is not None and je.date <= closed_through:
+            raise ClosedPeriodError(date=je.date, closed_through=closed_through)
+
+
+def apply_line_totals(lines):
+    """
+    Adds the debit/credit of `lines` to the stored totals of their ledger
+    accounts. Must run inside the transaction that inserts the lines; the
+    UPDATE takes the row lock, so concurrent postings cannot lose an update.
+    """
+    deltas = {}
+    for l in lines:
+        debit, credit = deltas.get(l["account"].id, (Decimal(0), Decimal(0)))
+        deltas[l["account"].id] = (debit + Decimal(l["debit"]), credit + Decimal(l["credit"]))
+
+    # Always touch rows in id order so two postings cannot deadlock each other
+    for account_id in sorted(deltas):
+        debit, credit = deltas[account_id]
+        LedgerAccount.objects.filter(id=account_id).update(
+            debit_total=F("debit_total") + debit,
+            credit_total=F("credit_total") + credit,
+        )
+
+
+def apply_daily_balances(lines):
+    """
+    Adds `lines` (which carry their "entry") to the cumulative
+    LedgerDailyBalance rows: the row for the entry date and every later row
+    of the account move by the same amount. Backdated postings therefore
+    touch the rows after them; same-day postings touch one row.
+    Call after apply_line_totals, whose UPDATE holds the account row lock.
+    """
+    deltas = {}
+    for l in lines:
+        key = (l["account"].id, l["entry"].date)
+        debit, credit = deltas.get(key, (Decimal(0), Decimal(0)))
+        deltas[key] = (debit + Decimal(l["debit"]), credit + Decimal(l["credit"]))
+
+    missing = []
+    # account id -> (date, debit, credit) of the last row this batch
+    # produced; new rows are only inserted at the end, so a later date of
+    # the same account must build on it rather than on an older stored row
+    produced = {}
+    for (account_id, date) in sorted(deltas):
+        debit, credit = deltas[(account_id, date)]
+        latest = (
+            LedgerDailyBalance.objects.filter(account_id=account_id, date__lte=date)
+            .order_by("-date")
+            .values_list("date", "debit_total", "credit_total")
+            .first()
+        )
+        previous = produced.get(account_id)
+        if previous is not None and (latest is None or previous[0] > latest[0]):
+            latest = previous
+        LedgerDailyBalance.objects.filter(account_id=account_id, date__gte=date).update(
+            debit_total=F("debit_total") + debit,
+            credit_total=F("credit_total") + credit,
+        )
+        base_debit, base_credit = (latest[1], latest[2]) if latest else (0, 0)
+        produced[account_id] = (date, base_debit + debit, base_credit + credit)
+        if latest is None or latest[0] != date:
+            missing.append(LedgerDailyBalance(
+                account_id=account_id,
+                date=date,
+                debit_total=base_debit + debit,
+                credit_total=base_credit + credit,
+            ))
+    LedgerDailyBalance.objects.bulk_create(missing)
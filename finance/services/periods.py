@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from finance.models import Customer, LedgerAccount, LedgerCheckpoint, LedgerLine, money_sum
+from finance.services.archive import archived_totals
+
+
+def close_period(customer: Customer, through_date):
+    """
+    Closes the customer's books through `through_date` (inclusive).
+
+    Writes one LedgerCheckpoint per ledger account holding its cumulative
+    totals at that date, built from the previous checkpoint plus the lines in
+    between, and blocks further postings dated on or before it.
+    """
+    with transaction.atomic():
+        customer = Customer.objects.select_for_update().get(id=customer.id)
+        previous = customer.books_closed_through
+        if previous is not None and through_date <= previous:
+            raise ValueError(f"Books are already closed through {previous}")
+
+        # Locking the accounts makes in-flight postings (which UPDATE these
+        # rows) finish first, or wait and then see the new closing date
+        accounts = list(
+            LedgerAccount.objects.select_for_update()
+            .filter(customer=customer)
+            .order_by("id")
+        )
+
+        totals = {acc.id: (Decimal(0), Decimal(0)) for acc in accounts}
+        lines = LedgerLine.objects.filter(account__customer=customer, date__lte=through_date)
+        if previous is not None:
+            for cp in LedgerCheckpoint.objects.filter(account__customer=customer, date=previous):
+                totals[cp.account_id] = (cp.debit_total, cp.credit_total)
+            lines = lines.filter(date__gt=previous)
+
+        for row in lines.values("account_id").annotate(
+            debit_sum=Sum("debit"), credit_sum=Sum("credit")
+        ).order_by():
+            debit, credit = totals[row["account_id"]]
+            totals[row["account_id"]] = (debit + money_sum(row["debit_sum"]), credit + money_sum(row["credit_sum"]))
+
+        LedgerCheckpoint.objects.bulk_create(
+            LedgerCheckpoint(account_id=account_id, date=through_date, debit_total=debit, credit_total=credit)
+            for account_id, (debit, credit) in totals.items()
+        )
+
+        customer.books_closed_through = through_date
+        customer.save(update_fields=["books_closed_through", "updated_at"])
+    return customer
+
+
+def verify_checkpoints(customer_id=None):
+    """
+    Re-derives every checkpoint from the raw lines, live and archived.
+    Returns a list of (checkpoint, expected_debit, expected_credit) for the
+    ones that differ.
+    """
+    checkpoints = LedgerCheckpoint.objects.select_related("account")
+    if customer_id:
+        checkpoints = checkpoints.filter(account__customer_id=customer_id)
+
+    mismatches = []
+    # One grouped query per closing date rather than one per checkpoint
+    for date in checkpoints.values_list("date", flat=True).distinct().order_by("date"):
+        lines = LedgerLine.objects.filter(date__lte=date)
+        if customer_id:
+            lines = lines.filter(account__customer_id=customer_id)
+        expected = {
+            row["account_id"]: (money_sum(row["debit_sum"]), money_sum(row["credit_sum"]))
+            for row in lines.values("account_id").annotate(
+                debit_sum=Sum("debit"), credit_sum=Sum("credit")
+            ).order_by()
+        }
+        for account_id, totals in archived_totals(customer_id, date_to=date).items():
+            debit, credit = expected.get(account_id, (0, 0))
+            expected[account_id] = (debit + totals["debit"], credit + totals["credit"])
+        for cp in checkpoints.filter(date=date).iterator():
+            debit, credit = expected.get(cp.account_id, (0, 0))
+            if (cp.debit_total, cp.credit_total) != (debit, credit):
+                mismatches.append((cp, debit, credit))
+    return mismatches
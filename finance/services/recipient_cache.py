@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU with a TTL, local to the process.
+
+    Entries are dropped explicitly by the model signals in finance.signals;
+    the TTL bounds how long another process's change can go unnoticed.
+    Keys carry a tag (a customer id, a currency code) so every entry with
+    that tag can be dropped at once.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, tag, expires = item
+            if expires < time.monotonic():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, tag):
+        with self._lock:
+            self._drop(key)
+            self._data[key] = (value, tag, time.monotonic() + self.ttl)
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._keys_by_tag.clear()
+
+    def _drop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            keys = self._keys_by_tag.get(item[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[item[1]]
+
+
+transfer_cache = LRUCache(
+    maxsize=getattr(settings, "FINANCE_RECIPIENT_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "FINANCE_RECIPIENT_CACHE_TTL", 60),
+)
+
+
+def invalidate_customer(customer_id):
+    transfer_cache.invalidate_tag(customer_id)
+
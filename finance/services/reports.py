@@ -0,0 +1,316 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import DecimalField, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from finance.models import LedgerAccount, LedgerArchive, LedgerCheckpoint, LedgerLine, money_sum
+from finance.services.archive import TOTAL_FIELDS, archived_totals
+
+REPORT_CHUNK_SIZE = 2000
+ZERO = Decimal("0.00")
+
+TRIAL_BALANCE_FIELDS = (
+    "customer_id",
+    "account_id",
+    "account_name",
+    "account_type",
+    "opening_debit",
+    "opening_credit",
+    "debit",
+    "credit",
+    "closing_debit",
+    "closing_credit",
+    "balance",
+)
+
+
+def account_totals_queryset(customer_id=None, date_from=None, date_to=None, opening=True, after=None):
+    """
+    One grouped query over LedgerLine: per ledger account, the totals before
+    `date_from` (opening) and within [date_from, date_to] (movement).
+    Accounts without lines in range are left out. With opening=False the
+    lines before `date_from` are not read at all, and with `after` neither
+    are the lines on or before that date.
+    """
+    lines = LedgerLine.objects.all()
+    if customer_id:
+        lines = lines.filter(account__customer_id=customer_id)
+    if after:
+        lines = lines.filter(date__gt=after)
+    if date_to:
+        lines = lines.filter(date__lte=date_to)
+    if date_from and not opening:
+        lines = lines.filter(date__gte=date_from)
+
+    zero = Value(ZERO, output_field=DecimalField(max_digits=18, decimal_places=2))
+    if date_from and opening:
+        before = Q(date__lt=date_from)
+        totals = {
+            "opening_debit": Coalesce(Sum("debit", filter=before), zero),
+            "opening_credit": Coalesce(Sum("credit", filter=before), zero),
+            "debit": Coalesce(Sum("debit", filter=~before), zero),
+            "credit": Coalesce(Sum("credit", filter=~before), zero),
+        }
+    else:
+        totals = {
+            "opening_debit": zero,
+            "opening_credit": zero,
+            "debit": Coalesce(Sum("debit"), zero),
+            "credit": Coalesce(Sum("credit"), zero),
+        }
+
+    return (
+        lines.values(
+            "account_id",
+            customer_id=F("account__customer_id"),
+            account_name=F("account__name"),
+            account_type=F("account__type"),
+        )
+        .annotate(**totals)
+        .order_by("customer_id", "account_type", "account_name")
+    )
+
+
+def signed(account_type, debit, credit):
+    if account_type in LedgerAccount.DEBIT_NORMAL_TYPES:
+        return debit - credit
+    return credit - debit
+
+
+def build_row(row):
+    opening_debit, opening_credit = money_sum(row["opening_debit"]), money_sum(row["opening_credit"])
+    debit, credit = money_sum(row["debit"]), money_sum(row["credit"])
+    net = (opening_debit + debit) - (opening_credit + credit)
+    return {
+        "customer_id": row["customer_id"],
+        "account_id": row["account_id"],
+        "account_name": row["account_name"],
+        "account_type": row["account_type"],
+        "opening_debit": opening_debit,
+        "opening_credit": opening_credit,
+        "debit": debit,
+        "credit": credit,
+        # Trial balance columns: the net balance on the side it falls on
+        "closing_debit": max(net, ZERO),
+        "closing_credit": max(-net, ZERO),
+        "balance": net if row["account_type"] in LedgerAccount.DEBIT_NORMAL_TYPES else -net,
+    }
+
+
+def merge_totals(rows, extra_totals):
+    """
+    Adds totals kept outside LedgerLine ({account_id: totals}, from the
+    archive or from checkpoints) to the live grouped rows, and yields rows
+    for accounts with no live lines in range. Rows stay grouped by
+    customer; within a customer they are re-sorted by type and name.
+    """
+    pending = defaultdict(dict)
+    for acc in LedgerAccount.objects.filter(id__in=extra_totals).values("id", "customer_id", "name", "type"):
+        pending[acc["customer_id"]][acc["id"]] = {
+            "account_id": acc["id"],
+            "customer_id": acc["customer_id"],
+            "account_name": acc["name"],
+            "account_type": acc["type"],
+            **extra_totals[acc["id"]],
+        }
+
+    def customer_rows(customer_id, live):
+        extra = pending.pop(customer_id, {})
+        merged = []
+        for row in live:
+            totals = extra.pop(row["account_id"], None)
+            if totals:
+                row = {**row, **{f: money_sum(row[f]) + totals[f] for f in TOTAL_FIELDS}}
+            merged.append(row)
+        merged += extra.values()
+        return sorted(merged, key=itemgetter("account_type", "account_name"))
+
+    for customer_id, live in groupby(rows, key=itemgetter("customer_id")):
+        for archived_only in sorted(c for c in pending if c < customer_id):
+            yield from customer_rows(archived_only, [])
+        yield from customer_rows(customer_id, live)
+    for archived_only in sorted(pending):
+        yield from customer_rows(archived_only, [])
+
+
+def merge_archived_by_customer(rows, date_from=None, date_to=None, opening=True):
+    """
+    merge_totals for an all-customer run: each archived customer's totals
+    are computed when the rows reach that customer, so only one customer's
+    archived accounts are held at a time.
+    """
+    pending = sorted(set(LedgerArchive.objects.values_list("customer_id", flat=True)))
+    pending.reverse()
+
+    def archived_only_before(customer_id):
+        while pending and (customer_id is None or pending[-1] < customer_id):
+            archived_id = pending.pop()
+            yield from merge_totals([], archived_totals(archived_id, date_from, date_to, opening))
+
+    for customer_id, live in groupby(rows, key=itemgetter("customer_id")):
+        yield from archived_only_before(customer_id)
+        if pending and pending[-1] == customer_id:
+            pending.pop()
+            live = merge_totals(live, archived_totals(customer_id, date_from, date_to, opening))
+        yield from live
+    yield from archived_only_before(None)
+
+
+def has_archive(customer):
+    return customer.ledger_archived_through is not None
+
+
+def report_checkpoint(customer, date_from=None, date_to=None):
+    """
+    The closing date a report with opening balances can start from: the
+    latest one before `date_from`, or on or before `date_to` when there is
+    no `date_from`. None when the customer has none, or when archived
+    lines after it would have to be read anyway.
+
+    Checkpoints hold every line through their date, archived or not, so
+    the report reads only the lines after it. Closing dates only move
+    forward, so the usual report on the open period needs no query here.
+    """
+    closed = customer.books_closed_through
+    if closed is None:
+        return None
+    bound = date_from - timedelta(days=1) if date_from else date_to
+    checkpoint = closed
+    if bound is not None and closed > bound:
+        checkpoint = LedgerCheckpoint.objects.filter(
+            account__customer_id=customer.id, date__lte=bound
+        ).aggregate(date=Max("date"))["date"]
+    archived = customer.ledger_archived_through
+    if checkpoint is None or (archived is not None and checkpoint < archived):
+        return None
+    return checkpoint
+
+
+def checkpoint_totals(customer_id, checkpoint, opening):
+    """The checkpoint as {account_id: totals}, as opening totals or, with no `date_from`, as movement."""
+    debit_field, credit_field = ("opening_debit", "opening_credit") if opening else ("debit", "credit")
+    totals = {}
+    for account_id, debit, credit in (
+        LedgerCheckpoint.objects.filter(account__customer_id=customer_id, date=checkpoint)
+        .exclude(debit_total=0, credit_total=0)
+        .values_list("account_id", "debit_total", "credit_total")
+    ):
+        totals[account_id] = {**dict.fromkeys(TOTAL_FIELDS, ZERO), debit_field: debit, credit_field: credit}
+    return totals
+
+
+def iter_trial_balance(customer_id=None, date_from=None, date_to=None, opening=True, chunk_size=REPORT_CHUNK_SIZE,
+                       include_archived=True, checkpoint=None):
+    """
+    Yields one row per ledger account, ordered by customer. Uses a
+    server-side cursor where the backend has one, so an all-customer run
+    holds only `chunk_size` rows at a time. Archived lines in range are
+    included (see services.archive) unless `include_archived` is false,
+    which saves the archive lookup for customers known to have none.
+
+    With a `checkpoint` from report_checkpoint (one customer, opening
+    balances wanted), everything through it comes from its
+    LedgerCheckpoint rows and only later lines are read.
+    """
+    rows = account_totals_queryset(customer_id, date_from, date_to, opening, after=checkpoint)
+    rows = rows.iterator(chunk_size=chunk_size)
+    if checkpoint:
+        extra = checkpoint_totals(customer_id, checkpoint, opening=bool(date_from))
+    elif include_archived and not customer_id:
+        rows, extra = merge_archived_by_customer(rows, date_from, date_to, opening), None
+    else:
+        extra = include_archived and archived_totals(customer_id, date_from, date_to, opening)
+    if extra:
+        rows = merge_totals(rows, extra)
+    for row in rows:
+        yield build_row(row)
+
+
+def trial_balance(customer, date_from=None, date_to=None):
+    accounts = list(iter_trial_balance(
+        customer.id, date_from, date_to, include_archived=has_archive(customer),
+        checkpoint=report_checkpoint(customer, date_from, date_to),
+    ))
+    total_debit = sum((r["closing_debit"] for r in accounts), ZERO)
+    total_credit = sum((r["closing_credit"] for r in accounts), ZERO)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "accounts": accounts,
+        "total_debit": total_debit,
+        "total_credit": total_credit,
+        "balanced": total_debit == total_credit,
+    }
+
+
+def section(rows, account_type):
+    items = [
+        {"account_id": r["account_id"], "account_name": r["account_name"], "balance": r["balance"]}
+        for r in rows
+        if r["account_type"] == account_type
+    ]
+    return items, sum((i["balance"] for i in items), ZERO)
+
+
+def balance_sheet(customer, as_of=None):
+    """
+    Assets, liabilities and equity as of a date. Income and expense are not
+    closed into equity by journal entries, so their net shows up as
+    current earnings on the equity side.
+    """
+    rows = list(iter_trial_balance(
+        customer.id, date_to=as_of, include_archived=has_archive(customer),
+        checkpoint=report_checkpoint(customer, date_to=as_of),
+    ))
+    assets, total_assets = section(rows, LedgerAccount.ASSET)
+    liabilities, total_liabilities = section(rows, LedgerAccount.LIABILITY)
+    equity, total_equity = section(rows, LedgerAccount.EQUITY)
+    _, income = section(rows, LedgerAccount.INCOME)
+    _, expense = section(rows, LedgerAccount.EXPENSE)
+    earnings = income - expense
+    return {
+        "as_of": as_of,
+        "assets": assets,
+        "liabilities": liabilities,
+        "equity": equity,
+        "current_earnings": earnings,
+        "total_assets": total_assets,
+        "total_liabilities": total_liabilities,
+        "total_equity": total_equity + earnings,
+        "balanced": total_assets == total_liabilities + total_equity + earnings,
+    }
+
+
+def movement(rows, account_type):
+    items = [
+        {
+            "account_id": r["account_id"],
+            "account_name": r["account_name"],
+            "amount": signed(account_type, r["debit"], r["credit"]),
+        }
+        for r in rows
+        if r["account_type"] == account_type
+    ]
+    return items, sum((i["amount"] for i in items), ZERO)
+
+
+def income_statement(customer, date_from=None, date_to=None):
+    """Income and expense movement within the range, from the same grouped query."""
+    rows = list(iter_trial_balance(
+        customer.id, date_from, date_to, opening=False, include_archived=has_archive(customer)
+    ))
+    income, total_income = movement(rows, LedgerAccount.INCOME)
+    expenses, total_expenses = movement(rows, LedgerAccount.EXPENSE)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "income": income,
+        "expenses": expenses,
+        "total_income": total_income,
+        "total_expenses": total_expenses,
+        "net_income": total_income - total_expenses,
+    }
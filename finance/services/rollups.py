@@ -0,0 +1,231 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+
+from finance.models import Category, MonthlySpend, Transaction, TransactionDailyRollup, money_sum
+from finance.services.fx import convert_rows, missing_rates_report, rate_date_expression
+
+REBUILD_CHUNK_SIZE = 5000
+
+BUCKETS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+    "quarter": TruncQuarter,
+    "year": TruncYear,
+}
+
+# Rollup model -> (period field, bucket)
+ROLLUP_GRAINS = {
+    TransactionDailyRollup: ("date", "day"),
+    MonthlySpend: ("month", "month"),
+}
+
+
+def add_delta(deltas, customer_id, account_id, category_id, date, amount, count):
+    key = (customer_id, account_id, category_id, date)
+    total, n = deltas.get(key, (Decimal(0), 0))
+    deltas[key] = (total + Decimal(amount), n + count)
+
+
+def transaction_deltas(transactions, sign=1):
+    # Unsaved values may still be strings ("2025-01-31", "12.50")
+    to_date = Transaction._meta.get_field("date").to_python
+    to_amount = Transaction._meta.get_field("amount").to_python
+    deltas = {}
+    for t in transactions:
+        add_delta(
+            deltas,
+            t.account.customer_id,
+            t.account_id,
+            t.category_id,
+            to_date(t.date),
+            sign * to_amount(t.amount),
+            sign,
+        )
+    return deltas
+
+
+def monthly_deltas(deltas):
+    """Folds daily deltas into the first day of their month."""
+    monthly = {}
+    for (customer_id, account_id, category_id, date), (total, count) in deltas.items():
+        add_delta(monthly, customer_id, account_id, category_id, date.replace(day=1), total, count)
+    return monthly
+
+
+def apply_transaction_deltas(deltas):
+    """Everything kept incrementally from Transaction: the daily rollups and the monthly spend counters."""
+    with transaction.atomic():
+        apply_rollup_deltas(deltas)
+        apply_rollup_deltas(monthly_deltas(deltas), MonthlySpend, "month")
+
+
+def apply_rollup_deltas(deltas, model=TransactionDailyRollup, period_field="date"):
+    """
+    Adds (total, count) deltas keyed by (customer_id, account_id,
+    category_id, period) to the rows of a rollup model.
+
+    The existing rows are read with one locking SELECT (in id order, so two
+    writers cannot deadlock) and written back with bulk_update; missing ones
+    are inserted together. If a concurrent writer inserted one of them
+    first, those keys fall back to a row-by-row F() update.
+    """
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if not deltas:
+        return
+
+    def key_of(row):
+        return (row.customer_id, row.account_id, row.category_id, getattr(row, period_field))
+
+    with transaction.atomic():
+        candidates = model.objects.select_for_update().filter(**{
+            "account_id__in": {k[1] for k in deltas},
+            "category_id__in": {k[2] for k in deltas},
+            f"{period_field}__range": (min(k[3] for k in deltas), max(k[3] for k in deltas)),
+        }).order_by("id")
+        existing = []
+        for row in candidates:
+            key = key_of(row)
+            if key in deltas:
+                total, count = deltas[key]
+                row.total += total
+                row.count += count
+                existing.append(row)
+        model.objects.bulk_update(existing, ["total", "count"])
+
+        found = {key_of(r) for r in existing}
+        missing = [
+            model(
+                customer_id=customer_id,
+                account_id=account_id,
+                category_id=category_id,
+                total=total,
+                count=count,
+                **{period_field: period},
+            )
+            for (customer_id, account_id, category_id, period), (total, count) in sorted(deltas.items())
+            if (customer_id, account_id, category_id, period) not in found
+        ]
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(missing)
+        except IntegrityError:
+            for row in missing:
+                try:
+                    with transaction.atomic():
+                        row.save(force_insert=True)
+                except IntegrityError:
+                    model.objects.filter(**{
+                        "account_id": row.account_id,
+                        "category_id": row.category_id,
+                        period_field: getattr(row, period_field),
+                    }).update(total=F("total") + row.total, count=F("count") + row.count)
+
+
+def rebuild_rollups(customer_id=None, chunk_size=REBUILD_CHUNK_SIZE, model=TransactionDailyRollup):
+    """
+    Recreates the rows of a rollup model (the daily rollups or MonthlySpend)
+    from Transaction with one grouped query.
+    Returns the number of rows written.
+    """
+    period_field, bucket = ROLLUP_GRAINS[model]
+    transactions = Transaction.objects.all()
+    rollups = model.objects.all()
+    if customer_id:
+        transactions = transactions.filter(customer_id=customer_id)
+        rollups = rollups.filter(customer_id=customer_id)
+
+    grouped = (
+        transactions.annotate(period=BUCKETS[bucket]("date"))
+        .values("customer_id", "account_id", "category_id", "period")
+        .annotate(total_sum=Sum("amount"), row_count=Count("id"))
+        .order_by()
+    )
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in grouped.iterator(chunk_size=chunk_size):
+            batch.append(model(
+                customer_id=row["customer_id"],
+                account_id=row["account_id"],
+                category_id=row["category_id"],
+                total=money_sum(row["total_sum"]),
+                count=row["row_count"],
+                **{period_field: row["period"]},
+            ))
+            if len(batch) >= chunk_size:
+                written += len(model.objects.bulk_create(batch))
+                batch = []
+        written += len(model.objects.bulk_create(batch))
+    return written
+
+
+def cash_flow_series(customer, bucket="month", date_from=None, date_to=None,
+                     account_id=None, category_id=None, by_category=False):
+    """
+    Income/expense per bucket read from the daily rollups, so the cost
+    depends on the number of days in range, not on transaction volume.
+    Amounts are in the customer's base currency; foreign-currency rollups
+    are converted at each day's rate with one batched lookup.
+    Returns (series, missing_rates).
+    """
+    base = customer.base_currency
+    qs = TransactionDailyRollup.objects.filter(customer_id=customer.id)
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    if account_id:
+        qs = qs.filter(account_id=account_id)
+    if category_id:
+        qs = qs.filter(category_id=category_id)
+
+    group = ["period"]
+    if by_category:
+        group += ["category_id", "category__name"]
+    income = Q(category__type=Category.INCOME)
+    expense = Q(category__type=Category.EXPENSE)
+    rows = list(
+        qs.annotate(period=BUCKETS[bucket]("date"), rate_date=rate_date_expression(base))
+        .values(*group, "account__currency", "rate_date")
+        .annotate(
+            income=Sum("total", filter=income),
+            expense=Sum("total", filter=expense),
+            income_count=Sum("count", filter=income),
+            expense_count=Sum("count", filter=expense),
+        )
+        .order_by()
+    )
+    missing = convert_rows(rows, base, ["income", "expense"], "account__currency", "rate_date")
+
+    merged = {}
+    for row in rows:
+        key = tuple(row[g] for g in group)
+        item = merged.setdefault(key, {
+            "period": row["period"],
+            "income": Decimal(0),
+            "expense": Decimal(0),
+            "income_count": 0,
+            "expense_count": 0,
+        })
+        # Rows without a rate are left out of the amounts but still counted
+        item["income"] += row["income"] or 0
+        item["expense"] += row["expense"] or 0
+        item["income_count"] += row["income_count"] or 0
+        item["expense_count"] += row["expense_count"] or 0
+        if by_category:
+            item["category_id"] = row["category_id"]
+            item["category_name"] = row["category__name"]
+
+    series = []
+    for key in sorted(merged):
+        item = merged[key]
+        item["income"] = money_sum(item["income"])
+        item["expense"] = money_sum(item["expense"])
+        item["net"] = item["income"] - item["expense"]
+        series.append(item)
+    return series, missing_rates_report(missing)
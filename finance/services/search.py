@@ -0,0 +1,169 @@
+"""
+Full-text search over Transaction.description and JournalEntry.memo.
+
+Each backend keeps its index in the database itself (FTS5 tables with
+triggers on SQLite, expression GIN indexes on PostgreSQL), so rows written
+by bulk_create, queryset.update() or raw SQL are indexed too. Backends
+without one fall back to LIKE scans.
+
+The backend is picked from the database vendor, or set with
+FINANCE_SEARCH_BACKEND to a dotted path of a SearchBackend subclass.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from finance.models import JournalEntry, Transaction
+
+MAX_TERMS = 8
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Indexed text column per model
+SEARCH_FIELDS = {
+    Transaction: "description",
+    JournalEntry: "memo",
+}
+
+
+def search_terms(query):
+    return TERM_RE.findall(query or "")[:MAX_TERMS]
+
+
+class SearchBackend:
+    """LIKE scans: correct everywhere, but a full scan per search."""
+
+    def install(self, conn):
+        pass
+
+    def rebuild(self, conn):
+        pass
+
+    def installed_fields(self, conn, cursor):
+        """
+        The SEARCH_FIELDS entries whose table exists. post_migrate also
+        fires before this app's tables are created (or after they are
+        migrated away); those models are picked up by a later migrate.
+        """
+        tables = set(conn.introspection.table_names(cursor))
+        return [(model, field) for model, field in SEARCH_FIELDS.items() if model._meta.db_table in tables], tables
+
+    def filter(self, queryset, query):
+        field = SEARCH_FIELDS[queryset.model]
+        for term in search_terms(query):
+            queryset = queryset.filter(**{f"{field}__icontains": term})
+        return queryset
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    One external-content FTS5 table per model, holding only the token
+    index; the text stays in the model table. Triggers keep it in step with
+    every INSERT, UPDATE and DELETE. Terms are matched as prefixes and all
+    must be present.
+    """
+
+    def fts_table(self, model):
+        return f"{model._meta.db_table}_fts"
+
+    def install(self, conn):
+        with conn.cursor() as cursor:
+            fields, existing = self.installed_fields(conn, cursor)
+            for model, field in fields:
+                table, fts = model._meta.db_table, self.fts_table(model)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{field}, content='{table}', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2')"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {field}) VALUES (new.id, new.{field}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {field}) VALUES ('delete', old.id, old.{field}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {field} ON {table} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {field}) VALUES ('delete', old.id, old.{field}); "
+                    f"INSERT INTO {fts}(rowid, {field}) VALUES (new.id, new.{field}); END"
+                )
+                if fts not in existing:
+                    # Rows written before the index existed
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def rebuild(self, conn):
+        with conn.cursor() as cursor:
+            fields, existing = self.installed_fields(conn, cursor)
+            for model, _ in fields:
+                fts = self.fts_table(model)
+                if fts in existing:
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        # "term"* is a prefix match; quoting keeps FTS5 operators in user input inert
+        match = " ".join(f'"{term}"*' for term in terms)
+        fts = self.fts_table(queryset.model)
+        return queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match]))
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    to_tsvector('simple', ...) expression indexes (GIN), matched with
+    prefix tsqueries. 'simple' does no stemming, so Persian and English
+    text are treated alike.
+    """
+
+    def index_name(self, model):
+        return f"{model._meta.db_table}_fts_idx"
+
+    def install(self, conn):
+        with conn.cursor() as cursor:
+            fields, _ = self.installed_fields(conn, cursor)
+            for model, field in fields:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.index_name(model)} ON {model._meta.db_table} "
+                    f"USING gin (to_tsvector('simple', {field}))"
+                )
+
+    def filter(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        field = SEARCH_FIELDS[queryset.model]
+        table = queryset.model._meta.db_table
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT id FROM {table} WHERE to_tsvector('simple', {field}) @@ to_tsquery('simple', %s)",
+            [tsquery],
+        ))
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SQLiteFTS5Backend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend(conn=connection):
+    path = getattr(settings, "FINANCE_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(conn.vendor, SearchBackend)()
+
+
+def install_search_index(using="default", **kwargs):
+    """post_migrate receiver: creates the index objects if they are missing."""
+    conn = connections[using]
+    get_backend(conn).install(conn)
+
+
+def search(queryset, query):
+    """Narrows a Transaction or JournalEntry queryset to rows matching every term of `query`."""
+    return get_backend(connection).filter(queryset, query)
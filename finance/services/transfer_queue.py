@@ -0,0 +1,138 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from finance.models import Account, Customer, TransferRequest
+from finance.services.concurrency import retry_on_conflict
+from finance.services.inter_customer_transfers import transfer_batch_to_national_ids
+from finance.services.utils import clean_national_id
+
+# Transfers posted per source account per transaction
+WORKER_BATCH_SIZE = getattr(settings, "FINANCE_TRANSFER_WORKER_BATCH_SIZE", 500)
+
+
+def enqueue_transfer(sender: Customer, from_account: Account, recipient_national_id, amount, date=None, memo=""):
+    """
+    Records a transfer for the worker to post and returns the pending
+    TransferRequest. Only the inputs are checked here; the recipient and
+    the funds are checked when the worker posts it.
+    """
+    if from_account.customer_id != sender.id:
+        raise ValueError("Source account does not belong to sender")
+    try:
+        amount = Decimal(str(amount))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError("Invalid amount")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("Amount must be positive")
+    recipient_national_id = clean_national_id(recipient_national_id)
+
+    try:
+        date = TransferRequest._meta.get_field("date").to_python(date) or timezone.now().date()
+    except ValidationError:
+        raise ValueError("Invalid date")
+    return TransferRequest.objects.create(
+        customer=sender,
+        from_account=from_account,
+        recipient_national_id=recipient_national_id,
+        amount=amount,
+        date=date,
+        memo=memo or "",
+    )
+
+
+def post_requests(sender, from_account, requests):
+    """
+    Posts the requests as one batch. A ValueError for the whole batch (a
+    closed period, say) falls back to one savepoint per request, so only
+    the offending requests fail.
+    """
+    items = [
+        {
+            "recipient_national_id": r.recipient_national_id,
+            "amount": r.amount,
+            "memo": r.memo,
+            "date": r.date,
+        }
+        for r in requests
+    ]
+    try:
+        return transfer_batch_to_national_ids(sender, from_account, items)
+    except ValueError:
+        pass
+
+    results = []
+    for i, item in enumerate(items):
+        try:
+            result = transfer_batch_to_national_ids(sender, from_account, [item])[0]
+        except ValueError as exc:
+            result = {"status": "failed", "detail": str(exc)}
+        results.append(dict(result, index=i))
+    return results
+
+
+@retry_on_conflict()
+def process_account_queue(from_account_id, batch_size=WORKER_BATCH_SIZE):
+    """
+    Posts up to `batch_size` pending requests of one source account in a
+    single transaction: the account is locked and its balance read once for
+    the whole group, and the entries go out in one bulk posting.
+
+    Rows another worker holds are skipped (SKIP LOCKED where supported).
+    If the worker dies mid-batch the transaction rolls back and the rows
+    stay pending. Returns (completed, failed).
+    """
+    with transaction.atomic():
+        requests = list(
+            TransferRequest.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(status=TransferRequest.PENDING, from_account_id=from_account_id)
+            .select_related("from_account__customer", "from_account__ledger_account")
+            .order_by("id")[:batch_size]
+        )
+        if not requests:
+            return 0, 0
+
+        from_account = requests[0].from_account
+        if not from_account.is_active or getattr(from_account, "ledger_account", None) is None:
+            results = [{"status": "failed", "detail": "Invalid source account"} for _ in requests]
+        else:
+            results = post_requests(from_account.customer, from_account, requests)
+
+        now = timezone.now()
+        completed = 0
+        for r, result in zip(requests, results):
+            r.status = result["status"]
+            r.detail = result.get("detail", "")
+            r.attempts += 1
+            r.processed_at = now
+            r.updated_at = now
+            completed += r.status == TransferRequest.COMPLETED
+        TransferRequest.objects.bulk_update(
+            requests, ["status", "detail", "attempts", "processed_at", "updated_at"]
+        )
+    return completed, len(requests) - completed
+
+
+def process_pending_transfers(batch_size=WORKER_BATCH_SIZE):
+    """
+    One pass over the queue: each source account with pending requests is
+    drained in groups of `batch_size`. Returns {"completed": n, "failed": n}.
+    """
+    stats = {"completed": 0, "failed": 0}
+    account_ids = (
+        TransferRequest.objects.filter(status=TransferRequest.PENDING)
+        .values_list("from_account_id", flat=True)
+        .distinct()
+        .order_by("from_account_id")
+    )
+    for account_id in list(account_ids):
+        while True:
+            completed, failed = process_account_queue(account_id, batch_size)
+            stats["completed"] += completed
+            stats["failed"] += failed
+            if completed + failed < batch_size:
+                break
+    return stats
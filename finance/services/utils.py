@@ -1,3 +1,17 @@
+def clean_national_id(national_id) -> str:
+    """
+    The national id stripped of surrounding whitespace. Raises ValueError
+    when it is missing or not a string (a JSON number, say, which would
+    already have lost any leading zeros).
+    """
+    if national_id is not None and not isinstance(national_id, str):
+        raise ValueError("Recipient national_id must be a string")
+    nid = (national_id or "").strip()
+    if not nid:
+        raise ValueError("Recipient national_id is required")
+    return nid
+
+
 def mask_national_id(national_id: str, keep_last: int = 4) -> str:
     nid = (national_id or "").strip()
     if not nid:
@@ -0,0 +1,98 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from finance.models import Account, Category, Customer, FxRate, LedgerAccount, Transaction
+from finance.services.dashboard import (
+    invalidate_all_dashboard_summaries,
+    invalidate_dashboard_summary,
+)
+from finance.services.fx import invalidate_rates
+from finance.services.inter_customer_transfers import provision_system_accounts
+from finance.services.recipient_cache import invalidate_customer
+from finance.services.rollups import add_delta, apply_transaction_deltas, transaction_deltas
+
+# bulk_create skips post_save; bulk writers send this instead with transactions=[...]
+transactions_bulk_created = Signal()
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, **kwargs):
+    # The row as it is in the DB before this save, so receivers can undo its old effect
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Transaction.objects.filter(pk=instance.pk)
+            .values("account__customer_id", "account_id", "category_id", "date", "amount")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None) or {}
+    invalidate_dashboard_summary(
+        instance.account.customer_id,
+        previous.get("account__customer_id"),
+    )
+
+    deltas = transaction_deltas([instance])
+    if previous:
+        add_delta(
+            deltas,
+            previous["account__customer_id"],
+            previous["account_id"],
+            previous["category_id"],
+            previous["date"],
+            -previous["amount"],
+            -1,
+        )
+    apply_transaction_deltas(deltas)
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    invalidate_dashboard_summary(instance.account.customer_id)
+    apply_transaction_deltas(transaction_deltas([instance], sign=-1))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate_all_dashboard_summaries()
+
+
+@receiver(post_save, sender=FxRate)
+@receiver(post_delete, sender=FxRate)
+def fx_rate_changed(sender, instance, **kwargs):
+    invalidate_rates(instance.currency)
+    invalidate_all_dashboard_summaries()
+
+
+@receiver(transactions_bulk_created)
+def transactions_bulk_created_handler(sender, transactions, **kwargs):
+    invalidate_dashboard_summary(*{t.account.customer_id for t in transactions})
+    apply_transaction_deltas(transaction_deltas(transactions))
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, **kwargs):
+    if created:
+        provision_system_accounts(instance)
+    # national_id may have changed
+    invalidate_customer(instance.id)
+    # and so may base_currency
+    invalidate_dashboard_summary(instance.id)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    invalidate_customer(instance.id)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=LedgerAccount)
+@receiver(post_delete, sender=LedgerAccount)
+def transfer_target_changed(sender, instance, **kwargs):
+    # Default account, its ledger link or the system accounts may have changed
+    invalidate_customer(instance.customer_id)
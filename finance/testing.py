@@ -0,0 +1,40 @@
+from django.test import override_settings
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for per-view query budgets, read from the profile that
+    QueryInstrumentationMiddleware attaches to each request.
+
+        class DashboardTests(QueryBudgetMixin, TestCase):
+            query_budgets = {"dashboard": 6}
+
+            def test_dashboard(self):
+                self.assertWithinQueryBudget(self.client.get("/dashboard/"))
+
+    Labels are the ones shown by the request_stats command. The middleware
+    is switched on for these tests whatever FINANCE_QUERY_INSTRUMENTATION
+    says.
+    """
+    query_budgets = {}
+
+    @classmethod
+    def setUpClass(cls):
+        instrumented = override_settings(FINANCE_QUERY_INSTRUMENTATION=True)
+        instrumented.enable()
+        cls.addClassCleanup(instrumented.disable)
+        super().setUpClass()
+
+    def assertWithinQueryBudget(self, response):
+        profile = getattr(response.wsgi_request, "query_profile", None)
+        if profile is None:
+            self.fail("No query profile; is QueryInstrumentationMiddleware in MIDDLEWARE?")
+        if profile.label not in self.query_budgets:
+            self.fail(f"No query budget declared for {profile.label!r}")
+        budget = self.query_budgets[profile.label]
+        if profile.queries > budget:
+            self.fail(
+                f"{profile.label} ran {profile.queries} queries, budget is {budget}. "
+                f"Slowest ({profile.slowest_ms:.1f}ms): {profile.slowest_sql}"
+            )
+        return profile
@@ -1,3 +1,1763 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.models import F, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from finance.benchmarks import CASES, load_baselines, measure
+from finance.management.commands.run_benchmarks import Command as RunBenchmarksCommand
+from finance.models import (
+    Account,
+    Budget,
+    Category,
+    Customer,
+    FxRate,
+    IdempotencyKey,
+    JournalEntry,
+    LedgerAccount,
+    LedgerArchive,
+    LedgerCheckpoint,
+    LedgerDailyBalance,
+    LedgerLine,
+    LedgerVerification,
+    MonthlySpend,
+    RecurringTransaction,
+    Transaction,
+    TransactionDailyRollup,
+    Transfer,
+    TransferRequest,
+)
+from finance.services import archive
+from finance.services.archive import archive_closed_lines
+from finance.services.concurrency import conflict_stats, is_retryable_db_error, retry_on_conflict
+from finance.services.dashboard import compute_dashboard_summary, get_dashboard_summary, summary_cache_timeout
+from finance.services.fx import fx_cache, get_rates
+from finance.services.idempotency import execute_once, response_cache
+from finance.services.importers import StatementImporter, parse_csv
+from finance.services.integrity import verify_ledger
+from finance.services.inter_customer_transfers import (
+    TRANSFERS_IN_NAME,
+    TRANSFERS_OUT_NAME,
+    resolve_recipient,
+    transfer_to_national_id,
+)
+from finance.services.ledger import lock_ledger_accounts, post_journal_entries, post_journal_entry
+from finance.services.periods import close_period, verify_checkpoints
+from finance.services.recipient_cache import transfer_cache
+from finance.services.recurring import materialize_due, occurrence_hash
+from finance.services.reports import balance_sheet, income_statement, iter_trial_balance, trial_balance
+from finance.services.rollups import rebuild_rollups
+from finance.services.search import install_search_index, search
+from finance.services.transfer_queue import enqueue_transfer, process_pending_transfers
+from finance.signals import transactions_bulk_created
+from finance.testing import QueryBudgetMixin
+from finance.views import dashboard
+
+
+def make_customer(username, national_id):
+    """A customer whose "Main" account opens with 1000.00, plus an empty Expenses ledger."""
+    user = get_user_model().objects.create(username=username)
+    customer = Customer.objects.create(user=user, full_name=username, national_id=national_id)
+    account = Account.objects.create(customer=customer, name="Main")
+    ledger = LedgerAccount.objects.create(
+        customer=customer, name="Main", type=LedgerAccount.ASSET, bank_account=account
+    )
+    equity = LedgerAccount.objects.create(customer=customer, name="Opening Balance", type=LedgerAccount.EQUITY)
+    LedgerAccount.objects.create(customer=customer, name="Expenses", type=LedgerAccount.EXPENSE)
+    post_journal_entry(
+        customer=customer,
+        date="2025-01-01",
+        memo="Opening balance",
+        lines=[
+            {"account": ledger, "debit": Decimal("1000.00"), "credit": 0},
+            {"account": equity, "debit": 0, "credit": Decimal("1000.00")},
+        ],
+    )
+    return customer, account
+
+
+class LedgerBalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.account = make_customer("sender", "111")
+        cls.recipient, cls.recipient_account = make_customer("recipient", "222")
+        cls.cash = LedgerAccount.objects.get(bank_account=cls.account)
+        transfer_to_national_id(cls.sender, cls.account, "222", "100")
+
+    def test_stored_totals_match_the_lines(self):
+        for ledger in LedgerAccount.objects.filter(customer__in=[self.sender, self.recipient]):
+            with self.subTest(ledger=ledger.name):
+                self.assertEqual(ledger.aggregate_totals(), (ledger.debit_total, ledger.credit_total))
+        cash = LedgerAccount.objects.get(id=self.cash.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(cash.balance(), Decimal("900.00"))
+        self.assertEqual(LedgerAccount.objects.get(bank_account=self.recipient_account).balance(), Decimal("1100.00"))
+
+    def test_recompute_command_reports_and_fixes_mismatches(self):
+        call_command("recompute_ledger_balances", "--check", stdout=io.StringIO())
+        LedgerAccount.objects.filter(id=self.cash.id).update(debit_total=0)
+        with self.assertRaises(CommandError):
+            call_command("recompute_ledger_balances", "--check", stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command("recompute_ledger_balances", stdout=out)
+        self.assertIn(f"Fixed ledger account #{self.cash.id}", out.getvalue())
+        self.assertEqual(LedgerAccount.objects.get(id=self.cash.id).balance(), Decimal("900.00"))
+        out = io.StringIO()
+        call_command("recompute_ledger_balances", "--check", stdout=out)
+        self.assertIn("0 mismatched", out.getvalue())
+
+
+class JournalPostingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.cash = LedgerAccount.objects.get(bank_account=cls.account)
+        cls.expense = LedgerAccount.objects.get(customer=cls.customer, name="Expenses")
+
+    def entries(self, count, amount="1.00"):
+        return [
+            {"customer": self.customer, "date": "2025-02-01", "memo": f"entry {i}", "lines": [
+                {"account": self.expense, "debit": Decimal(amount), "credit": 0},
+                {"account": self.cash, "debit": 0, "credit": Decimal("1.00")},
+            ]}
+            for i in range(count)
+        ]
+
+    def test_entries_are_posted_in_bulk_and_in_order(self):
+        # Same accounts and date: the query count must not grow with the entries
+        post_journal_entries(self.entries(1))
+        with CaptureQueriesContext(connection) as one:
+            post_journal_entries(self.entries(1))
+        with CaptureQueriesContext(connection) as many:
+            posted = post_journal_entries(self.entries(40))
+        self.assertEqual(len(many), len(one))
+        self.assertEqual([je.memo for je in posted], [f"entry {i}" for i in range(40)])
+        self.assertTrue(all(je.pk for je in posted))
+        self.assertEqual(LedgerLine.objects.filter(entry__in=posted).count(), 80)
+        cash = LedgerAccount.objects.get(id=self.cash.id)
+        self.assertEqual(cash.balance(), Decimal("958.00"))
+        self.assertEqual(cash.aggregate_totals(), (cash.debit_total, cash.credit_total))
+
+    def test_unbalanced_entry_writes_nothing(self):
+        entries = self.entries(3)
+        entries[2]["lines"][0]["debit"] = Decimal("2.00")
+        before = JournalEntry.objects.count()
+        with self.assertRaisesMessage(ValueError, "Journal entry is not balanced"):
+            post_journal_entries(entries)
+        self.assertEqual(JournalEntry.objects.count(), before)
+        self.assertEqual(LedgerAccount.objects.get(id=self.cash.id).balance(), Decimal("1000.00"))
+
+    def test_bench_command_rolls_back(self):
+        before = JournalEntry.objects.count()
+        call_command("bench_journal_posting", "--entries", "50", "--repeat", "1", stdout=io.StringIO())
+        self.assertEqual(JournalEntry.objects.count(), before)
+
+
+class AccountListQueryCountTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create(username="owner")
+        self.customer = Customer.objects.create(user=user, full_name="Owner")
+        self.equity = LedgerAccount.objects.create(
+            customer=self.customer, name="Opening Balance", type=LedgerAccount.EQUITY
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def add_accounts(self, count):
+        start = Account.objects.filter(customer=self.customer).count()
+        for i in range(start, start + count):
+            account = Account.objects.create(customer=self.customer, name=f"Account {i}")
+            ledger = LedgerAccount.objects.create(
+                customer=self.customer, name=account.name, type=LedgerAccount.ASSET, bank_account=account
+            )
+            post_journal_entry(
+                customer=self.customer,
+                date="2025-01-01",
+                memo="Opening balance",
+                lines=[
+                    {"account": ledger, "debit": Decimal("10.00"), "credit": 0},
+                    {"account": self.equity, "debit": 0, "credit": Decimal("10.00")},
+                ],
+            )
+
+    def test_query_count_does_not_grow_with_accounts(self):
+        Account.objects.create(customer=self.customer, name="Unlinked")
+        self.add_accounts(2)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/accounts/")
+        self.assertEqual(len(response.data), 3)
+
+        self.add_accounts(10)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/accounts/")
+        self.assertEqual(len(response.data), 13)
+
+    def test_balance_comes_from_ledger(self):
+        Account.objects.create(customer=self.customer, name="Unlinked")
+        self.add_accounts(1)
+        response = self.client.get("/api/accounts/")
+        balances = {row["name"]: row["balance"] for row in response.data}
+        self.assertEqual(balances["Account 1"], Decimal("10.00"))
+        self.assertIsNone(balances["Unlinked"])
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.salary = Category.objects.create(name="Salary", type=Category.INCOME)
+        cls.food = Category.objects.create(name="Food", type=Category.EXPENSE)
+
+    def setUp(self):
+        cache.clear()
+        Transaction.objects.create(account=self.account, category=self.salary, amount="10.00", date="2025-01-01")
+        self.lunch = Transaction.objects.create(
+            account=self.account, category=self.food, amount="3.00", date="2025-01-01"
+        )
+
+    def test_summary_is_cached_until_a_write(self):
+        self.assertEqual(get_dashboard_summary(self.customer)["net_total"], Decimal("7.00"))
+        with self.assertNumQueries(0):
+            get_dashboard_summary(self.customer)
+
+        self.lunch.amount = Decimal("5.00")
+        self.lunch.save()
+        self.assertEqual(get_dashboard_summary(self.customer)["net_total"], Decimal("5.00"))
+        self.lunch.delete()
+        self.assertEqual(get_dashboard_summary(self.customer)["net_total"], Decimal("10.00"))
+
+    def test_category_change_invalidates_every_summary(self):
+        get_dashboard_summary(self.customer)
+        self.salary.name = "Pay"
+        self.salary.save()
+        summary = get_dashboard_summary(self.customer)
+        self.assertEqual(summary["income_by_category"][0]["category__name"], "Pay")
+
+    def test_local_cache_keeps_summaries_briefly(self):
+        self.assertEqual(summary_cache_timeout(), 5)
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(summary_cache_timeout(), 60 * 60)
+
+
+class BatchTransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.account = make_customer("sender", "111")
+        cls.recipient, cls.recipient_account = make_customer("recipient", "222")
+        cls.other, cls.other_account = make_customer("other", "333")
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.sender.user)
+
+    def balance(self, account):
+        return LedgerAccount.objects.get(bank_account=account).balance()
+
+    def test_bad_items_fail_only_themselves(self):
+        response = self.api.post("/api/transfers/batch/", {"from_account_id": self.account.id, "items": [
+            {"recipient_national_id": "222", "amount": "300.00"},
+            {"recipient_national_id": "999", "amount": "30.00"},
+            {"recipient_national_id": "333", "amount": "500.00"},
+            {"recipient_national_id": "333", "amount": "500.00"},
+            {"recipient_national_id": "111", "amount": "1.00"},
+            {"recipient_national_id": "333", "amount": "abc"},
+            {"recipient_national_id": 333, "amount": "1.00"},
+            {"amount": "1.00"},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["completed"], 2)
+        self.assertEqual([r.get("detail") for r in response.data["results"]], [
+            None,
+            "Recipient not found",
+            None,
+            "Insufficient funds",
+            "Cannot transfer to self",
+            "Invalid amount",
+            "Recipient national_id must be a string",
+            "Recipient national_id is required",
+        ])
+        self.assertEqual(self.balance(self.account), Decimal("200.00"))
+        self.assertEqual(self.balance(self.recipient_account), Decimal("1300.00"))
+        self.assertEqual(self.balance(self.other_account), Decimal("1500.00"))
+        call_command("recompute_ledger_balances", "--check", stdout=io.StringIO())
+
+    def test_bad_dates_and_amounts_fail_only_their_item(self):
+        response = self.api.post("/api/transfers/batch/", {"from_account_id": self.account.id, "items": [
+            {"recipient_national_id": "222", "amount": "10.00", "date": "2025-03-01"},
+            {"recipient_national_id": "222", "amount": "10.00", "date": "garbage"},
+            {"recipient_national_id": "222", "amount": "10.00", "date": "2025-02-30"},
+            {"recipient_national_id": "222", "amount": "10.00", "date": 20250301},
+            {"recipient_national_id": "222", "amount": "0.001"},
+            {"recipient_national_id": "222", "amount": "1.50"},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r.get("detail") for r in response.data["results"]], [
+            None,
+            "Invalid date",
+            "Invalid date",
+            "Invalid date",
+            "Amount must have at most 2 decimal places",
+            None,
+        ])
+        self.assertEqual(self.balance(self.recipient_account), Decimal("1011.50"))
+
+        response = self.api.post("/api/transfers/batch/", {
+            "from_account_id": self.account.id, "date": "garbage", "items": [
+                {"recipient_national_id": "222", "amount": "1.00"},
+                {"recipient_national_id": "222", "amount": "1.00", "date": "2025-03-01"},
+            ],
+        }, format="json")
+        self.assertEqual([r.get("detail") for r in response.data["results"]], ["Invalid date", None])
+
+    def test_items_in_a_closed_period_fail_only_themselves(self):
+        close_period(self.recipient, date(2025, 1, 31))
+        close_period(self.sender, date(2025, 2, 28))
+        response = self.api.post("/api/transfers/batch/", {"from_account_id": self.account.id, "items": [
+            {"recipient_national_id": "222", "amount": "10.00", "date": "2025-01-15"},
+            {"recipient_national_id": "333", "amount": "10.00", "date": "2025-02-15"},
+            {"recipient_national_id": "333", "amount": "10.00", "date": "2025-03-01"},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r.get("detail") for r in response.data["results"]], ["Period closed", "Period closed", None]
+        )
+        self.assertEqual(self.balance(self.account), Decimal("990.00"))
+
+    def test_single_transfer_rejects_a_numeric_national_id(self):
+        payload = {"from_account_id": self.account.id, "recipient_national_id": 222, "amount": "5.00"}
+        response = self.api.post("/api/transfers/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance(self.account), Decimal("1000.00"))
+
+    def test_malformed_batch_is_rejected(self):
+        response = self.api.post("/api/transfers/batch/", {"from_account_id": self.account.id, "items": "x"},
+                                 format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.api.post("/api/transfers/batch/", {"from_account_id": "x", "items": [{}]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class TransactionListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.savings = Account.objects.create(customer=cls.customer, name="Savings")
+        other, cls.other_account = make_customer("other", "222")
+        cls.salary = Category.objects.create(name="Salary", type=Category.INCOME)
+        Transaction.objects.bulk_create(
+            Transaction(
+                account=cls.account if i % 2 else cls.savings, category=cls.salary,
+                amount=Decimal(i + 1), date=f"2025-01-{i % 5 + 1:02d}",
+            )
+            for i in range(25)
+        )
+        Transaction.objects.create(account=cls.other_account, category=cls.salary, amount="1.00", date="2025-01-03")
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.customer.user)
+
+    def pages(self, url):
+        seen = []
+        while url:
+            response = self.api.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [(t["date"], t["id"]) for t in response.data["results"]]
+            url = response.data["next"]
+        return seen
+
+    def test_cursor_pages_cover_every_row_once_in_order(self):
+        seen = self.pages("/api/transactions/?page_size=7")
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(self.pages(f"/api/transactions/?page_size=4&account={self.account.id}")), 12)
+
+    def test_filters_and_bad_parameters(self):
+        response = self.api.get("/api/transactions/", {"date_from": "2025-01-02", "date_to": "2025-01-03"})
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(self.api.get("/api/transactions/", {"date_from": "xx"}).status_code, 400)
+        self.assertEqual(self.api.get("/api/transactions/", {"cursor": "zz"}).status_code, 404)
+
+    def test_customer_is_denormalised_on_every_write_path(self):
+        self.assertFalse(Transaction.objects.exclude(customer=F("account__customer")).exists())
+        moved = Transaction.objects.filter(account=self.savings).first()
+        moved.account = self.account
+        moved.save(update_fields=["account"])
+        moved.refresh_from_db()
+        self.assertEqual(moved.customer_id, self.customer.id)
+
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return " ".join(row[-1] for row in cursor.fetchall())
+
+    def test_default_listing_reads_the_customer_index_in_order(self):
+        qs = Transaction.objects.filter(customer=self.customer).order_by("-date", "-created_at", "-id")[:20]
+        plan = self.query_plan(*qs.query.sql_with_params())
+        self.assertIn("txn_customer_date_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_dashboard_queries_seek_by_customer(self):
+        request = RequestFactory().get("/dashboard/")
+        request.user = self.customer.user
+        with CaptureQueriesContext(connection) as ctx, \
+                mock.patch("finance.views.render", side_effect=lambda request, template, context: context):
+            list(dashboard(request)["transactions"])
+        queries = [q["sql"] for q in ctx.captured_queries if '"finance_transaction"' in q["sql"]]
+        self.assertEqual(len(queries), 2)
+        for sql in queries:
+            self.assertRegex(
+                self.query_plan(sql), r"SEARCH finance_transaction USING (COVERING )?INDEX \w+ \(customer_id=\?"
+            )
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.other_account = Account.objects.create(customer=cls.customer, name="Savings")
+        other, other_account = make_customer("other", "222")
+        salary = Category.objects.create(name="Salary", type=Category.INCOME)
+        for day in range(1, 6):
+            Transaction.objects.create(
+                account=cls.account, category=salary, amount=Decimal(day), date=date(2025, 1, day), description='a,"b'
+            )
+        Transaction.objects.create(account=cls.other_account, category=salary, amount=1, date=date(2025, 1, 3))
+        Transaction.objects.create(account=other_account, category=salary, amount=1, date=date(2025, 1, 3))
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.customer.user)
+
+    def export(self, url, **params):
+        response = self.api.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_transactions_csv(self):
+        body = self.export("/api/exports/transactions/", fmt="csv", date_from="2025-01-02")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row["description"] for row in rows if row["account_id"] == str(self.account.id)}, {'a,"b'})
+
+        body = self.export("/api/exports/transactions/", fmt="csv", account=self.other_account.id)
+        self.assertEqual([row["account__name"] for row in csv.DictReader(io.StringIO(body))], ["Savings"])
+
+    def test_ledger_lines_ndjson(self):
+        body = self.export("/api/exports/ledger-lines/", fmt="ndjson")
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            sorted((line["account__name"], line["debit"], line["credit"]) for line in lines),
+            [("Main", "1000.00", "0.00"), ("Opening Balance", "0.00", "1000.00")],
+        )
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.api.get("/api/exports/ledger-lines/", {"fmt": "xml"}).status_code, 400)
+
+    def test_export_command_writes_a_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "transactions.ndjson")
+            call_command(
+                "export_ledger", "transactions", "--customer", self.customer.id, "--format", "ndjson",
+                "--output", path, "--chunk-size", "2",
+            )
+            with open(path, encoding="utf-8") as fh:
+                lines = [json.loads(line) for line in fh]
+        ids = Transaction.objects.filter(account__customer=self.customer).values_list("id", flat=True)
+        self.assertEqual(sorted(line["id"] for line in lines), sorted(ids))
+        self.assertEqual(lines, sorted(lines, key=lambda line: (line["date"], line["id"])))
+
+
+class StatementImportTests(TestCase):
+    CSV = (
+        "date,amount,description,category,account\n"
+        "2025-01-01,-5,coffee,,\n"
+        "2025-01-01,-5,coffee,,\n"
+        "2025-01-02,100,pay,Salary,main\n"
+        "bad,-1,x,,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        Category.objects.create(name="Salary", type=Category.INCOME)
+        cls.food = Category.objects.create(name="Food", type=Category.EXPENSE)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.customer.user)
+
+    def upload(self, content):
+        return self.api.post("/api/transactions/import/", {
+            "file": SimpleUploadedFile("statement.csv", content),
+            "account": self.account.id,
+            "expense_category": self.food.id,
+        }, format="multipart")
+
+    def rollups(self):
+        return sorted(
+            TransactionDailyRollup.objects.filter(count__gt=0)
+            .values_list("account_id", "category_id", "date", "total", "count")
+        )
+
+    def test_reimport_skips_duplicates(self):
+        response = self.upload(self.CSV.encode())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["created"], response.data["errors"]), (3, 1))
+        self.assertEqual(response.data["error_details"], [{"row": 4, "detail": "Invalid date: 'bad'"}])
+        response = self.upload(self.CSV.encode())
+        self.assertEqual((response.data["created"], response.data["duplicates"]), (0, 3))
+
+    def test_id_column_deduplicates_on_the_bank_id(self):
+        self.upload(b"date,amount,description,id\n2025-01-01,-5,coffee,T1\n")
+        response = self.upload(b"date,amount,description,id\n2025-01-01,-5,coffee at work,T1\n")
+        self.assertEqual((response.data["created"], response.data["duplicates"]), (0, 1))
+        self.assertEqual(Transaction.objects.get().description, "coffee")
+
+    def test_non_utf8_file_is_rejected(self):
+        response = self.upload("date,amount,description\n2025-01-01,-5,café\n".encode("latin-1"))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_rows_inserted_concurrently_are_skipped(self):
+        importer = StatementImporter(self.customer, default_account=self.account, expense_category=self.food)
+        rows = list(parse_csv(io.StringIO(self.CSV)))
+        # Another import posts the first row between the duplicate check and the insert
+        other = importer.resolve(rows[0])
+        other.import_hash = StatementImporter(self.customer).import_hash(other, rows[0])
+        real_filter = Transaction.objects.filter
+        checks = [Transaction.objects.none()]
+
+        def filter_after_check(*args, **kwargs):
+            if checks:
+                Transaction.objects.bulk_create([other])
+                transactions_bulk_created.send(sender=Transaction, transactions=[other])
+                return checks.pop()
+            return real_filter(*args, **kwargs)
+
+        # Both imports write in the same clock tick
+        with mock.patch.object(Transaction.objects, "filter", side_effect=filter_after_check), \
+                mock.patch("django.utils.timezone.now", return_value=timezone.now()):
+            report = importer.run(rows)
+        self.assertEqual((report["created"], report["duplicates"], report["errors"]), (2, 1, 1))
+        self.assertEqual(Transaction.objects.count(), 3)
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_ofx_command_imports_in_chunks(self):
+        ofx = "OFXHEADER:100\n<OFX><BANKTRANLIST>" + "".join(
+            f"<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250103120000<TRNAMT>-{i}.50<FITID>F{i}<NAME>Shop {i}</STMTTRN>"
+            for i in range(1, 1201)
+        ) + "</BANKTRANLIST></OFX>"
+        with tempfile.NamedTemporaryFile("w", suffix=".ofx", delete=False) as fh:
+            fh.write(ofx)
+        self.addCleanup(os.remove, fh.name)
+        args = [fh.name, "--customer", self.customer.id, "--format", "ofx", "--account", self.account.id,
+                "--expense-category", self.food.id, "--chunk-size", "500"]
+        out = io.StringIO()
+        call_command("import_statement", *args, stdout=out)
+        self.assertIn("1200 created", out.getvalue())
+        call_command("import_statement", *args, stdout=out)
+        self.assertIn("0 created, 1200 duplicates skipped", out.getvalue())
+        self.assertEqual(Transaction.objects.count(), 1200)
+
+
+class PeriodCloseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.cash = LedgerAccount.objects.get(bank_account=cls.account)
+        cls.expense = LedgerAccount.objects.get(customer=cls.customer, name="Expenses")
+        for day in ["2025-01-10", "2025-02-10", "2025-03-10"]:
+            cls.spend(day, "100.00")
+        close_period(cls.customer, date(2025, 1, 31))
+        cls.customer = close_period(cls.customer, date(2025, 2, 28))
+
+    @classmethod
+    def spend(cls, day, amount):
+        post_journal_entry(cls.customer, day, "", [
+            {"account": cls.expense, "debit": Decimal(amount), "credit": 0},
+            {"account": cls.cash, "debit": 0, "credit": Decimal(amount)},
+        ])
+
+    def balances(self, report):
+        return {r["account_name"]: r["balance"] for r in report["accounts"]}
+
+    def test_posting_into_a_closed_period_is_refused(self):
+        with self.assertRaisesMessage(ValueError, "closed"):
+            self.spend("2025-02-15", "1.00")
+        with self.assertRaisesMessage(ValueError, "already closed"):
+            close_period(self.customer, date(2025, 2, 1))
+        self.spend("2025-03-01", "1.00")
+        cash = LedgerAccount.objects.get(id=self.cash.id)
+        self.assertEqual(cash.balance(), Decimal("699.00"))
+        self.assertEqual(cash.balance_as_of(date(2025, 2, 15)), Decimal("800.00"))
+
+    def test_reports_start_from_the_latest_checkpoint(self):
+        # Visible only if the report reads the checkpoint instead of the lines before it
+        LedgerCheckpoint.objects.filter(account=self.cash, date=date(2025, 2, 28)).update(debit_total=F("debit_total") + 1)
+        self.assertEqual(self.balances(trial_balance(self.customer))["Main"], Decimal("701.00"))
+        report = trial_balance(self.customer, date_from=date(2025, 3, 1))
+        main = next(r for r in report["accounts"] if r["account_name"] == "Main")
+        self.assertEqual((main["opening_debit"], main["credit"]), (Decimal("1001.00"), Decimal("100.00")))
+        sheet = balance_sheet(self.customer, as_of=date(2025, 3, 31))
+        self.assertEqual(sheet["total_assets"], Decimal("701.00"))
+
+        # Earlier bounds fall back to an earlier checkpoint, then to the lines
+        self.assertEqual(balance_sheet(self.customer, as_of=date(2025, 2, 27))["total_assets"], Decimal("800.00"))
+        self.assertEqual(balance_sheet(self.customer, as_of=date(2025, 1, 15))["total_assets"], Decimal("900.00"))
+
+    def test_reports_agree_with_the_lines(self):
+        for date_from, date_to in [(None, None), (date(2025, 2, 1), None), (date(2025, 3, 1), date(2025, 3, 31)),
+                                   (date(2025, 2, 15), date(2025, 3, 15)), (None, date(2025, 2, 28))]:
+            with self.subTest(date_from=date_from, date_to=date_to):
+                report = trial_balance(self.customer, date_from, date_to)
+                self.assertTrue(report["balanced"])
+                expected = {
+                    r["account_name"]: r["balance"]
+                    for r in iter_trial_balance(self.customer.id, date_from, date_to)
+                }
+                self.assertEqual(self.balances(report), expected)
+
+    def test_verify_checkpoints_command(self):
+        call_command("verify_checkpoints", stdout=io.StringIO())
+        LedgerCheckpoint.objects.filter(account=self.cash, date=date(2025, 1, 31)).update(debit_total=5)
+        self.assertEqual(len(verify_checkpoints(self.customer.id)), 1)
+        with self.assertRaises(CommandError):
+            call_command("verify_checkpoints", stdout=io.StringIO())
+
+
+class DailyBalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.cash = LedgerAccount.objects.get(bank_account=cls.account)
+        cls.expense = LedgerAccount.objects.get(customer=cls.customer, name="Expenses")
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.customer.user)
+
+    def spend(self, *dates):
+        post_journal_entries([
+            {"customer": self.customer, "date": day, "memo": "", "lines": [
+                {"account": self.expense, "debit": Decimal("10.00"), "credit": 0},
+                {"account": self.cash, "debit": 0, "credit": Decimal("10.00")},
+            ]}
+            for day in dates
+        ])
+
+    def snapshots(self):
+        return list(
+            LedgerDailyBalance.objects.order_by("account_id", "date")
+            .values_list("account_id", "date", "debit_total", "credit_total")
+        )
+
+    def test_several_new_dates_of_one_account_in_one_batch(self):
+        self.spend("2025-02-03", "2025-02-01", "2025-02-01", "2025-02-05", "2025-01-20")
+        expense = LedgerAccount.objects.get(id=self.expense.id)
+        self.assertEqual(
+            list(self.expense.daily_balances.order_by("date").values_list("date", "debit_total")),
+            [(date(2025, 1, 20), 10), (date(2025, 2, 1), 30), (date(2025, 2, 3), 40), (date(2025, 2, 5), 50)],
+        )
+        self.assertEqual(expense.balance_as_of(date(2025, 2, 4)), Decimal("40.00"))
+        self.assertEqual(expense.balance_as_of(date(2025, 2, 5)), expense.balance())
+        before = self.snapshots()
+        call_command("rebuild_daily_balances", stdout=io.StringIO())
+        self.assertEqual(self.snapshots(), before)
+
+    def test_batch_between_existing_snapshots(self):
+        self.spend("2025-03-01")
+        self.spend("2025-02-01", "2025-02-15", "2025-03-01", "2025-04-01")
+        before = self.snapshots()
+        call_command("rebuild_daily_balances", stdout=io.StringIO())
+        self.assertEqual(self.snapshots(), before)
+        cash = LedgerAccount.objects.get(id=self.cash.id)
+        self.assertEqual(cash.balance_as_of(date(2025, 2, 20)), Decimal("980.00"))
+        self.assertEqual(cash.balance_as_of(date(2025, 4, 1)), cash.balance())
+
+    def test_as_of_balance_and_statement_running_balance(self):
+        self.spend("2025-02-03", "2025-02-01", "2025-02-01", "2025-02-05", "2025-01-20")
+        url = f"/api/accounts/{self.account.id}/balance/"
+        self.assertEqual(self.api.get(url, {"as_of": "2025-02-01"}).data["balance"], Decimal("970.00"))
+        self.assertEqual(self.api.get(url, {"as_of": "2025-01-31"}).data["balance"], Decimal("990.00"))
+        self.assertEqual(self.api.get(url).data["balance"], Decimal("950.00"))
+
+        url = f"/api/accounts/{self.account.id}/statement/?page_size=2"
+        balances = []
+        while url:
+            response = self.api.get(url)
+            balances += [Decimal(line["balance"]) for line in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(balances, [1000, 990, 980, 970, 960, 950])
+        response = self.api.get(f"/api/accounts/{self.account.id}/statement/", {"date_from": "2025-02-02"})
+        self.assertEqual(response.data["opening_balance"], Decimal("970.00"))
+
+
+class LockOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+
+    def test_ledger_accounts_are_locked_in_id_order(self):
+        ids = list(LedgerAccount.objects.filter(customer=self.customer).values_list("id", flat=True))
+        with CaptureQueriesContext(connection) as ctx:
+            locked = lock_ledger_accounts(reversed(ids + ids))
+        self.assertEqual(list(locked), sorted(ids))
+        self.assertEqual(len(ctx), 1)
+        self.assertIn("ORDER BY", ctx.captured_queries[0]["sql"])
+
+    def test_conflicts_inside_a_transaction_are_not_retried(self):
+        # TestCase wraps each test in a transaction: the outer caller must retry
+        calls = []
+
+        @retry_on_conflict()
+        def locked():
+            calls.append(1)
+            raise OperationalError("database is locked")
+
+        with self.assertRaises(OperationalError):
+            locked()
+        self.assertEqual(len(calls), 1)
+
+
+@mock.patch("finance.services.concurrency.time.sleep")
+class RetryOnConflictTests(SimpleTestCase):
+    def setUp(self):
+        retries, gave_up = conflict_stats["retries"], conflict_stats["gave_up"]
+        self.addCleanup(conflict_stats.update, retries=retries, gave_up=gave_up)
+
+    def failing(self, errors, **options):
+        errors = list(errors)
+
+        @retry_on_conflict(**options)
+        def func():
+            if errors:
+                raise errors.pop(0)
+            return "done"
+        return func
+
+    def test_retryable_errors_are_retried(self, sleep):
+        retries = conflict_stats["retries"]
+        func = self.failing([OperationalError("database is locked"), OperationalError("deadlock detected")])
+        self.assertEqual(func(), "done")
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(conflict_stats["retries"], retries + 2)
+
+    def test_gives_up_after_max_attempts(self, sleep):
+        gave_up = conflict_stats["gave_up"]
+        func = self.failing([OperationalError("database is locked")] * 3, max_attempts=3)
+        with self.assertRaises(OperationalError):
+            func()
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(conflict_stats["gave_up"], gave_up + 1)
+
+    def test_other_errors_are_not_retried(self, sleep):
+        func = self.failing([OperationalError("no such table: finance_account")])
+        with self.assertRaises(OperationalError):
+            func()
+        sleep.assert_not_called()
+
+    def test_is_retryable_db_error(self, sleep):
+        serialization = OperationalError("could not serialize access")
+        self.assertTrue(is_retryable_db_error(serialization))
+        cause = Exception(1213, "Deadlock found when trying to get lock")
+        mysql = OperationalError("lock")
+        mysql.__cause__ = cause
+        self.assertTrue(is_retryable_db_error(mysql))
+        self.assertFalse(is_retryable_db_error(ValueError("deadlock")))
+
+
+class RecipientCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.account = make_customer("sender", "111")
+        cls.recipient, cls.recipient_account = make_customer("recipient", "222")
+        cls.account = Account.objects.select_related("ledger_account").get(id=cls.account.id)
+
+    def setUp(self):
+        transfer_cache.clear()
+
+    def recipient_balance(self):
+        return LedgerAccount.objects.get(bank_account=self.recipient_account).balance()
+
+    def test_system_accounts_are_provisioned_on_signup(self):
+        names = set(LedgerAccount.objects.filter(customer=self.recipient).values_list("name", flat=True))
+        self.assertLessEqual({TRANSFERS_IN_NAME, TRANSFERS_OUT_NAME}, names)
+
+    def test_resolution_is_cached(self):
+        with self.assertNumQueries(1):
+            info = resolve_recipient("222")
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_recipient("222"), info)
+        self.assertEqual(info.account_id, self.recipient_account.id)
+
+        transfer_to_national_id(self.sender, self.account, "222", "10")
+        transfer_to_national_id(self.sender, self.account, "222", "10")
+        self.assertEqual(self.recipient_balance(), Decimal("1020.00"))
+        transfers_in = LedgerAccount.objects.get(customer=self.recipient, name=TRANSFERS_IN_NAME)
+        self.assertEqual(transfers_in.balance(), Decimal("20.00"))
+
+    def test_saving_the_account_invalidates(self):
+        resolve_recipient("222")
+        self.recipient_account.is_active = False
+        self.recipient_account.save()
+        with self.assertRaisesMessage(ValueError, "Recipient has no active account"):
+            transfer_to_national_id(self.sender, self.account, "222", "10")
+
+    def test_stale_entry_is_rechecked_under_the_lock(self):
+        # Changes made by another process: no signal reaches this cache
+        resolve_recipient("222")
+        Account.objects.filter(id=self.recipient_account.id).update(is_active=False)
+        with self.assertRaisesMessage(ValueError, "Recipient account changed"):
+            transfer_to_national_id(self.sender, self.account, "222", "10")
+        self.assertIsNone(transfer_cache.get(("recipient", "222")))
+        self.assertEqual(self.recipient_balance(), Decimal("1000.00"))
+
+        Account.objects.filter(id=self.recipient_account.id).update(is_active=True)
+        resolve_recipient("222")
+        Customer.objects.filter(id=self.recipient.id).update(national_id="333")
+        with self.assertRaisesMessage(ValueError, "Recipient account changed"):
+            transfer_to_national_id(self.sender, self.account, "222", "10")
+        with self.assertRaisesMessage(ValueError, "Recipient not found"):
+            transfer_to_national_id(self.sender, self.account, "222", "10")
+        self.assertEqual(self.recipient_balance(), Decimal("1000.00"))
+
+
+class BenchmarkQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "generate_synthetic_data",
+            "--customers", "2",
+            "--transactions-per-account", "30",
+            "--entries-per-account", "30",
+            stdout=io.StringIO(),
+        )
+
+    def test_synthetic_ledger_is_consistent(self):
+        call_command("recompute_ledger_balances", "--check", stdout=io.StringIO())
+
+    def test_hot_paths_stay_within_query_baselines(self):
+        baselines = load_baselines()
+        ctx = RunBenchmarksCommand().get_context(None)
+        for name, case in CASES.items():
+            with self.subTest(case=name):
+                queries, _, _ = measure(case, ctx, repeat=1)
+                self.assertLessEqual(queries, baselines[name]["queries"])
+
+
+class ViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # Budgets must not depend on how much data the customer has
+    query_budgets = {
+        "dashboard": 5,
+        "AccountViewSet.list": 1,
+        "AccountViewSet.balance": 2,
+        "AccountViewSet.statement": 4,
+        # Cold recipient cache; includes the BEGIN/SAVEPOINT round trips and
+        # the recheck of the recipient under the lock
+        "transfer_api": 25,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.account = make_customer("sender", "111")
+        cls.recipient, _ = make_customer("recipient", "222")
+        cls.expense = LedgerAccount.objects.get(customer=cls.sender, name="Expenses")
+        food = Category.objects.create(name="Food", type=Category.EXPENSE)
+        salary = Category.objects.create(name="Salary", type=Category.INCOME)
+        Transaction.objects.bulk_create(
+            Transaction(account=cls.account, category=food if i % 3 else salary, amount=Decimal(i + 1), date="2025-01-02")
+            for i in range(30)
+        )
+        for i in range(10):
+            post_journal_entry(
+                customer=cls.sender,
+                date=f"2025-01-{i + 2:02d}",
+                memo="Groceries",
+                lines=[
+                    {"account": cls.expense, "debit": Decimal("1.00"), "credit": 0},
+                    {"account": cls.account.ledger_account, "debit": 0, "credit": Decimal("1.00")},
+                ],
+            )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.sender.user)
+
+    def test_dashboard(self):
+        self.client.force_login(self.sender.user)
+        response = self.client.get("/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Server-Timing", response)
+        self.assertWithinQueryBudget(response)
+        # Second request reads the summary from the cache
+        self.assertWithinQueryBudget(self.client.get("/dashboard/"))
+
+    @override_settings(FINANCE_QUERY_INSTRUMENTATION=False)
+    def test_instrumentation_can_be_switched_off(self):
+        self.client.force_login(self.sender.user)
+        response = self.client.get("/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+        self.assertFalse(hasattr(response.wsgi_request, "query_profile"))
+
+    def test_account_list(self):
+        self.assertWithinQueryBudget(self.api.get("/api/accounts/"))
+
+    def test_account_balance(self):
+        response = self.api.get(f"/api/accounts/{self.account.id}/balance/", {"as_of": "2025-01-05"})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_account_statement(self):
+        response = self.api.get(f"/api/accounts/{self.account.id}/statement/", {"page_size": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        response = self.api.get(response.data["next"])
+        self.assertWithinQueryBudget(response)
+
+    def test_transfer(self):
+        payload = {"from_account_id": self.account.id, "recipient_national_id": "222", "amount": "5.00"}
+        response = self.api.post("/api/transfers/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+
+
+class LedgerReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create(username="reports")
+        cls.customer = Customer.objects.create(user=user, full_name="Reports")
+        account = Account.objects.create(customer=cls.customer, name="Main")
+        cls.cash = LedgerAccount.objects.create(
+            customer=cls.customer, name="Main", type=LedgerAccount.ASSET, bank_account=account
+        )
+        equity = LedgerAccount.objects.create(customer=cls.customer, name="Opening Balance", type=LedgerAccount.EQUITY)
+        income = LedgerAccount.objects.create(customer=cls.customer, name="Income", type=LedgerAccount.INCOME)
+        expense = LedgerAccount.objects.create(customer=cls.customer, name="Expenses", type=LedgerAccount.EXPENSE)
+        for date, debit_account, credit_account, amount in [
+            ("2025-01-01", cls.cash, equity, "100.00"),
+            ("2025-01-15", cls.cash, income, "50.00"),
+            ("2025-02-10", expense, cls.cash, "30.00"),
+            ("2025-03-05", cls.cash, income, "20.00"),
+        ]:
+            post_journal_entry(
+                customer=cls.customer,
+                date=date,
+                memo="",
+                lines=[
+                    {"account": debit_account, "debit": Decimal(amount), "credit": 0},
+                    {"account": credit_account, "debit": 0, "credit": Decimal(amount)},
+                ],
+            )
+        cls.user = user
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_trial_balance_balances(self):
+        response = self.api.get("/api/reports/trial-balance/", {"date_from": "2025-02-01", "date_to": "2025-02-28"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["balanced"])
+        rows = {r["account_name"]: r for r in response.data["accounts"]}
+        self.assertEqual(rows["Main"]["opening_debit"], Decimal("150.00"))
+        self.assertEqual(rows["Main"]["credit"], Decimal("30.00"))
+        self.assertEqual(rows["Main"]["balance"], Decimal("120.00"))
+
+    def test_balance_sheet_includes_current_earnings(self):
+        response = self.api.get("/api/reports/balance-sheet/", {"as_of": "2025-02-28"})
+        self.assertTrue(response.data["balanced"])
+        self.assertEqual(response.data["total_assets"], Decimal("120.00"))
+        self.assertEqual(response.data["current_earnings"], Decimal("20.00"))
+
+    def test_income_statement_covers_only_the_range(self):
+        response = self.api.get("/api/reports/income-statement/", {"date_from": "2025-02-01"})
+        self.assertEqual(response.data["total_income"], Decimal("20.00"))
+        self.assertEqual(response.data["total_expenses"], Decimal("30.00"))
+        self.assertEqual(response.data["net_income"], Decimal("-10.00"))
+
+    def test_reports_are_one_query(self):
+        with self.assertNumQueries(1):
+            self.api.get("/api/reports/trial-balance/")
+
+    def test_all_customers_is_staff_only(self):
+        response = self.api.get("/api/reports/trial-balance/", {"all": "1"})
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.api.get("/api/reports/trial-balance/", {"all": "1", "fmt": "csv"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["customer_id", "account_id"])
+        self.assertEqual(len(lines), 5)
+
+
+class TransactionRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="rollups")
+        cls.customer = Customer.objects.create(user=cls.user, full_name="Rollups")
+        cls.account = Account.objects.create(customer=cls.customer, name="Main")
+        cls.food = Category.objects.create(name="Food", type=Category.EXPENSE)
+        cls.rent = Category.objects.create(name="Rent", type=Category.EXPENSE)
+        cls.salary = Category.objects.create(name="Salary", type=Category.INCOME)
+
+    def rollups(self):
+        return sorted(
+            TransactionDailyRollup.objects.values_list("account_id", "category_id", "date", "total", "count")
+        )
+
+    def test_incremental_rollups_match_rebuild(self):
+        t1 = Transaction.objects.create(account=self.account, category=self.food, amount="12.50", date="2025-01-03")
+        t2 = Transaction.objects.create(account=self.account, category=self.food, amount="7.50", date="2025-01-03")
+        Transaction.objects.create(account=self.account, category=self.salary, amount="1000", date="2025-01-31")
+        batch = [
+            Transaction(account=self.account, category=self.rent, amount=Decimal("400"), date="2025-02-01"),
+            Transaction(account=self.account, category=self.food, amount=Decimal("5"), date="2025-01-03"),
+        ]
+        Transaction.objects.bulk_create(batch)
+        transactions_bulk_created.send(sender=Transaction, transactions=batch)
+
+        t1.category = self.rent
+        t1.date = "2025-01-04"
+        t1.save()
+        t2.delete()
+
+        incremental = [r for r in self.rollups() if r[4]]
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_failed_rollup_update_rolls_back_the_save(self):
+        with mock.patch("finance.signals.apply_transaction_deltas", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Transaction.objects.create(account=self.account, category=self.food, amount="5.00", date="2025-01-03")
+        self.assertFalse(Transaction.objects.exists())
+
+        txn = Transaction.objects.create(account=self.account, category=self.food, amount="5.00", date="2025-01-03")
+        with mock.patch("finance.signals.apply_transaction_deltas", side_effect=RuntimeError):
+            txn.amount = Decimal("9.00")
+            with self.assertRaises(RuntimeError):
+                txn.save()
+        self.assertEqual(Transaction.objects.get().amount, Decimal("5.00"))
+        self.assertEqual(self.rollups(), [(self.account.id, self.food.id, date(2025, 1, 3), Decimal("5.00"), 1)])
+
+    def test_cash_flow_series(self):
+        for date, category, amount in [
+            ("2025-01-03", self.food, "20.00"),
+            ("2025-01-20", self.salary, "1000.00"),
+            ("2025-02-02", self.rent, "400.00"),
+            ("2025-02-15", self.food, "30.00"),
+        ]:
+            Transaction.objects.create(account=self.account, category=category, amount=amount, date=date)
+        api = APIClient()
+        api.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = api.get("/api/reports/cash-flow/", {"bucket": "month"})
+        series = response.data["series"]
+        self.assertEqual([str(s["period"]) for s in series], ["2025-01-01", "2025-02-01"])
+        self.assertEqual(series[0]["income"], Decimal("1000.00"))
+        self.assertEqual(series[1]["expense"], Decimal("430.00"))
+        self.assertEqual(series[1]["expense_count"], 2)
+        self.assertEqual(series[1]["net"], Decimal("-430.00"))
+
+        response = api.get("/api/reports/cash-flow/", {"bucket": "year", "by_category": "1"})
+        by_name = {s["category_name"]: s for s in response.data["series"]}
+        self.assertEqual(by_name["Food"]["expense"], Decimal("50.00"))
+
+        response = api.get("/api/reports/cash-flow/", {"bucket": "fortnight"})
+        self.assertEqual(response.status_code, 400)
+
+
+class MultiCurrencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="fx")
+        cls.customer = Customer.objects.create(user=cls.user, full_name="FX", base_currency="EUR")
+        cls.eur = Account.objects.create(customer=cls.customer, name="Euro", currency="EUR")
+        cls.usd = Account.objects.create(customer=cls.customer, name="Dollar", currency="USD")
+        cls.food = Category.objects.create(name="Food", type=Category.EXPENSE)
+        cls.salary = Category.objects.create(name="Salary", type=Category.INCOME)
+        # Rates are USD per unit; USD is the reference currency
+        FxRate.objects.create(currency="EUR", date="2025-01-01", rate=Decimal("1.25"))
+        FxRate.objects.create(currency="EUR", date="2025-02-01", rate=Decimal("1.00"))
+
+    def setUp(self):
+        fx_cache.clear()
+
+    def test_dashboard_converts_to_base_currency(self):
+        Transaction.objects.create(account=self.eur, category=self.food, amount="10.00", date="2025-01-05")
+        # 50 USD at the Jan 1 rate of 1.25 USD/EUR = 40 EUR
+        Transaction.objects.create(account=self.usd, category=self.food, amount="50.00", date="2025-01-06")
+        # 30 USD at 1.00 = 30 EUR
+        Transaction.objects.create(account=self.usd, category=self.salary, amount="30.00", date="2025-02-03")
+
+        summary = compute_dashboard_summary(self.customer)
+        self.assertEqual(summary["currency"], "EUR")
+        self.assertEqual(summary["expense_total"], Decimal("50.00"))
+        self.assertEqual(summary["income_total"], Decimal("30.00"))
+        self.assertEqual(summary["missing_rates"], [])
+
+    def test_missing_rate_is_reported_not_guessed(self):
+        Transaction.objects.create(account=self.eur, category=self.food, amount="10.00", date="2025-03-01")
+        Transaction.objects.create(account=self.usd, category=self.food, amount="50.00", date="2025-03-01")
+        summary = compute_dashboard_summary(self.customer)
+        self.assertEqual(summary["expense_total"], Decimal("10.00"))
+        self.assertEqual(
+            [(r["currency"], str(r["date"])) for r in summary["missing_rates"]],
+            [("EUR", "2025-03-01")],
+        )
+
+    def test_rates_are_fetched_in_one_query_and_cached(self):
+        pairs = {("EUR", date(2025, 1, day)) for day in range(1, 29)}
+        with self.assertNumQueries(1):
+            rates = get_rates(pairs)
+        self.assertEqual(rates[("EUR", date(2025, 1, 5))], Decimal("1.25"))
+        # Too old to reuse
+        self.assertIsNone(rates[("EUR", date(2025, 1, 10))])
+        with self.assertNumQueries(0):
+            get_rates(pairs)
+
+    def test_cash_flow_is_converted(self):
+        Transaction.objects.create(account=self.usd, category=self.food, amount="50.00", date="2025-01-06")
+        Transaction.objects.create(account=self.eur, category=self.food, amount="5.00", date="2025-01-11")
+        api = APIClient()
+        api.force_authenticate(self.user)
+        response = api.get("/api/reports/cash-flow/", {"bucket": "month"})
+        self.assertEqual(response.data["currency"], "EUR")
+        self.assertEqual(response.data["series"][0]["expense"], Decimal("45.00"))
+        self.assertEqual(response.data["series"][0]["expense_count"], 2)
+
+    def test_load_fx_rates(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as fh:
+            fh.write("date,currency,rate\n2025-01-01,eur,1.10\n2025-01-02,EUR,1.12\n")
+        call_command("load_fx_rates", fh.name, stdout=io.StringIO())
+        os.unlink(fh.name)
+        self.assertEqual(FxRate.objects.get(currency="EUR", date="2025-01-01").rate, Decimal("1.10"))
+        self.assertEqual(FxRate.objects.filter(currency="EUR").count(), 3)
+
+
+class TransferQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.account = make_customer("sender", "111")
+        cls.recipient, cls.recipient_account = make_customer("recipient", "222")
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.sender.user)
+
+    def balance(self, account, as_of=None):
+        ledger = LedgerAccount.objects.get(bank_account=account)
+        return ledger.balance_as_of(as_of) if as_of else ledger.balance()
+
+    def test_async_transfer_is_queued_then_posted_by_worker(self):
+        payload = {
+            "from_account_id": self.account.id,
+            "recipient_national_id": "222",
+            "amount": "5.00",
+            "async": True,
+        }
+        response = self.api.post("/api/transfers/", payload, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "pending")
+        # Nothing is posted until the worker runs
+        self.assertEqual(self.balance(self.account), Decimal("1000.00"))
+
+        call_command("process_transfers", "--once", stdout=io.StringIO())
+        status = self.api.get(response.data["status_url"])
+        self.assertEqual(status.data["status"], TransferRequest.COMPLETED)
+        self.assertEqual(status.data["recipient"], "***")
+        self.assertEqual(self.balance(self.account), Decimal("995.00"))
+
+    def test_worker_posts_a_group_and_fails_only_bad_requests(self):
+        for amount in ["600.00", "300.00", "200.00"]:
+            enqueue_transfer(self.sender, self.account, "222", amount)
+        enqueue_transfer(self.sender, self.account, "999", "1.00")
+        enqueue_transfer(self.sender, self.account, "222", "50.00", date="2025-02-01")
+
+        stats = process_pending_transfers(batch_size=2)
+        self.assertEqual(stats, {"completed": 3, "failed": 2})
+        self.assertEqual(
+            list(TransferRequest.objects.order_by("id").values_list("status", "detail")),
+            [
+                ("completed", ""),
+                ("completed", ""),
+                ("failed", "Insufficient funds"),
+                ("failed", "Recipient not found"),
+                ("completed", ""),
+            ],
+        )
+        self.assertEqual(self.balance(self.recipient_account), Decimal("1950.00"))
+        self.assertEqual(self.balance(self.recipient_account, date(2025, 1, 31)), Decimal("1000.00"))
+
+    def test_closed_period_fails_only_its_request(self):
+        close_period(self.sender, date(2025, 1, 31))
+        enqueue_transfer(self.sender, self.account, "222", "5.00", date="2025-01-15")
+        enqueue_transfer(self.sender, self.account, "222", "7.00", date="2025-02-15")
+        stats = process_pending_transfers()
+        self.assertEqual(stats, {"completed": 1, "failed": 1})
+        failed = TransferRequest.objects.get(status=TransferRequest.FAILED)
+        self.assertIn("closed", failed.detail)
+
+    def test_status_is_private_to_the_sender(self):
+        queued = enqueue_transfer(self.sender, self.account, "222", "5.00")
+        other = APIClient()
+        other.force_authenticate(self.recipient.user)
+        self.assertEqual(other.get(f"/api/transfers/{queued.id}/").status_code, 404)
+        self.assertEqual(self.api.get(f"/api/transfers/{queued.id}/").status_code, 200)
+
+    def test_invalid_async_request_is_rejected_up_front(self):
+        payload = {"from_account_id": self.account.id, "recipient_national_id": "222", "amount": "-1", "async": True}
+        response = self.api.post("/api/transfers/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TransferRequest.objects.exists())
+
+    def test_numeric_national_id_is_rejected_up_front(self):
+        payload = {"from_account_id": self.account.id, "recipient_national_id": 222, "amount": "5", "async": True}
+        response = self.api.post("/api/transfers/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaisesMessage(ValueError, "must be a string"):
+            enqueue_transfer(self.sender, self.account, 222, "5.00")
+        self.assertFalse(TransferRequest.objects.exists())
+
+
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender, cls.account = make_customer("sender", "111")
+        make_customer("recipient", "222")
+
+    def setUp(self):
+        response_cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.sender.user)
+        self.payload = {"from_account_id": self.account.id, "recipient_national_id": "222", "amount": "5.00"}
+
+    def balance(self):
+        return LedgerAccount.objects.get(bank_account=self.account).balance()
+
+    def test_retried_transfer_moves_money_once(self):
+        first = self.api.post("/api/transfers/", self.payload, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(first.status_code, 201)
+        # Replayed from the table with one indexed lookup, no ledger locks
+        with self.assertNumQueries(1):
+            retry = self.api.post("/api/transfers/", self.payload, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        # ...and from the process cache after that
+        with self.assertNumQueries(0):
+            self.api.post("/api/transfers/", self.payload, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(self.balance(), Decimal("995.00"))
+
+        self.api.post("/api/transfers/", self.payload, format="json", HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(self.balance(), Decimal("990.00"))
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.api.post("/api/transfers/", self.payload, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        other = dict(self.payload, amount="6.00")
+        response = self.api.post("/api/transfers/", other, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.balance(), Decimal("995.00"))
+
+    def test_failed_handler_does_not_keep_the_key(self):
+        with self.assertRaises(ZeroDivisionError):
+            execute_once(self.sender.user.pk, "test", "k1", "fp", lambda: 1 / 0)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_transaction_create_is_idempotent(self):
+        category = Category.objects.create(name="Food", type=Category.EXPENSE)
+        payload = {"account": self.account.id, "category": category.id, "amount": "12.50", "date": "2025-01-05"}
+        first = self.api.post("/api/transactions/", payload, format="json", HTTP_IDEMPOTENCY_KEY="t1")
+        retry = self.api.post("/api/transactions/", payload, format="json", HTTP_IDEMPOTENCY_KEY="t1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 1)
+
+
+class AsyncReadEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.other, _ = make_customer("other", "222")
+        food = Category.objects.create(name="Food", type=Category.EXPENSE)
+        Transaction.objects.bulk_create(
+            Transaction(account=cls.account, category=food, amount=Decimal(i + 1), date=f"2025-01-{i + 1:02d}")
+            for i in range(5)
+        )
+
+    def auth(self, customer):
+        return {"headers": {"Authorization": f"Bearer {AccessToken.for_user(customer.user)}"}}
+
+    async def test_account_list_matches_sync_view(self):
+        response = await self.async_client.get("/api/async/accounts/", **self.auth(self.customer))
+        self.assertEqual(response.status_code, 200)
+        api = APIClient()
+        api.force_authenticate(self.customer.user)
+        expected = await sync_to_async(api.get)("/api/accounts/")
+        self.assertEqual(response.json(), json.loads(expected.content))
+
+    async def test_transaction_list_pages_with_cursor(self):
+        response = await self.async_client.get(
+            "/api/async/transactions/", {"page_size": 3}, **self.auth(self.customer)
+        )
+        data = response.json()
+        self.assertEqual([t["date"] for t in data["results"]], ["2025-01-05", "2025-01-04", "2025-01-03"])
+        response = await self.async_client.get(data["next"], **self.auth(self.customer))
+        self.assertEqual([t["date"] for t in response.json()["results"]], ["2025-01-02", "2025-01-01"])
+        self.assertIsNone(response.json()["next"])
+
+        response = await self.async_client.get(
+            "/api/async/transactions/", {"date_from": "nope"}, **self.auth(self.customer)
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_dashboard_summary_with_session_or_token(self):
+        await self.async_client.aforce_login(self.customer.user)
+        response = await self.async_client.get("/api/async/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["expense_total"], 15.0)
+        self.assertEqual(len(response.json()["transactions"]), 5)
+        self.assertIn("Server-Timing", response)
+
+        await self.async_client.alogout()
+        response = await self.async_client.get("/api/async/dashboard/", **self.auth(self.other))
+        self.assertEqual(response.json()["expense_total"], 0)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get("/api/async/accounts/")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get("/api/async/accounts/", headers={"Authorization": "Bearer junk"})
+        self.assertEqual(response.status_code, 401)
+
+
+class BudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.food = Category.objects.create(name="Food", type=Category.EXPENSE)
+        cls.rent = Category.objects.create(name="Rent", type=Category.EXPENSE)
+        cls.salary = Category.objects.create(name="Salary", type=Category.INCOME)
+        Budget.objects.create(customer=cls.customer, category=cls.food, amount="100.00", alert_percent=80)
+        Budget.objects.create(customer=cls.customer, category=cls.rent, amount="500.00")
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.customer.user)
+
+    def counters(self):
+        return {
+            (s.category_id, s.month.isoformat()): (s.total, s.count)
+            for s in MonthlySpend.objects.filter(total__gt=0)
+        }
+
+    def test_counters_follow_create_update_delete(self):
+        t = Transaction.objects.create(account=self.account, category=self.food, amount="30.00", date="2025-03-10")
+        Transaction.objects.create(account=self.account, category=self.food, amount="20.00", date="2025-03-20")
+        self.assertEqual(self.counters(), {(self.food.id, "2025-03-01"): (Decimal("50.00"), 2)})
+
+        # Moved to another category and month
+        t.category = self.rent
+        t.date = "2025-04-01"
+        t.save()
+        self.assertEqual(self.counters(), {
+            (self.food.id, "2025-03-01"): (Decimal("20.00"), 1),
+            (self.rent.id, "2025-04-01"): (Decimal("30.00"), 1),
+        })
+        t.delete()
+        self.assertEqual(self.counters(), {(self.food.id, "2025-03-01"): (Decimal("20.00"), 1)})
+
+    def test_status_reads_counters_in_one_query(self):
+        Transaction.objects.create(account=self.account, category=self.food, amount="85.00", date="2025-03-10")
+        Transaction.objects.create(account=self.account, category=self.food, amount="5.00", date="2025-02-10")
+        with self.assertNumQueries(1):
+            response = self.api.get("/api/budgets/status/", {"month": "2025-03"})
+        rows = {r["category_name"]: r for r in response.data["categories"]}
+        self.assertEqual(rows["Food"]["spent"], Decimal("85.00"))
+        self.assertEqual(rows["Food"]["remaining"], Decimal("15.00"))
+        self.assertTrue(rows["Food"]["alert"])
+        self.assertFalse(rows["Food"]["over_budget"])
+        self.assertEqual(rows["Rent"]["spent"], Decimal("0.00"))
+        self.assertFalse(rows["Rent"]["alert"])
+
+    def test_rebuild_repairs_drift(self):
+        Transaction.objects.create(account=self.account, category=self.food, amount="10.00", date="2025-03-10")
+        Transaction.objects.filter(account=self.account).update(amount="40.00")
+        call_command("rebuild_transaction_rollups", "--only", "spend", stdout=io.StringIO())
+        self.assertEqual(self.counters(), {(self.food.id, "2025-03-01"): (Decimal("40.00"), 1)})
+
+    def test_budget_api_validates_category(self):
+        response = self.api.post("/api/budgets/", {"category": self.salary.id, "amount": "10.00"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.api.post("/api/budgets/", {"category": self.food.id, "amount": "10.00"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class RecurringTransactionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.rent = Category.objects.create(name="Rent", type=Category.EXPENSE)
+
+    def rule(self, frequency, start, **kwargs):
+        return RecurringTransaction.objects.create(
+            account=self.account, category=self.rent, amount="100.00",
+            frequency=frequency, start_date=start, **kwargs
+        )
+
+    def dates(self, rule):
+        return [
+            t.date.isoformat()
+            for t in Transaction.objects.filter(import_hash__isnull=False, description=rule.description).order_by("date")
+        ]
+
+    def test_monthly_rule_keeps_its_day(self):
+        rule = self.rule(RecurringTransaction.MONTHLY, date(2025, 1, 31), description="rent")
+        report = materialize_due(until=date(2025, 4, 30))
+        self.assertEqual(report["created"], 4)
+        self.assertEqual(self.dates(rule), ["2025-01-31", "2025-02-28", "2025-03-31", "2025-04-30"])
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_date, date(2025, 5, 31))
+
+    def test_rerun_is_idempotent_and_catches_up(self):
+        rule = self.rule(RecurringTransaction.WEEKLY, date(2025, 1, 1), interval=2, description="gym")
+        materialize_due(until=date(2025, 1, 31))
+        self.assertEqual(materialize_due(until=date(2025, 1, 31))["created"], 0)
+        # Even with next_date rewound, nothing is inserted twice
+        RecurringTransaction.objects.filter(id=rule.id).update(next_date=date(2025, 1, 1))
+        report = materialize_due(until=date(2025, 2, 28))
+        self.assertEqual(report["duplicates"], 3)
+        self.assertEqual(
+            self.dates(rule),
+            ["2025-01-01", "2025-01-15", "2025-01-29", "2025-02-12", "2025-02-26"],
+        )
+
+    def test_backlog_is_chunked_without_per_row_queries(self):
+        for i in range(3):
+            self.rule(RecurringTransaction.DAILY, date(2024, 1, 1), description=f"daily {i}", end_date=date(2024, 12, 31))
+        with CaptureQueriesContext(connection) as queries:
+            report = materialize_due(until=date(2025, 6, 1), chunk_size=500)
+        self.assertEqual(report["created"], 3 * 366)
+        self.assertLess(len(queries), 120)
+        # Rollups and spend counters are kept by the bulk signal
+        self.assertEqual(
+            TransactionDailyRollup.objects.filter(category=self.rent).aggregate(n=Sum("count"))["n"],
+            3 * 366,
+        )
+        self.assertFalse(materialize_due(until=date(2025, 6, 1))["rules"])
+
+    def test_occurrence_inserted_by_a_concurrent_run_is_skipped(self):
+        rule = self.rule(RecurringTransaction.MONTHLY, date(2025, 1, 1), description="rent")
+        real_filter = Transaction.objects.filter
+        checks = [Transaction.objects.none()]
+
+        def filter_after_check(*args, **kwargs):
+            if checks:
+                # The other run inserts January between the duplicate check and the insert
+                Transaction.objects.create(
+                    account=self.account, category=self.rent, amount="100.00", date="2025-01-01",
+                    description="rent", import_hash=occurrence_hash(rule.id, date(2025, 1, 1)),
+                )
+                return checks.pop()
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Transaction.objects, "filter", side_effect=filter_after_check), \
+                mock.patch("django.utils.timezone.now", return_value=timezone.now()):
+            report = materialize_due(until=date(2025, 3, 31))
+        self.assertEqual((report["created"], report["duplicates"]), (2, 1))
+        self.assertEqual(self.dates(rule), ["2025-01-01", "2025-02-01", "2025-03-01"])
+        self.assertEqual(
+            TransactionDailyRollup.objects.filter(category=self.rent).aggregate(n=Sum("count"))["n"], 3
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.other, cls.other_account = make_customer("other", "222")
+        cls.food = Category.objects.create(name="Food", type=Category.EXPENSE)
+
+    def add(self, description, account=None):
+        return Transaction.objects.create(
+            account=account or self.account, category=self.food, amount="10.00",
+            date=date(2025, 1, 1), description=description,
+        )
+
+    def found(self, query, qs=None):
+        return set(search(Transaction.objects.all() if qs is None else qs, query).values_list("description", flat=True))
+
+    def test_index_follows_writes(self):
+        coffee = self.add("Coffee at Lamiz")
+        self.add("Groceries")
+        self.assertEqual(self.found("coffee"), {"Coffee at Lamiz"})
+        # Bulk updates bypass signals but not the database triggers
+        Transaction.objects.filter(id=coffee.id).update(description="Tea at Lamiz")
+        self.assertEqual(self.found("coffee"), set())
+        self.assertEqual(self.found("tea lamiz"), {"Tea at Lamiz"})
+        Transaction.objects.filter(id=coffee.id).delete()
+        self.assertEqual(self.found("lamiz"), set())
+
+    def test_prefix_and_persian_terms(self):
+        self.add("خرید نان از نانوایی")
+        self.add("Supermarket weekly shop")
+        self.assertEqual(self.found("super"), {"Supermarket weekly shop"})
+        self.assertEqual(self.found("نان"), {"خرید نان از نانوایی"})
+        self.assertEqual(self.found("super نان"), set())
+
+    def test_operators_in_input_are_plain_terms(self):
+        self.add("rent NOT paid")
+        self.assertEqual(self.found('rent" NOT *'), {"rent NOT paid"})
+        self.assertEqual(self.found("NOT"), {"rent NOT paid"})
+        self.assertEqual(self.found("  "), {"rent NOT paid"})
+
+    def test_journal_memos(self):
+        JournalEntry.objects.create(customer=self.customer, date=date(2025, 1, 1), memo="Quarterly tax payment")
+        memos = search(JournalEntry.objects.all(), "quarter").values_list("memo", flat=True)
+        self.assertEqual(list(memos), ["Quarterly tax payment"])
+
+    def test_install_skips_missing_tables(self):
+        # As on a post_migrate that runs before this app's tables exist
+        with mock.patch.object(connection.introspection, "table_names", return_value=[]):
+            with CaptureQueriesContext(connection) as queries:
+                install_search_index()
+        self.assertEqual(len(queries), 0)
+
+    def test_api_filter_is_scoped_to_the_customer(self):
+        self.add("Cinema tickets")
+        self.add("Cinema snacks", account=self.other_account)
+        client = APIClient()
+        client.force_authenticate(self.customer.user)
+        response = client.get("/api/transactions/", {"q": "cinema"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t["description"] for t in response.data["results"]], ["Cinema tickets"])
+
+
+class LedgerIntegrityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, cls.account = make_customer("owner", "111")
+        cls.cash = LedgerAccount.objects.get(bank_account=cls.account)
+        cls.savings = Account.objects.create(customer=cls.customer, name="Savings")
+        cls.savings_ledger = LedgerAccount.objects.create(
+            customer=cls.customer, name="Savings", type=LedgerAccount.ASSET, bank_account=cls.savings
+        )
+
+    def transfer(self, amount="50.00"):
+        entry = post_journal_entry(self.customer, "2025-02-01", "move", [
+            {"account": self.savings_ledger, "debit": Decimal(amount), "credit": 0},
+            {"account": self.cash, "debit": 0, "credit": Decimal(amount)},
+        ])
+        return Transfer.objects.create(
+            customer=self.customer, from_account=self.account, to_account=self.savings,
+            amount=amount, date=date(2025, 2, 1), journal_entry=entry,
+        )
+
+    def verify(self, **kwargs):
+        return verify_ledger(settle_seconds=0, **kwargs)
+
+    def test_consistent_ledger(self):
+        self.transfer()
+        report = self.verify(chunk_size=1)
+        self.assertEqual(report["problems"], [])
+        self.assertEqual((report["entries"], report["lines"], report["chunks"]), (2, 4, 2))
+
+    def test_reports_each_kind_of_problem(self):
+        transfer = self.transfer()
+        opening = LedgerLine.objects.filter(account=self.cash).order_by("id").first()
+        # Both sides set: the entry stays balanced, the line is still wrong
+        LedgerLine.objects.filter(id=opening.id).update(debit="1000.00", credit="5.00")
+        LedgerLine.objects.filter(entry=transfer.journal_entry, account=self.cash).update(credit="40.00")
+        Transfer.objects.create(
+            customer=self.customer, from_account=self.account, to_account=self.savings,
+            amount="1.00", date=date(2025, 2, 2),
+        )
+        report = self.verify(chunk_size=1)
+        self.assertEqual(report["counts"], {
+            "line_both_sides": 1,
+            "unbalanced_entry": 2,
+            "transfer_lines": 1,
+            "transfer_unposted": 1,
+        })
+        [both] = [p for p in report["problems"] if p["check"] == "line_both_sides"]
+        self.assertEqual((both["entry_id"], both["line_id"]), (opening.entry_id, opening.id))
+        run = LedgerVerification.objects.get()
+        self.assertEqual((run.entries_checked, run.problem_count), (2, 5))
+
+    def test_incremental_starts_after_last_run(self):
+        self.verify()
+        self.assertEqual(self.verify(incremental=True)["entries"], 0)
+        transfer = self.transfer()
+        report = self.verify(incremental=True)
+        self.assertEqual((report["first_entry_id"], report["entries"]), (transfer.journal_entry_id, 1))
+        # Young entries are left for the next run
+        self.transfer()
+        self.assertEqual(verify_ledger(incremental=True, settle_seconds=3600)["entries"], 0)
+
+    def test_command_fails_on_problems(self):
+        LedgerLine.objects.filter(account=self.cash).update(date=date(2024, 12, 31))
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "1 problems found (line_date: 1)"):
+            call_command("verify_ledger", "--settle-seconds=0", "--processes=1", stdout=out)
+        self.assertIn("line_date", out.getvalue())
+
+
+class LedgerArchiveTests(TestCase):
+    RANGES = [
+        (None, None),
+        (None, date(2025, 1, 20)),
+        (date(2025, 1, 10), date(2025, 2, 14)),
+        (date(2025, 2, 1), date(2025, 2, 28)),
+        (date(2025, 3, 1), None),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer, account = make_customer("owner", "111")
+        cash = LedgerAccount.objects.get(bank_account=account)
+        expense = LedgerAccount.objects.get(customer=cls.customer, name="Expenses")
+        income = LedgerAccount.objects.create(customer=cls.customer, name="Income", type=LedgerAccount.INCOME)
+        for day, debit_account, credit_account, amount in [
+            ("2025-01-15", cash, income, "50.25"),
+            ("2025-01-31", expense, cash, "12.10"),
+            ("2025-02-10", expense, cash, "30.00"),
+            ("2025-02-20", cash, income, "20.00"),
+            ("2025-03-05", cash, income, "7.50"),
+        ]:
+            post_journal_entry(cls.customer, day, "", [
+                {"account": debit_account, "debit": Decimal(amount), "credit": 0},
+                {"account": credit_account, "debit": 0, "credit": Decimal(amount)},
+            ])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(FINANCE_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def reports(self):
+        customer = Customer.objects.get(id=self.customer.id)
+        return [
+            (trial_balance(customer, start, end), balance_sheet(customer, end), income_statement(customer, start, end))
+            for start, end in self.RANGES
+        ]
+
+    def archive_through(self, *days):
+        for day in days:
+            close_period(self.customer, day)
+            archive_closed_lines(self.customer)
+
+    def test_reports_read_archived_lines(self):
+        expected = self.reports()
+        self.archive_through(date(2025, 1, 31), date(2025, 2, 28))
+        self.assertEqual(LedgerLine.objects.filter(account__customer=self.customer).count(), 2)
+        self.assertEqual(
+            list(LedgerArchive.objects.values_list("date_from", "date_to", "line_count")),
+            [(date(2025, 1, 1), date(2025, 1, 31), 6), (date(2025, 2, 1), date(2025, 2, 28), 4)],
+        )
+        with mock.patch.object(archive, "np", None):
+            self.assertEqual(self.reports(), expected)
+        if archive.np is not None:
+            self.assertEqual(self.reports(), expected)
+
+    def test_segment_format(self):
+        self.archive_through(date(2025, 1, 31))
+        segment = LedgerArchive.objects.get()
+        with mock.patch.object(archive, "np", None):
+            accounts, entries, dates, amounts = archive.read_segment(segment)
+            self.assertEqual(sorted(accounts), list(accounts))
+            self.assertEqual(
+                sorted(zip(dates, amounts)),
+                sorted([(date(2025, 1, 1).toordinal(), 100000), (date(2025, 1, 1).toordinal(), -100000),
+                        (date(2025, 1, 15).toordinal(), 5025), (date(2025, 1, 15).toordinal(), -5025),
+                        (date(2025, 1, 31).toordinal(), 1210), (date(2025, 1, 31).toordinal(), -1210)]),
+            )
+        # Nothing new is closed, so a second run has nothing to move
+        self.assertIsNone(archive_closed_lines(self.customer))
+
+    def test_checks_see_archived_totals(self):
+        self.archive_through(date(2025, 1, 31), date(2025, 2, 28))
+        self.assertEqual(verify_checkpoints(self.customer.id), [])
+        self.assertEqual(verify_ledger(settle_seconds=0)["problems"], [])
+        out = io.StringIO()
+        call_command("recompute_ledger_balances", "--check", stdout=out)
+        self.assertIn("0 mismatched", out.getvalue())
+        cash = LedgerAccount.objects.get(bank_account__customer=self.customer)
+        self.assertEqual(cash.aggregate_totals(), (cash.debit_total, cash.credit_total))
+        before = list(cash.daily_balances.values_list("date", "debit_total", "credit_total"))
+        call_command("rebuild_daily_balances", stdout=io.StringIO())
+        self.assertEqual(list(cash.daily_balances.values_list("date", "debit_total", "credit_total")), before)
+
+    def test_refuses_lines_with_both_sides(self):
+        close_period(self.customer, date(2025, 1, 31))
+        LedgerLine.objects.filter(date=date(2025, 1, 15), debit__gt=0).update(credit="1.00")
+        with self.assertRaises(ValueError):
+            archive_closed_lines(self.customer)
+        self.assertFalse(LedgerArchive.objects.exists())
+        self.assertEqual(LedgerLine.objects.filter(account__customer=self.customer).count(), 12)
+
+    def test_all_customer_report_merges_archives_one_customer_at_a_time(self):
+        make_customer("other", "222")
+        archived_only, _ = make_customer("archived", "333")
+        expected = [list(iter_trial_balance(date_from=start, date_to=end)) for start, end in self.RANGES]
+        self.archive_through(date(2025, 1, 31), date(2025, 2, 28))
+        close_period(archived_only, date(2025, 1, 31))
+        archive_closed_lines(archived_only)
+        self.assertFalse(LedgerLine.objects.filter(account__customer=archived_only).exists())
+
+        with mock.patch("finance.services.reports.archived_totals", wraps=archive.archived_totals) as totals:
+            actual = [list(iter_trial_balance(date_from=start, date_to=end)) for start, end in self.RANGES]
+        self.assertEqual(actual, expected)
+        self.assertTrue(totals.called)
+        self.assertNotIn(None, {call.args[0] for call in totals.call_args_list})
+
+    def export(self, **params):
+        api = APIClient()
+        # Loaded afresh, as for a real request: the archive dates have moved
+        api.force_authenticate(get_user_model().objects.get(id=self.customer.user_id))
+        response = api.get("/api/exports/ledger-lines/", {"fmt": "ndjson", **params})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_export_includes_archived_lines(self):
+        def lines(rows):
+            return [(r["date"], r["entry_id"], r["entry__memo"], r["account_id"], r["account__name"], r["debit"],
+                     r["credit"]) for r in rows]
+
+        cash = LedgerAccount.objects.get(bank_account__customer=self.customer)
+        ranges = [{}, {"date_from": "2025-01-10", "date_to": "2025-02-14"}, {"ledger_account": cash.id}]
+        expected = [sorted(lines(self.export(**params))) for params in ranges]
+        self.archive_through(date(2025, 1, 31), date(2025, 2, 28))
+
+        for numpy in ([archive.np, None] if archive.np is not None else [None]):
+            with mock.patch.object(archive, "np", numpy):
+                for params, before in zip(ranges, expected):
+                    with self.subTest(numpy=numpy is not None, **params):
+                        rows = self.export(**params)
+                        self.assertEqual(sorted(lines(rows)), before)
+                        self.assertEqual([r["date"] for r in rows], sorted(r["date"] for r in rows))
+                        self.assertTrue(all(r["id"] is None for r in rows if r["date"] <= "2025-02-28"))
@@ -1,10 +1,10 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum
 from django.shortcuts import render, redirect
 
 from .form import TransferForm, TransactionForm
-from .models import Account, Category, Transaction
+from .models import Account, Transaction
+from finance.services.dashboard import get_dashboard_summary, recent_transactions_queryset
 from finance.services.exceptions import InsufficientFundsError
 from finance.services.inter_customer_transfers import transfer_to_national_id
 def get_current_customer(user):
@@ -15,53 +15,20 @@ def get_current_customer(user):
 def dashboard(request):
     customer = get_current_customer(request.user)
     if customer is None:
-        qs = Transaction.objects.none()
-    else:
-        qs = Transaction.objects.filter(account__customer=customer)
-
-    income_total = (
-        qs.filter(category__type=Category.INCOME)
-        .aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
-
-    expense_total = (
-        qs.filter(category__type=Category.EXPENSE)
-        .aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
-
-    net_total = income_total - expense_total
-
-    # گزارش‌ها را روی qs (بدون slice) بساز
-    expense_by_category = (
-        qs.filter(category__type=Category.EXPENSE)
-        .values("category__name")
-        .annotate(total=Sum("amount"))
-        .order_by("-total")
-    )
-
-    income_by_category = (
-        qs.filter(category__type=Category.INCOME)
-        .values("category__name")
-        .annotate(total=Sum("amount"))
-        .order_by("-total")
-    )
+        return render(request, "finance/dashboard.html", {
+            "income_total": 0,
+            "expense_total": 0,
+            "net_total": 0,
+            "transactions": Transaction.objects.none(),
+            "expense_by_category": [],
+            "income_by_category": [],
+        })
+
+    # جمع‌ها و گزارش دسته‌ها از کش (یا یک کوئری گروه‌بندی‌شده)
+    context = dict(get_dashboard_summary(customer))
 
     # فقط لیست اخیر را slice کن
-    transactions = (
-        qs.select_related("category", "account")
-        .order_by("-date", "-created_at")[:20]
-    )
-
-    context = {
-        "income_total": income_total,
-        "expense_total": expense_total,
-        "net_total": net_total,
-        "transactions": transactions,
-        "expense_by_category": expense_by_category,
-        "income_by_category": income_by_category,
-    }
+    context["transactions"] = recent_transactions_queryset(customer)
     return render(request, "finance/dashboard.html", context)
 
 
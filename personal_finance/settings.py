@@ -48,6 +48,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Query/latency profiling (Server-Timing header, request_stats command);
+    # a no-op unless FINANCE_QUERY_INSTRUMENTATION is set, see below
+    'finance.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,6 +59,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Wraps every query of every request, and Server-Timing exposes query
+# counts and timings to clients, so keep it to development and profiling runs
+FINANCE_QUERY_INSTRUMENTATION = DEBUG
+
 ROOT_URLCONF = 'personal_finance.urls'
 
 TEMPLATES = [
@@ -88,6 +95,25 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Dashboard summaries are cached here and invalidated by whichever process
+# writes the transaction, so with more than one worker process this must be
+# a shared backend, e.g.
+#     "BACKEND": "django.core.cache.backends.redis.RedisCache",
+#     "LOCATION": "redis://127.0.0.1:6379",
+# With the per-process default a summary is only kept for
+# FINANCE_DASHBOARD_LOCAL_CACHE_TIMEOUT (5) seconds instead of
+# FINANCE_DASHBOARD_CACHE_TIMEOUT (an hour).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -27,4 +27,5 @@ urlpatterns = [
     path("api/auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/", include("finance.api.urls")),
+    path("", include("finance.urls")),
 ]
\ No newline at end of file